@@ -6,6 +6,10 @@ import json
 import pymanifest
 from src import dwarfgen
 from src import codegen
+from src import memory
+from src import debugfiles
+from src import columnar
+from src import spill
 
 ap = argparse.ArgumentParser()
 
@@ -56,9 +60,156 @@ ap.add_argument(
     help='Full path to a language generator module.  Can be used with --to-lang'
 )
 
+ap.add_argument(
+    '--jobs',
+    action='store',
+    type=int,
+    default=1,
+    help='Number of worker processes used to extract the compile units of each file'
+)
+
+ap.add_argument(
+    '--file-jobs',
+    action='store',
+    type=int,
+    default=1,
+    help='Number of files processed concurrently.  Duplicate files are skipped and the largest files are started first'
+)
+
+ap.add_argument(
+    '--verbose',
+    action='store_true',
+    default=False,
+    help='Log progress, including the time spent on each file'
+)
+
+ap.add_argument(
+    '--no-mmap',
+    action='store_true',
+    default=False,
+    help='Read DWARF sections into memory instead of memory mapping the input files'
+)
+
+ap.add_argument(
+    '--cache-dir',
+    action='store',
+    default=None,
+    help='Directory used to cache results between runs.  Files whose DWARF info is unchanged are not parsed again, and of other files only the changed compile units are'
+)
+
+ap.add_argument(
+    '--cache-size',
+    action='store',
+    type=int,
+    default=1024,
+    help='Maximum size of --cache-dir in megabytes.  Least recently used results are evicted first'
+)
+
+ap.add_argument(
+    '--debug-dir',
+    action='append',
+    default=None,
+    help='Directory searched for the separate debug files of stripped inputs, by build-id or .gnu_debuglink.  May be given more than once, defaults to {}'.format(debugfiles.DEFAULT_DEBUG_DIRS[0])
+)
+
+ap.add_argument(
+    '--function-local-types',
+    action='store_true',
+    default=False,
+    help='Also extract the types defined inside functions.  By default function bodies are skipped over without being parsed'
+)
+
+ap.add_argument(
+    '--native-scanner',
+    action='store_true',
+    default=False,
+    help='Read DIE\'s with the built in .debug_info scanner instead of pyelftools, which only decodes the attributes types are built from'
+)
+
+ap.add_argument(
+    '--columnar-resolver',
+    action='store_true',
+    default=False,
+    help='Resolve member types with NumPy arrays instead of one member at a time, which is faster on inputs with many more members than types.  Requires numpy'
+)
+
+ap.add_argument(
+    '--lazy-resolution',
+    action='store_true',
+    default=False,
+    help='Resolve the type of each member when it is first read, instead of resolving every member once extraction ends.  Can\'t be used with --spill-dir'
+)
+
+ap.add_argument(
+    '--bounded-memory',
+    action='store_true',
+    default=False,
+    help='Drop each compile unit and its DIE\'s as soon as it is walked, so memory use doesn\'t grow with the size of the input.  Peak memory is logged at the end with --verbose'
+)
+
+ap.add_argument(
+    '--spill-dir',
+    action='store',
+    default=None,
+    help='Keep the extracted types in a temporary SQLite file in this directory instead of in memory, for inputs too large to fit.  Can\'t be used with --file-jobs'
+)
+
+ap.add_argument(
+    '--spill-cache',
+    action='store',
+    type=int,
+    default=spill.DEFAULT_CACHE_SIZE,
+    help='Number of types, and of structures, enumerations and unions, --spill-dir keeps in memory'
+)
+
+ap.add_argument(
+    '--include-types',
+    action='append',
+    default=[],
+    help='Only extract the types whose qualified name, such as app::Point, matches this glob, or regular expression when prefixed by re:.  Namespaces nothing could match in are skipped without being walked.  May be given more than once'
+)
+
+ap.add_argument(
+    '--exclude-types',
+    action='append',
+    default=[],
+    help='Don\'t extract the types or namespaces whose qualified name matches this glob, or regular expression when prefixed by re:.  An excluded namespace, such as std, is skipped with everything in it.  May be given more than once'
+)
+
+ap.add_argument(
+    '--source-root',
+    action='append',
+    default=[],
+    help='Only extract the structures, enumerations and unions declared in a source file under this directory, leaving out the ones from system and toolchain headers.  May be given more than once'
+)
+
+ap.add_argument(
+    '--cu-filter',
+    action='append',
+    default=[],
+    help='Only walk the compile units whose DW_AT_name, DW_AT_comp_dir, or the path they make together, matches this glob.  Split DWARF skeleton units are matched by the name of their .dwo file instead of DW_AT_name, and units with no name or directory are always walked.  Other compile units are skipped after reading their first DIE.  May be given more than once'
+)
+
+ap.add_argument(
+    '--roots',
+    action='append',
+    default=[],
+    help='Comma separated qualified names of types, such as Foo,ns::Bar.  Only these types, and the types they reach through members, bases, typedefs, pointers and arrays, are extracted, by reading just their DIE\'s instead of walking every compile unit.  May be given more than once'
+)
+
+ap.add_argument(
+    '--no-name-index',
+    action='store_true',
+    default=False,
+    help='Search every compile unit for the --roots types instead of looking them up in the .debug_names, .debug_pubtypes or .gdb_index of the input'
+)
+
 pymanifest.add_args(ap)
 args = ap.parse_args()
 
+if args.verbose:
+    logging.basicConfig(level=logging.INFO)
+
 files = list(pymanifest.process_from_args(args))
 
 failed = False
@@ -84,18 +235,73 @@ if args.to_lang != []:
     else:
         os.makedirs(args.to_lang_dest, exist_ok=True)
 
+if args.jobs < 1:
+    logging.error("--jobs must be at least 1")
+    failed = True
+
+if args.file_jobs < 1:
+    logging.error("--file-jobs must be at least 1")
+    failed = True
+
+if args.columnar_resolver and not columnar.available():
+    logging.error("--columnar-resolver requires numpy")
+    failed = True
+
+if args.spill_dir is not None and args.lazy_resolution:
+    logging.error("--spill-dir can't be used with --lazy-resolution")
+    failed = True
+
+if args.spill_dir is not None and args.file_jobs > 1:
+    logging.error("--spill-dir can't be used with --file-jobs")
+    failed = True
+
+if args.spill_cache < 1:
+    logging.error("--spill-cache must be at least 1")
+    failed = True
+
 if failed:
     sys.exit(1)
 
-ns = dwarfgen.process(files)
+ns = dwarfgen.process(
+    files,
+    jobs=args.jobs,
+    file_jobs=args.file_jobs,
+    use_mmap=not args.no_mmap,
+    cache_dir=args.cache_dir,
+    cache_size=args.cache_size * 1024 * 1024,
+    debug_dirs=args.debug_dir if args.debug_dir is not None else debugfiles.DEFAULT_DEBUG_DIRS,
+    function_local_types=args.function_local_types,
+    native_scanner=args.native_scanner,
+    columnar_resolver=args.columnar_resolver,
+    lazy_resolution=args.lazy_resolution,
+    bounded_memory=args.bounded_memory,
+    spill_dir=args.spill_dir,
+    spill_cache_size=args.spill_cache,
+    include_types=args.include_types,
+    exclude_types=args.exclude_types,
+    source_roots=args.source_root,
+    cu_filter=args.cu_filter,
+    roots=[root for roots in args.roots for root in roots.split(',') if root != ''],
+    name_index=not args.no_name_index
+)
 
-jidl = {}
-ns.to_json(jidl)
+# spilled namespaces are written out one object at a time, and only loaded
+# whole for the code generators
+jidl = None
+if args.spill_dir is None or args.to_lang != []:
+    jidl = {}
+    ns.to_json(jidl)
 
 for idl in args.to_idl:
     if idl == 'jidl':
         with open(os.path.join(args.to_idl_dest, 'jidl.json'), 'w+') as f:
-            json.dump(jidl, f, indent=4)
+            if jidl is None:
+                spill.dump_jidl(ns, f)
+            else:
+                json.dump(jidl, f, indent=4)
 
 for lang in args.to_lang:
     type_strs = codegen.generate(lang, jidl, args.to_lang_dest)
+
+if args.bounded_memory:
+    memory.log_peak_memory()
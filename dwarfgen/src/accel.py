@@ -0,0 +1,387 @@
+'''
+Reads the name indexes toolchains emit next to .debug_info: .debug_names,
+.debug_pubtypes and .gdb_index.  They map the names of types to the CU's,
+and for the first two the DIE's, defining them, so a type can be found by
+name without walking every CU.  Sections are read through the same streams
+as the rest of the DWARF info, and lookups only read the parts of an index
+they go through.
+'''
+import logging
+import struct
+
+from elftools.dwarf.enums import ENUM_DW_FORM, ENUM_DW_TAG
+
+from . import mappedelf
+
+
+'''
+DW_IDX_* attributes of .debug_names entries
+'''
+DW_IDX_COMPILE_UNIT = 1
+DW_IDX_TYPE_UNIT = 2
+DW_IDX_DIE_OFFSET = 3
+
+'''
+struct formats of the fixed size forms of .debug_names entries by DW_FORM_*,
+other forms are LEB128 encoded
+'''
+FIXED_FORMS = {
+    ENUM_DW_FORM['DW_FORM_flag_present']: '',
+    ENUM_DW_FORM['DW_FORM_flag']: 'B',
+    ENUM_DW_FORM['DW_FORM_data1']: 'B',
+    ENUM_DW_FORM['DW_FORM_ref1']: 'B',
+    ENUM_DW_FORM['DW_FORM_data2']: 'H',
+    ENUM_DW_FORM['DW_FORM_ref2']: 'H',
+    ENUM_DW_FORM['DW_FORM_data4']: 'I',
+    ENUM_DW_FORM['DW_FORM_ref4']: 'I',
+    ENUM_DW_FORM['DW_FORM_data8']: 'Q',
+    ENUM_DW_FORM['DW_FORM_ref8']: 'Q',
+    ENUM_DW_FORM['DW_FORM_ref_sig8']: 'Q',
+}
+
+'''
+Symbol kinds of .gdb_index types, including the symbols of indexes that
+don't record kinds
+'''
+GDB_INDEX_TYPE_KINDS = (0, 1)
+
+'''
+Oldest .gdb_index version with symbol kinds
+'''
+GDB_INDEX_MIN_VERSION = 7
+
+def unqualified(name):
+    '''
+    Returns the last part of a qualified name, such as "Box<app::Point>" of
+    "app::Box<app::Point>"
+    '''
+    scope = name.split('<', 1)[0].rfind('::')
+    return name[scope + 2:] if scope >= 0 else name
+
+class SectionReader:
+    '''
+    Reads the values of a section at offsets
+    '''
+    def __init__(self, stream, size, little_endian):
+        self.stream = stream
+        self.size = size
+        self.endian = '<' if little_endian else '>'
+
+    def read(self, offset, size):
+        self.stream.seek(offset)
+        data = self.stream.read(size)
+        if len(data) != size:
+            raise ValueError("Read past the end of the section at {}".format(offset))
+        return data
+
+    def unpack(self, format, offset):
+        format = self.endian + format
+        return struct.unpack(format, self.read(offset, struct.calcsize(format)))
+
+    def offset(self, offset_size, offset):
+        return self.unpack('I' if offset_size == 4 else 'Q', offset)[0]
+
+    def uleb128(self, offset):
+        '''
+        Returns the value at offset and the offset after it
+        '''
+        value = 0
+        shift = 0
+        while True:
+            byte = self.read(offset, 1)[0]
+            offset += 1
+            value |= (byte & 0x7f) << shift
+            shift += 7
+            if byte < 0x80:
+                return value, offset
+
+    def string(self, offset):
+        '''
+        Returns the NUL terminated string at offset
+        '''
+        chunks = []
+        while True:
+            self.stream.seek(offset)
+            chunk = self.stream.read(64)
+            if chunk == b'':
+                raise ValueError("Unterminated string at {}".format(offset))
+            end = chunk.find(b'\0')
+            if end >= 0:
+                chunks.append(chunk[:end])
+                return b''.join(chunks)
+            chunks.append(chunk)
+            offset += len(chunk)
+
+    def unit_length(self, offset):
+        '''
+        Returns the length of the unit at offset, the size of its offsets and
+        where its header continues
+        '''
+        length = self.unpack('I', offset)[0]
+        if length == 0xffffffff:
+            return self.unpack('Q', offset + 4)[0], 8, offset + 12
+        return length, 4, offset + 4
+
+def djb_hash(name):
+    '''
+    The hash of .debug_names, of the name with its ASCII letters lower cased
+    '''
+    value = 5381
+    for byte in name.lower():
+        value = (value * 33 + byte) & 0xffffffff
+    return value
+
+def gdb_index_hash(name):
+    '''
+    The hash of .gdb_index symbols, of the name with its ASCII letters lower
+    cased
+    '''
+    value = 0
+    for byte in name.lower():
+        value = (value * 67 + byte - 113) & 0xffffffff
+    return value
+
+class NameIndexUnit:
+    '''
+    One name index of .debug_names, usually one per linked object file
+    '''
+    def __init__(self, reader, offset):
+        length, self.offset_size, pos = reader.unit_length(offset)
+        self.end = pos + length
+
+        version = reader.unpack('H', pos)[0]
+        if version != 5:
+            raise ValueError("Unsupported .debug_names version {}".format(version))
+
+        cu_count, local_tu_count, foreign_tu_count, self.bucket_count, self.name_count, abbrev_size, augmentation_size = reader.unpack('7I', pos + 4)
+        pos += 32 + augmentation_size
+
+        self.cu_offsets = [reader.offset(self.offset_size, pos + i * self.offset_size) for i in range(cu_count)]
+        pos += (cu_count + local_tu_count) * self.offset_size + foreign_tu_count * 8
+
+        self.buckets = pos
+        self.hashes = self.buckets + self.bucket_count * 4
+        self.strings = self.hashes + (self.name_count * 4 if self.bucket_count > 0 else 0)
+        self.entries = self.strings + self.name_count * self.offset_size
+        self.abbrevs_start = self.entries + self.name_count * self.offset_size
+        self.pool = self.abbrevs_start + abbrev_size
+        self.abbrevs = None
+
+    def read_abbrevs(self, reader):
+        '''
+        Returns the abbreviations of the entries, by code, as their tag and
+        (DW_IDX_*, DW_FORM_*) attributes
+        '''
+        if self.abbrevs is None:
+            self.abbrevs = {}
+            pos = self.abbrevs_start
+            while True:
+                code, pos = reader.uleb128(pos)
+                if code == 0:
+                    break
+                tag, pos = reader.uleb128(pos)
+                attributes = []
+                while True:
+                    index, pos = reader.uleb128(pos)
+                    form, pos = reader.uleb128(pos)
+                    if index == 0 and form == 0:
+                        break
+                    attributes.append((index, form))
+                self.abbrevs[code] = (tag, attributes)
+
+        return self.abbrevs
+
+    def name_indexes(self, reader, name):
+        '''
+        Yields the indexes of the names that may be name, by hash if the
+        index has a hash table
+        '''
+        if self.bucket_count == 0:
+            yield from range(self.name_count)
+            return
+
+        hash = djb_hash(name)
+        bucket = hash % self.bucket_count
+        index = reader.unpack('I', self.buckets + bucket * 4)[0]
+        if index == 0:
+            return
+
+        # names of a bucket are consecutive, and indexes start at 1
+        for index in range(index - 1, self.name_count):
+            name_hash = reader.unpack('I', self.hashes + index * 4)[0]
+            if name_hash % self.bucket_count != bucket:
+                return
+            if name_hash == hash:
+                yield index
+
+    def lookup(self, reader, strings, name, tags):
+        '''
+        Yields the CU and DIE offsets of the entries of name whose tags are in
+        tags
+        '''
+        for index in self.name_indexes(reader, name):
+            if strings(reader.offset(self.offset_size, self.strings + index * self.offset_size)) != name:
+                continue
+
+            abbrevs = self.read_abbrevs(reader)
+            pos = self.pool + reader.offset(self.offset_size, self.entries + index * self.offset_size)
+            while True:
+                code, pos = reader.uleb128(pos)
+                if code == 0:
+                    break
+
+                tag, attributes = abbrevs[code]
+                values = {}
+                for attribute, form in attributes:
+                    if form in FIXED_FORMS:
+                        format = FIXED_FORMS[form]
+                        values[attribute] = reader.unpack(format, pos)[0] if format != '' else True
+                        pos += struct.calcsize(format)
+                    else:
+                        values[attribute], pos = reader.uleb128(pos)
+
+                # entries of type units, or without a DIE, can't be walked
+                if tag not in tags or DW_IDX_TYPE_UNIT in values or DW_IDX_DIE_OFFSET not in values:
+                    continue
+
+                # entries of an index of a single CU may leave it out
+                cu = values.get(DW_IDX_COMPILE_UNIT, 0 if len(self.cu_offsets) == 1 else None)
+                if cu is not None and cu < len(self.cu_offsets):
+                    cu_offset = self.cu_offsets[cu]
+                    yield cu_offset, cu_offset + values[DW_IDX_DIE_OFFSET]
+
+class NameIndex:
+    '''
+    .debug_names, indexed by the unqualified names of DIE's
+    '''
+    def __init__(self, reader, dwarfinfo):
+        self.reader = reader
+        self.dwarfinfo = dwarfinfo
+        self.units = []
+        offset = 0
+        while offset < reader.size:
+            unit = NameIndexUnit(reader, offset)
+            self.units.append(unit)
+            offset = unit.end
+
+    def string(self, offset):
+        return self.dwarfinfo.get_string_from_table(offset)
+
+    def lookup(self, name, tags):
+        tags = {ENUM_DW_TAG[tag] for tag in tags}
+        name = unqualified(name).encode()
+        for unit in self.units:
+            yield from unit.lookup(self.reader, self.string, name, tags)
+
+class PubtypesIndex:
+    '''
+    .debug_pubtypes, indexed by qualified names.  It has no hash table, so
+    it's read whole on the first lookup.
+    '''
+    def __init__(self, reader):
+        self.reader = reader
+        self.names = None
+
+    def read_names(self):
+        names = {}
+        offset = 0
+        while offset < self.reader.size:
+            length, offset_size, pos = self.reader.unit_length(offset)
+            end = pos + length
+            cu_offset = self.reader.offset(offset_size, pos + 2)
+
+            data = self.reader.read(pos, length)
+            format = self.reader.endian + ('I' if offset_size == 4 else 'Q')
+            pos = 2 + 2 * offset_size
+            while pos + offset_size <= length:
+                die_offset = struct.unpack_from(format, data, pos)[0]
+                if die_offset == 0:
+                    break
+                pos += offset_size
+                name_end = data.index(b'\0', pos)
+                names.setdefault(data[pos:name_end], []).append((cu_offset, cu_offset + die_offset))
+                pos = name_end + 1
+
+            offset = end
+
+        return names
+
+    def lookup(self, name, tags):
+        if self.names is None:
+            self.names = self.read_names()
+        return self.names.get(name.encode(), [])
+
+class GdbIndex:
+    '''
+    .gdb_index, indexed by qualified names.  It only gives the CU's that
+    define a name, so its DIE offsets are None.
+    '''
+    def __init__(self, reader):
+        self.reader = reader
+        # .gdb_index is always little endian
+        reader.endian = '<'
+
+        version, self.cu_list, types_list, _, self.symbol_table, self.constant_pool = reader.unpack('6I', 0)
+        if version < GDB_INDEX_MIN_VERSION:
+            raise ValueError("Unsupported .gdb_index version {}".format(version))
+
+        self.cu_count = (types_list - self.cu_list) // 16
+        self.slot_count = (self.constant_pool - self.symbol_table) // 8
+
+    def symbol(self, name):
+        '''
+        Returns the offset of the CU vector of name, or None
+        '''
+        if self.slot_count == 0:
+            return None
+
+        mask = self.slot_count - 1
+        hash = gdb_index_hash(name)
+        slot = hash & mask
+        step = ((hash * 17) & mask) | 1
+        for _ in range(self.slot_count):
+            name_offset, vector_offset = self.reader.unpack('II', self.symbol_table + slot * 8)
+            if name_offset == 0 and vector_offset == 0:
+                return None
+            if self.reader.string(self.constant_pool + name_offset) == name:
+                return self.constant_pool + vector_offset
+            slot = (slot + step) & mask
+
+        return None
+
+    def lookup(self, name, tags):
+        vector = self.symbol(name.encode())
+        if vector is None:
+            return
+
+        count = self.reader.unpack('I', vector)[0]
+        for entry in self.reader.unpack('{}I'.format(count), vector + 4):
+            cu = entry & 0xffffff
+            if (entry >> 28) & 7 in GDB_INDEX_TYPE_KINDS and cu < self.cu_count:
+                yield self.reader.unpack('Q', self.cu_list + cu * 16)[0], None
+
+def open_index(elffile, dwarfinfo):
+    '''
+    Returns the first of .debug_names, .debug_pubtypes and .gdb_index elffile
+    has, or None if it has none that can be read.  An index's lookup(name,
+    tags) yields the (CU offset, DIE offset) of the DIE's that may be the
+    type of qualified name.
+    '''
+    for name in ('.debug_names', '.debug_pubtypes', '.gdb_index'):
+        section = elffile.get_section_by_name(name)
+        if section is None or section['sh_type'] == 'SHT_NOBITS':
+            continue
+
+        descriptor = mappedelf.read_dwarf_section(elffile, section)
+        reader = SectionReader(descriptor.stream, descriptor.size, elffile.little_endian)
+        try:
+            if name == '.debug_names':
+                return NameIndex(reader, dwarfinfo)
+            elif name == '.debug_pubtypes':
+                return PubtypesIndex(reader)
+            else:
+                return GdbIndex(reader)
+        except (ValueError, struct.error) as e:
+            logging.warning("Can't read {}: {}".format(name, e))
+
+    return None
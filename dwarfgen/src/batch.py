@@ -0,0 +1,93 @@
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from elftools.elf.elffile import ELFFile
+
+from . import debugfiles
+from . import elfutils
+
+
+def describe(file, debug_dirs=debugfiles.DEFAULT_DEBUG_DIRS):
+    '''
+    Returns the scheduling weight of file and the keys that identify its
+    contents: the inode it lives on and its build-id, if it has one.  A
+    stripped file is weighted by the debug sections of its separate debug
+    file, found in debug_dirs, which is what extracting it reads.
+    '''
+    stat = os.stat(file)
+    keys = [('inode', stat.st_dev, stat.st_ino)]
+
+    with open(file, 'rb') as f:
+        elffile = ELFFile(f)
+        size = elfutils.debug_sections_size(elffile)
+        file_build_id = elfutils.build_id(elffile)
+        debug_file = None if elffile.has_dwarf_info(True) else debugfiles.find_debug_file(file, elffile, debug_dirs)
+
+    if debug_file is not None:
+        with open(debug_file, 'rb') as f:
+            size = elfutils.debug_sections_size(ELFFile(f))
+
+    if file_build_id is not None:
+        keys.append(('build-id', file_build_id))
+
+    return size, keys
+
+def unique_files(files, debug_dirs=debugfiles.DEFAULT_DEBUG_DIRS):
+    '''
+    Drops files that are hard links, symlinks or copies of a file seen earlier.
+    Returns the remaining files, in order, along with their scheduling weights.
+    '''
+    seen = {}
+    unique = []
+    sizes = {}
+
+    for file in files:
+        size, keys = describe(file, debug_dirs)
+
+        duplicate_of = next((seen[key] for key in keys if key in seen), None)
+        if duplicate_of is not None:
+            logging.info("Skipping {}, same binary as {}".format(file, duplicate_of))
+            continue
+
+        for key in keys:
+            seen[key] = file
+
+        unique.append(file)
+        sizes[file] = size
+
+    return unique, sizes
+
+def timed(extract, file, *args):
+    start = time.perf_counter()
+    result = extract(file, *args)
+    return result, time.perf_counter() - start
+
+def process_files_serially(files, extract, *args):
+    for file in files:
+        result, elapsed = timed(extract, file, *args)
+        logging.info("Processed {} in {:.2f}s".format(file, elapsed))
+        yield file, result
+
+def process_files(files, sizes, extract, file_jobs, *args):
+    '''
+    Runs extract(file, *args) for every file on a pool of file_jobs worker
+    processes.  The files with the most debug info are started first so the
+    batch finishes in about the time of the largest one.  Results are returned
+    as (file, result) pairs in the order the files were given.
+    '''
+    if file_jobs == 1:
+        return process_files_serially(files, extract, *args)
+
+    schedule = sorted(files, key=lambda file: sizes[file], reverse=True)
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=file_jobs) as executor:
+        futures = {executor.submit(timed, extract, file, *args): file for file in schedule}
+
+        for future in as_completed(futures):
+            file = futures[future]
+            results[file], elapsed = future.result()
+            logging.info("Processed {} in {:.2f}s".format(file, elapsed))
+
+    return [(file, results[file]) for file in files]
@@ -0,0 +1,326 @@
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+from functools import lru_cache
+
+from . import elfutils
+from . import rawdwarf
+from . import policies
+from .version import VERSION
+
+
+'''
+Default upper bound on the size of a cache directory, in bytes
+'''
+DEFAULT_CACHE_SIZE = 1024 * 1024 * 1024
+
+'''
+Chunk size used when hashing section contents
+'''
+HASH_CHUNK_SIZE = 1024 * 1024
+
+'''
+Layout of the cached values, bumped whenever the pickled objects change
+shape so entries written by older code are never loaded
+'''
+FORMAT = 6
+
+@lru_cache(maxsize=None)
+def policies_fingerprint():
+    '''
+    Hash of the policy sources, so results are invalidated when the policies
+    used to build them change
+    '''
+    digest = hashlib.sha256()
+    root = os.path.dirname(policies.__file__)
+
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if not filename.endswith('.py'):
+                continue
+
+            path = os.path.join(dirpath, filename)
+            digest.update(os.path.relpath(path, root).encode())
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+
+    return digest.hexdigest()
+
+def debug_sections_digest(elffile):
+    '''
+    SHA-256 of the raw contents of every DWARF section in elffile
+    '''
+    digest = hashlib.sha256()
+
+    for section in elffile.iter_sections():
+        if not elfutils.is_debug_section(section) or section['sh_type'] == 'SHT_NOBITS':
+            continue
+
+        digest.update(section.name.encode())
+        elffile.stream.seek(section['sh_offset'])
+        remaining = section['sh_size']
+        while remaining > 0:
+            chunk = elffile.stream.read(min(remaining, HASH_CHUNK_SIZE))
+            if not chunk:
+                break
+            digest.update(chunk)
+            remaining -= len(chunk)
+
+    return digest.hexdigest()
+
+def content_id(elffile):
+    '''
+    Identifies the DWARF content of elffile by its GNU build-id, falling back
+    to a hash of the DWARF sections when it wasn't linked with one
+    '''
+    file_build_id = elfutils.build_id(elffile)
+    if file_build_id is not None:
+        return 'build-id:' + file_build_id
+    return 'sha256:' + debug_sections_digest(elffile)
+
+class Cache:
+    '''
+    Content addressed store of pickled objects in the kind sub directory of
+    root.  Entries of every kind are evicted least recently used first once
+    root grows past max_size bytes.
+    '''
+    def __init__(self, root, kind, max_size=DEFAULT_CACHE_SIZE, options=None):
+        self.root = root
+        # extraction options the cached values depend on
+        self.options = options if options is not None else {}
+        self.directory = os.path.join(root, kind)
+        self.max_size = max_size
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.pickle')
+
+    def load(self, key):
+        path = self.path(key)
+
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.warning("Ignoring unreadable cache entry {}: {}".format(path, e))
+            return None
+
+        # the modification time doubles as the last use time for eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        return value
+
+    def store(self, key, value, evict=True):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path(key))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        if evict:
+            self.evict()
+
+    def evict(self):
+        entries = []
+        total = 0
+
+        for kind in os.scandir(self.root):
+            if not kind.is_dir():
+                continue
+
+            for entry in os.scandir(kind.path):
+                if not entry.name.endswith('.pickle'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+def new_digest(options):
+    '''
+    Every key also covers the dwarfgen version, the cache format, the policies
+    and the options that built the cached value
+    '''
+    digest = hashlib.sha256()
+    digest.update(VERSION.encode())
+    digest.update(str(FORMAT).encode())
+    digest.update(policies_fingerprint().encode())
+    digest.update(repr(sorted(options.items())).encode())
+    return digest
+
+class ResultCache(Cache):
+    '''
+    Caches the resolved Namespace of whole files, keyed by their DWARF content
+    '''
+    def __init__(self, root, max_size=DEFAULT_CACHE_SIZE, options=None):
+        super(ResultCache, self).__init__(root, 'results', max_size, options)
+
+    def key(self, elffile):
+        digest = new_digest(self.options)
+        digest.update(content_id(elffile).encode())
+        return digest.hexdigest()
+
+'''
+How CU digests treat attribute forms.  Strings are hashed by value because
+string offsets shift whenever any CU in the link changes.  Addresses and
+section offsets can't change the extracted types, so they are left out, as
+are location expressions which embed addresses.  The file table
+DW_AT_stmt_list points to is hashed on its own, see line_table_digest.
+CU's that reference outside of themselves can't be cached on their own.
+'''
+STRING_FORMS = {
+    'DW_FORM_strp': 'get_string_from_table',
+    'DW_FORM_line_strp': 'get_string_from_linetable',
+}
+
+IGNORED_FORMS = {
+    'DW_FORM_addr',
+    'DW_FORM_addrx',
+    'DW_FORM_addrx1',
+    'DW_FORM_addrx2',
+    'DW_FORM_addrx3',
+    'DW_FORM_addrx4',
+    'DW_FORM_GNU_addr_index',
+    'DW_FORM_sec_offset',
+    'DW_FORM_loclistx',
+    'DW_FORM_rnglistx',
+}
+
+IGNORED_ATTRIBUTES = {
+    'DW_AT_location',
+    'DW_AT_frame_base',
+    'DW_AT_call_value',
+    'DW_AT_call_target',
+    'DW_AT_GNU_call_site_value',
+    'DW_AT_GNU_call_site_target',
+}
+
+UNCACHEABLE_FORMS = {
+    'DW_FORM_ref_addr',
+    'DW_FORM_ref_sig8',
+    'DW_FORM_ref_sup4',
+    'DW_FORM_ref_sup8',
+    'DW_FORM_GNU_ref_alt',
+    'DW_FORM_strp_sup',
+    'DW_FORM_GNU_strp_alt',
+    'DW_FORM_strx',
+    'DW_FORM_strx1',
+    'DW_FORM_strx2',
+    'DW_FORM_strx3',
+    'DW_FORM_strx4',
+    'DW_FORM_GNU_str_index',
+    'DW_FORM_indirect',
+}
+
+def cu_digest(CU, digest):
+    '''
+    Feeds the contents of CU to digest: its encoding, its abbreviation table,
+    its DIE's with strings inlined and addresses left out, and the file table
+    of its line program.  Returns False if CU can't be identified by its own
+    contents.
+    '''
+    dwarfinfo = CU.dwarfinfo
+    unit = rawdwarf.UnitFormat.from_CU(CU)
+    readers = unit.readers()
+
+    abbrevs, abbrev_data = rawdwarf.abbrev_table(dwarfinfo, CU['debug_abbrev_offset'])
+    data = rawdwarf.unit_data(CU)
+
+    digest.update('{} {} {}\0'.format(unit.version, unit.offset_size, unit.address_size).encode())
+    digest.update(abbrev_data)
+
+    pos = CU.cu_die_offset - CU.cu_offset
+    last = pos
+
+    while pos < len(data):
+        code, pos = rawdwarf.read_uleb128(data, pos)
+        if code == 0:
+            continue
+
+        for name, form, implicit_const in abbrevs[code].attributes:
+            if form == 'DW_FORM_implicit_const':
+                continue
+
+            if form in UNCACHEABLE_FORMS:
+                return False
+
+            start = pos
+            value, pos = readers[form](data, pos)
+
+            if form in STRING_FORMS:
+                digest.update(data[last:start])
+                digest.update(getattr(dwarfinfo, STRING_FORMS[form])(value) + b'\0')
+                last = pos
+            elif form in IGNORED_FORMS or name in IGNORED_ATTRIBUTES:
+                digest.update(data[last:start])
+                last = pos
+
+    digest.update(data[last:])
+    line_table_digest(CU, digest)
+    return True
+
+def line_table_digest(CU, digest):
+    '''
+    Feeds the directories and files of CU's line program to digest.  The
+    DW_AT_decl_file of the DIE's index them, and their paths decide what
+    source_roots keeps, see dwarfgen.declared_files.
+    '''
+    line_program = CU.dwarfinfo.line_program_for_CU(CU)
+    if line_program is None:
+        return
+
+    header = line_program.header
+    digest.update(b'\0directories\0')
+    for directory in header.include_directory:
+        digest.update(directory + b'\0')
+    digest.update(b'\0files\0')
+    for entry in header.file_entry:
+        digest.update(entry.name + '\0{}\0'.format(entry.dir_index).encode())
+
+class CUCache(Cache):
+    '''
+    Caches the partial Namespace and FlatStructure extracted from single CU's,
+    so a rebuilt binary only walks the CU's that changed.  Values are stored
+    with offsets relative to the start of their CU, since unchanged CU's
+    usually move when the binary is relinked.
+    '''
+    def __init__(self, root, max_size=DEFAULT_CACHE_SIZE, options=None):
+        super(CUCache, self).__init__(root, 'cus', max_size, options)
+
+    def key(self, CU):
+        '''
+        Returns the key for CU, or None if CU can't be cached
+        '''
+        digest = new_digest(self.options)
+
+        try:
+            if not cu_digest(CU, digest):
+                return None
+        except (rawdwarf.UnsupportedForm, KeyError, IndexError) as e:
+            logging.warning("Not caching CU at {}: {}".format(CU.cu_offset, repr(e)))
+            return None
+
+        return digest.hexdigest()
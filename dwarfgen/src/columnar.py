@@ -0,0 +1,350 @@
+'''
+Resolves types from a columnar copy of FLAT.  The type chains of every type
+used by a namespace are walked at once with NumPy gathers, one hop per
+step, instead of one member at a time.  The results are stored in FLAT's
+resolution memos.  Members are then resolved once per type they have, and
+the results gathered back onto the members all at once, which produces the
+exact same namespace as the regular resolution.  Chains NumPy can't finish,
+such as ones that don't resolve or loop, are left to the regular
+resolution, which reports them the same way it always does.
+
+NumPy is optional, and only needed by this module.
+'''
+from itertools import compress, repeat
+from operator import attrgetter, itemgetter, is_
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from . import dwarfgen
+
+
+'''
+Targets of types that aren't the index of another type: an offset that
+isn't in FLAT, no type at all, and a string such as "void"
+'''
+MISSING = -1
+NO_TARGET = -2
+STRING_TARGET = -3
+
+def available():
+    return numpy is not None
+
+class TypeGraph:
+    '''
+    The records of a FlatStructure as columns, one row per offset.  Each
+    column is built from one field of all the records at once, without a
+    step per record.  Names are looked up by name id, see name.
+    '''
+    def __init__(self, flat):
+        records = list(flat.types.values())
+        self.offsets = list(flat.types)
+        self.rows = dict(zip(self.offsets, range(len(self.offsets))))
+
+        kinds, names, sizes, types = (list(map(itemgetter(field), records)) for field in range(4))
+        self.names = names
+        self.types = types
+
+        self.kinds = numpy.array(kinds, dtype=numpy.int8)
+        sizes = numpy.array(sizes, dtype=object)
+        self.has_sizes = sizes != None
+        self.sizes = numpy.where(self.has_sizes, sizes, -1).astype(numpy.int64)
+        self.has_names = numpy.array(names, dtype=object) != None
+
+        self.targets = self.index(types)
+        self.targets[numpy.array(types, dtype=object) == None] = NO_TARGET
+        self.targets[numpy.fromiter(map(isinstance, types, repeat(str)), dtype=bool, count=len(types))] = STRING_TARGET
+
+    def index(self, offsets):
+        '''
+        Returns the rows of offsets, MISSING for the ones that aren't in FLAT
+        '''
+        return numpy.fromiter(map(self.rows.get, offsets, repeat(MISSING)), dtype=numpy.int64, count=len(offsets))
+
+    def name(self, name_id):
+        '''
+        Returns the name of a name id of resolve_names: the name of the
+        record at row name_id // 2, or its type if that's a string and
+        name_id is odd
+        '''
+        if name_id < 0:
+            return None
+        if name_id & 1:
+            return self.types[name_id >> 1]
+        return self.names[name_id >> 1]
+
+    def follow(self, rows, kind):
+        '''
+        Steps from the rows of kind to their targets
+        '''
+        step = (rows >= 0) & (self.kinds[numpy.maximum(rows, 0)] == kind)
+        return numpy.where(step, self.targets[numpy.maximum(rows, 0)], rows), step
+
+    def skip_typedefs(self, rows):
+        '''
+        resolve_type_offset for rows.  Rows that don't land on a type in FLAT
+        are MISSING.
+        '''
+        rows, _ = self.follow(rows, dwarfgen.ARRAY)
+        rows, _ = self.follow(rows, dwarfgen.SUBRANGE)
+
+        # rows still stepping after as many steps as there are types loop
+        for _ in range(len(self.offsets) + 1):
+            rows, stepped = self.follow(rows, dwarfgen.TYPEDEF)
+            if not stepped.any():
+                break
+
+        return numpy.where((rows >= 0) & ~stepped, rows, MISSING)
+
+    def walk(self, rows, stop):
+        '''
+        Follows the targets of rows, one hop per step.  stop(current rows,
+        their targets) gives which rows are done, their ids, and which rows
+        can't go on.  Returns the ids and whether each row was resolved, rows
+        still going after as many steps as there are types loop.
+        '''
+        ids = numpy.full(len(rows), -1, dtype=numpy.int64)
+        resolved = numpy.zeros(len(rows), dtype=bool)
+
+        active = numpy.flatnonzero(rows >= 0)
+        current = rows[active]
+        for _ in range(len(self.offsets) + 1):
+            if len(active) == 0:
+                break
+
+            targets = self.targets[current]
+            done, done_ids, failed = stop(current, targets)
+            ids[active[done]] = done_ids[done]
+            resolved[active[done]] = True
+
+            going = ~(done | failed)
+            active = active[going]
+            current = targets[going]
+
+        return ids, resolved
+
+    def resolve_names(self, rows):
+        '''
+        resolve_type_offset_name for rows, as name ids, see name
+        '''
+        def stop(current, targets):
+            strings = targets == STRING_TARGET
+            ids = current * 2 + strings
+            done = (targets == NO_TARGET) | strings | self.has_names[current]
+            return done, ids, targets == MISSING
+
+        return self.walk(rows, stop)
+
+    def resolve_sizes(self, rows):
+        '''
+        resolve_type_offset_size for rows.  Ids are the sizes, or -1 if the
+        size is None.
+        '''
+        def stop(current, targets):
+            has_sizes = self.has_sizes[current]
+            done = has_sizes | (targets == NO_TARGET)
+            ids = numpy.where(has_sizes, self.sizes[current], -1)
+            return done, ids, ~done & (targets < 0)
+
+        return self.walk(rows, stop)
+
+    def pointer_depths(self, rows):
+        '''
+        get_pointer_chain_count for rows, -1 for chains that loop
+        '''
+        depths = numpy.zeros(len(rows), dtype=numpy.int64)
+        for _ in range(len(self.offsets) + 1):
+            rows, stepped = self.follow(rows, dwarfgen.POINTER)
+            if not stepped.any():
+                break
+            depths += stepped
+
+        return numpy.where(stepped, -1, depths)
+
+def type_offsets(namespace):
+    '''
+    Yields the type offsets resolve_namespace resolves
+    '''
+    for enumeration in namespace.enumerations.values():
+        yield enumeration.type
+
+    for structure in namespace.structures.values():
+        for base_structure in structure.base_structures.values():
+            yield base_structure.type_offset
+        for member in structure.members.values():
+            yield member.type_offset
+
+    for union in namespace.unions.values():
+        for member in union.members.values():
+            yield member.type_offset
+
+    for n in namespace.namespaces.values():
+        yield from type_offsets(n)
+
+def memoize(offsets, flat):
+    '''
+    Fills the resolution memos of flat for the types at offsets, a list of
+    unique offsets
+    '''
+    if offsets == [] or len(flat.types) == 0:
+        return
+
+    graph = TypeGraph(flat)
+    rows = graph.index(offsets)
+
+    targets = graph.skip_typedefs(rows)
+    flat.targets.update(
+        (offset, graph.offsets[target])
+        for offset, target in zip(offsets, targets.tolist()) if target >= 0
+    )
+
+    target_rows = numpy.unique(targets[targets >= 0])
+    target_offsets = [graph.offsets[row] for row in target_rows.tolist()]
+
+    name_ids, resolved = graph.resolve_names(target_rows)
+    flat.names.update(
+        (offset, graph.name(name_id))
+        for offset, name_id, done in zip(target_offsets, name_ids.tolist(), resolved.tolist()) if done
+    )
+
+    sizes, resolved = graph.resolve_sizes(target_rows)
+    flat.sizes.update(
+        (offset, size if size >= 0 else None)
+        for offset, size, done in zip(target_offsets, sizes.tolist(), resolved.tolist()) if done
+    )
+
+    # members of pointer types count the pointers from their own type, and
+    # members of reference types from the type referred to
+    references = (rows >= 0) & (graph.kinds[numpy.maximum(rows, 0)] == dwarfgen.REFERENCE)
+    starts = numpy.unique(numpy.where(references, graph.targets[numpy.maximum(rows, 0)], rows))
+    starts = starts[starts >= 0]
+    starts = starts[graph.kinds[starts] == dwarfgen.POINTER]
+    depths = graph.pointer_depths(starts)
+    flat.pointer_depths.update(
+        (graph.offsets[row], depth)
+        for row, depth in zip(starts.tolist(), depths.tolist()) if depth >= 0
+    )
+
+def collect_members(namespace, members):
+    '''
+    resolve_namespace for everything of namespace but the members of its
+    structures and unions, which are added to members instead
+    '''
+    for enumeration in namespace.enumerations.values():
+        dwarfgen.resolve_enumeration(enumeration)
+
+    for structure in namespace.structures.values():
+        dwarfgen.resolve_base_structures(structure)
+        members.extend(structure.members.values())
+
+    for union in namespace.unions.values():
+        members.extend(union.members.values())
+
+    for n in namespace.namespaces.values():
+        collect_members(n, members)
+
+def objects(values):
+    '''
+    Returns values as a one dimensional array of objects, tuples included
+    '''
+    return numpy.fromiter(values, dtype=object, count=len(values))
+
+def set_all(members, attribute, values):
+    '''
+    Sets attribute of each of members to the matching one of values
+    '''
+    for _ in map(setattr, members, repeat(attribute), values):
+        pass
+
+def resolve_members(members, flat):
+    '''
+    resolve_member for members.  Each type the members have is resolved
+    once, and its results gathered onto all of its members.  Bit fields and
+    members without a type offset are resolved one by one.
+    '''
+    offsets = list(map(attrgetter('type_offset'), members))
+    regular = numpy.fromiter(map(isinstance, offsets, repeat(int)), dtype=bool, count=len(offsets))
+    regular &= numpy.fromiter(map(is_, map(attrgetter('bit_size'), members), repeat(None)), dtype=bool, count=len(offsets))
+
+    members = objects(members)
+    for member in members[~regular]:
+        dwarfgen.resolve_member(flat, member)
+
+    members = members[regular]
+    if len(members) == 0:
+        return
+
+    offsets, types = numpy.unique(numpy.fromiter(compress(offsets, regular), dtype=numpy.int64, count=len(members)), return_inverse=True)
+    memoize(offsets.tolist(), flat)
+
+    # the results of each type, in the order of offsets
+    kinds = []
+    type_strs = []
+    byte_sizes = []
+    bounds = []
+    minimums = []
+    maximums = []
+    for offset in offsets.tolist():
+        type_str = dwarfgen.resolve_member_type_str(offset, flat)
+        record = flat.types.get(offset)
+        kind = record.kind if record is not None else None
+        byte_size = dwarfgen.resolve_type_offset_size(dwarfgen.resolve_type_offset(offset, flat), flat)
+        bounds_list = None
+        if kind == dwarfgen.ARRAY:
+            bounds_list = dwarfgen.resolve_array_bounds(offset, flat)
+            size = 0
+            for bound in bounds_list or ():
+                subrange_size = (bound.upper - bound.lower + 1) * byte_size
+                size = subrange_size if size == 0 else size * subrange_size
+            byte_size = size
+
+        kinds.append(kind)
+        type_strs.append(type_str)
+        byte_sizes.append(byte_size)
+        bounds.append(bounds_list)
+        minimums.append(record.extra[0] if kind == dwarfgen.SUBRANGE else None)
+        maximums.append(record.extra[1] if kind == dwarfgen.SUBRANGE else None)
+
+    set_all(members, '_type_str', objects(type_strs)[types])
+    set_all(members, '_byte_size', objects(byte_sizes)[types])
+
+    kinds = objects(kinds)[types]
+    arrays = kinds == dwarfgen.ARRAY
+    set_all(members[arrays], '_bounds_list', objects(bounds)[types][arrays])
+
+    subranges = kinds == dwarfgen.SUBRANGE
+    set_all(members[subranges], '_min_val', objects(minimums)[types][subranges])
+    set_all(members[subranges], '_max_val', objects(maximums)[types][subranges])
+
+def resolve_namespace(namespace, flat):
+    '''
+    dwarfgen.resolve_namespace, with the members resolved by
+    resolve_members.  Lazily resolved namespaces keep their members where
+    they are, and are resolved the regular way from the memos memoize fills.
+    Spilled namespaces are resolved the regular way only: the graph and the
+    offsets of every member would read the whole store into memory, and the
+    store's memos don't keep more than its cache anyway.  The graph takes a
+    step per record of flat, so members fewer than those are resolved one by
+    one too.
+    '''
+    if numpy is None:
+        raise ImportError("The columnar resolver requires numpy")
+
+    if dwarfgen.OPTIONS.spill is not None:
+        dwarfgen.resolve_namespace(namespace)
+        return
+
+    if dwarfgen.OPTIONS.lazy_resolution:
+        memoize([offset for offset in set(type_offsets(namespace)) if isinstance(offset, int)], flat)
+        dwarfgen.resolve_namespace(namespace)
+        return
+
+    members = []
+    collect_members(namespace, members)
+    if len(members) < len(flat.types):
+        for member in members:
+            dwarfgen.resolve_member(flat, member)
+    else:
+        resolve_members(members, flat)
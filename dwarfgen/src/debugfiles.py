@@ -0,0 +1,465 @@
+'''
+Locates DWARF info that isn't stored in the file being processed: separate
+debug files found through .gnu_debuglink or a build-id directory, and the
+.dwo or .dwp files holding the split units of skeleton CU's.
+'''
+import io
+import logging
+import os
+import struct
+import zlib
+from contextlib import contextmanager, ExitStack
+
+from elftools.common.exceptions import DWARFError
+from elftools.dwarf.dwarfinfo import DWARFInfo, DebugSectionDescriptor, DwarfConfig
+
+from . import elfutils
+from . import mappedelf
+from .rawdwarf import read_uleb128, read_sleb128
+
+
+'''
+Directories searched for separate debug files, like gdb's debug-file-directory
+'''
+DEFAULT_DEBUG_DIRS = ['/usr/lib/debug']
+
+'''
+DWARFInfo arguments of the sections a split unit can have, by section name
+'''
+SPLIT_SECTIONS = {
+    'debug_info_sec': '.debug_info',
+    'debug_abbrev_sec': '.debug_abbrev',
+    'debug_str_sec': '.debug_str',
+    'debug_str_offsets_sec': '.debug_str_offsets',
+    'debug_line_sec': '.debug_line',
+    'debug_loc_sec': '.debug_loc',
+    'debug_loclists_sec': '.debug_loclists',
+    'debug_rnglists_sec': '.debug_rnglists',
+    'debug_types_sec': '.debug_types',
+}
+
+'''
+DW_SECT_* column ids of .debug_cu_index, for version 2 (GNU) and 5 indexes
+'''
+PACKAGE_COLUMNS = {
+    2: {1: '.debug_info', 2: '.debug_types', 3: '.debug_abbrev', 4: '.debug_line', 5: '.debug_loc', 6: '.debug_str_offsets'},
+    5: {1: '.debug_info', 3: '.debug_abbrev', 4: '.debug_line', 5: '.debug_loclists', 6: '.debug_str_offsets', 8: '.debug_rnglists'},
+}
+
+'''
+Codes of the unit DIE tags, attributes and forms with_unit_bases reads and
+adds
+'''
+DW_TAG_compile_unit = 0x11
+DW_TAG_type_unit = 0x41
+DW_AT_str_offsets_base = 0x72
+DW_AT_addr_base = 0x73
+DW_FORM_implicit_const = 0x21
+
+'''
+Results of debug file searches, which are the same for every file sharing
+a build-id or debug link
+'''
+DEBUG_FILE_LOOKUPS = {}
+
+def file_crc32(path):
+    crc = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+def debug_file_candidates(file, build_id, debuglink, debug_dirs):
+    '''
+    Yields (path, check) for every place a separate debug file may be, in the
+    order gdb searches them.  check is the build-id or CRC the file must match.
+    '''
+    if build_id is not None:
+        for debug_dir in debug_dirs:
+            yield os.path.join(debug_dir, '.build-id', build_id[:2], build_id[2:] + '.debug'), build_id
+
+    if debuglink is not None:
+        name, crc = debuglink
+        directory = os.path.dirname(os.path.abspath(file))
+        check = build_id if build_id is not None else crc
+        yield os.path.join(directory, name), check
+        yield os.path.join(directory, '.debug', name), check
+        for debug_dir in debug_dirs:
+            yield os.path.join(debug_dir, directory.lstrip(os.sep), name), check
+
+def matches(path, check):
+    try:
+        if isinstance(check, str):
+            with mappedelf.open_elf(path, use_mmap=False) as elffile:
+                return elfutils.build_id(elffile) == check
+        return file_crc32(path) == check
+    except Exception as e:
+        logging.debug("Can't check debug file {}: {}".format(path, e))
+        return False
+
+def find_debug_file(file, elffile, debug_dirs=DEFAULT_DEBUG_DIRS):
+    '''
+    Returns the path of the separate debug file of elffile, or None
+    '''
+    build_id = elfutils.build_id(elffile)
+
+    debuglink = None
+    link = elffile.get_dwarf_link()
+    if link is not None:
+        debuglink = (os.fsdecode(link.filename), link.checksum)
+
+    if build_id is None and debuglink is None:
+        return None
+
+    key = (build_id, debuglink, os.path.dirname(os.path.abspath(file)), tuple(debug_dirs))
+    if key not in DEBUG_FILE_LOOKUPS:
+        DEBUG_FILE_LOOKUPS[key] = None
+        for path, check in debug_file_candidates(file, build_id, debuglink, debug_dirs):
+            if os.path.isfile(path) and os.path.realpath(path) != os.path.realpath(file) and matches(path, check):
+                DEBUG_FILE_LOOKUPS[key] = path
+                break
+
+    return DEBUG_FILE_LOOKUPS[key]
+
+@contextmanager
+def open_dwarf_elf(file, use_mmap=True, debug_dirs=DEFAULT_DEBUG_DIRS):
+    '''
+    Yields the path and ELFFile of the file holding the DWARF info of file:
+    file itself, or its separate debug file if file was stripped.  Yields
+    (None, None) if neither has DWARF info.
+    '''
+    with mappedelf.open_elf(file, use_mmap) as elffile:
+        if elffile.has_dwarf_info(True):
+            yield file, elffile
+            return
+
+        debug_file = find_debug_file(file, elffile, debug_dirs)
+        if debug_file is None:
+            yield None, None
+            return
+
+    logging.info("Using debug file {} for {}".format(debug_file, file))
+    with mappedelf.open_elf(debug_file, use_mmap) as elffile:
+        yield debug_file, elffile
+
+def section_descriptor(data, name):
+    return DebugSectionDescriptor(stream=io.BytesIO(data), name=name, global_offset=0, size=len(data), address=0)
+
+def section_data(descriptor):
+    descriptor.stream.seek(0)
+    return descriptor.stream.read(descriptor.size)
+
+def encode_uleb128(value):
+    encoded = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value == 0:
+            encoded.append(byte)
+            return bytes(encoded)
+        encoded.append(byte | 0x80)
+
+def encode_sleb128(value):
+    encoded = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if (value == 0 and not byte & 0x40) or (value == -1 and byte & 0x40):
+            encoded.append(byte)
+            return bytes(encoded)
+        encoded.append(byte | 0x80)
+
+def unit_version(data, little_endian):
+    '''
+    Returns the DWARF version of the first unit in .debug_info data
+    '''
+    endian = '<' if little_endian else '>'
+    length = struct.unpack_from(endian + 'I', data, 0)[0]
+    return struct.unpack_from(endian + 'H', data, 12 if length == 0xffffffff else 4)[0]
+
+def str_offsets_header_size(data, little_endian):
+    '''
+    Returns the size of the header of the DWARF 5 .debug_str_offsets
+    contribution at the start of data
+    '''
+    length = struct.unpack_from('<I' if little_endian else '>I', data, 0)[0]
+    return 16 if length == 0xffffffff else 8
+
+def with_unit_bases(data, bases):
+    '''
+    Returns the .debug_abbrev data of a split unit with the attributes of
+    bases, a dict of attribute code to value, added as implicit constants to
+    the abbrevs of its unit DIE's.  pyelftools reads the strings and
+    addresses of DWARF 5 units from their DW_AT_str_offsets_base and
+    DW_AT_addr_base, which split units don't have: their .debug_str_offsets
+    contribution is the one of the split file, or the one the package index
+    gives them, and their addresses are at the DW_AT_addr_base of their
+    skeleton.  The .debug_info itself is left as it is.  Returns None if data
+    holds more than one abbrev table, whose offsets this would move.
+    '''
+    patched = bytearray()
+    pos = 0
+    while pos < len(data):
+        start = pos
+        code, pos = read_uleb128(data, pos)
+        if code == 0:
+            if pos < len(data):
+                return None
+            patched += data[start:pos]
+            continue
+
+        tag, pos = read_uleb128(data, pos)
+        pos += 1  # DW_CHILDREN_*
+
+        names = set()
+        while True:
+            end = pos
+            name, pos = read_uleb128(data, pos)
+            form, pos = read_uleb128(data, pos)
+            if form == DW_FORM_implicit_const:
+                _, pos = read_sleb128(data, pos)
+            if name == 0 and form == 0:
+                break
+            names.add(name)
+
+        patched += data[start:end]
+        if tag in (DW_TAG_compile_unit, DW_TAG_type_unit):
+            for name, value in bases.items():
+                if name not in names:
+                    patched += encode_uleb128(name) + encode_uleb128(DW_FORM_implicit_const) + encode_sleb128(value)
+        patched += data[end:pos]
+
+    return bytes(patched)
+
+def split_dwarf_info(elffile, skeleton, contributions=None):
+    '''
+    Builds a DWARFInfo from the .dwo sections of elffile, for the split unit
+    of skeleton CU.  contributions maps section names to the (offset, size)
+    of one unit in a package file, whose sections are then cut down to that
+    unit's part.  The strings of DWARF 5 units are indexed from the start of
+    their .debug_str_offsets part, past its header, and their addresses read
+    from the skeleton's .debug_addr, see with_unit_bases.
+    '''
+    sections = {}
+    for argument, name in SPLIT_SECTIONS.items():
+        section = elffile.get_section_by_name(name + '.dwo')
+        if section is None:
+            sections[argument] = None
+            continue
+
+        if contributions is None:
+            sections[argument] = mappedelf.read_dwarf_section(elffile, section)
+        elif name == '.debug_str':
+            sections[argument] = mappedelf.read_dwarf_section(elffile, section)
+        elif name in contributions:
+            offset, size = contributions[name]
+            sections[argument] = section_descriptor(section.data()[offset:offset + size], name + '.dwo')
+        else:
+            sections[argument] = None
+
+    debug_addr = None
+    info = sections['debug_info_sec']
+    abbrev = sections['debug_abbrev_sec']
+    if info is not None and info.size > 0 and abbrev is not None and unit_version(section_data(info), elffile.little_endian) >= 5:
+        bases = {}
+        str_offsets = sections['debug_str_offsets_sec']
+        if str_offsets is not None and str_offsets.size > 0:
+            bases[DW_AT_str_offsets_base] = str_offsets_header_size(section_data(str_offsets), elffile.little_endian)
+        addr_base = skeleton.get_top_DIE().attributes.get('DW_AT_addr_base')
+        if addr_base is not None:
+            bases[DW_AT_addr_base] = addr_base.value
+            debug_addr = skeleton.dwarfinfo.debug_addr_sec
+
+        data = with_unit_bases(section_data(abbrev), bases)
+        if data is not None:
+            sections['debug_abbrev_sec'] = section_descriptor(data, '.debug_abbrev.dwo')
+
+    return DWARFInfo(
+        config=DwarfConfig(
+            little_endian=elffile.little_endian,
+            default_address_size=elffile.elfclass // 8,
+            machine_arch=elffile.get_machine_arch()),
+        debug_aranges_sec=None,
+        debug_frame_sec=None,
+        eh_frame_sec=None,
+        debug_ranges_sec=None,
+        debug_pubtypes_sec=None,
+        debug_pubnames_sec=None,
+        debug_addr_sec=debug_addr,
+        debug_line_str_sec=None,
+        debug_sup_sec=None,
+        gnu_debugaltlink_sec=None,
+        **sections
+    )
+
+def package_index(elffile):
+    '''
+    Parses the .debug_cu_index of a .dwp file into a dict of dwo_id to the
+    (offset, size) of each section contribution of that unit
+    '''
+    section = elffile.get_section_by_name('.debug_cu_index')
+    if section is None:
+        return {}
+
+    data = section.data()
+    endian = '<' if elffile.little_endian else '>'
+
+    version = struct.unpack_from(endian + 'I', data, 0)[0]
+    if version != 2:
+        version = struct.unpack_from(endian + 'H', data, 0)[0]
+    columns = PACKAGE_COLUMNS.get(version)
+    if columns is None:
+        logging.warning("Unsupported .debug_cu_index version {}".format(version))
+        return {}
+
+    section_count, unit_count, slot_count = struct.unpack_from(endian + 'III', data, 4)
+    pos = 16
+    signatures = struct.unpack_from(endian + '{}Q'.format(slot_count), data, pos)
+    pos += 8 * slot_count
+    rows = struct.unpack_from(endian + '{}I'.format(slot_count), data, pos)
+    pos += 4 * slot_count
+
+    column_ids = struct.unpack_from(endian + '{}I'.format(section_count), data, pos)
+    pos += 4 * section_count
+    offsets = struct.unpack_from(endian + '{}I'.format(section_count * unit_count), data, pos)
+    pos += 4 * section_count * unit_count
+    sizes = struct.unpack_from(endian + '{}I'.format(section_count * unit_count), data, pos)
+
+    index = {}
+    for signature, row in zip(signatures, rows):
+        if row == 0:
+            continue
+        start = (row - 1) * section_count
+        index[signature] = {
+            columns[column]: (offsets[start + i], sizes[start + i])
+            for i, column in enumerate(column_ids) if column in columns
+        }
+
+    return index
+
+def dwo_id(CU):
+    '''
+    Returns the id linking a skeleton CU to its split unit, or None
+    '''
+    if CU['version'] >= 5:
+        return CU.header.get('dwo_id')
+
+    attribute = CU.get_top_DIE().attributes.get('DW_AT_GNU_dwo_id')
+    return attribute.value if attribute is not None else None
+
+def is_skeleton(CU):
+    top_DIE = CU.get_top_DIE()
+    return top_DIE.tag == 'DW_TAG_skeleton_unit' or 'DW_AT_GNU_dwo_name' in top_DIE.attributes
+
+def add_gnu_split_forms(CU):
+    '''
+    pyelftools can't parse the GNU split forms used before DWARF 5, which are
+    encoded like their DWARF 5 counterparts.  Their values are left as indexes.
+    '''
+    forms = CU.structs.Dwarf_dw_form
+    forms.setdefault('DW_FORM_GNU_str_index', forms['DW_FORM_strx'])
+    forms.setdefault('DW_FORM_GNU_addr_index', forms['DW_FORM_addrx'])
+
+def find_split_CU(dwarfinfo, id):
+    '''
+    Returns the split CU with dwo_id id in dwarfinfo, or None.  Raises
+    DWARFError if it can't be read.  Type units aren't read: the types a
+    split unit refers to by signature are left unresolved.
+    '''
+    if dwarfinfo.has_debug_types():
+        logging.warning("Type units of split unit {} aren't read, the types they hold are left unresolved".format(id))
+
+    try:
+        for CU in dwarfinfo.iter_CUs():
+            add_gnu_split_forms(CU)
+            if CU.header.get('unit_type') == 'DW_UT_split_type':
+                logging.warning("Type unit at {} of split unit {} isn't read, the types it holds are left unresolved".format(CU.cu_offset, id))
+            elif id is None or dwo_id(CU) == id:
+                CU.get_top_DIE()
+                return CU
+    except DWARFError as e:
+        raise DWARFError("Can't read split unit {}: {}".format(id, e)) from e
+    return None
+
+class DebugFiles:
+    '''
+    Finds the split units of file's skeleton CU's.  A .dwp package next to
+    the file is opened the first time a split unit is needed and stays open;
+    .dwo files are only opened while their unit is processed.
+    '''
+    def __init__(self, file, use_mmap=True, debug_dirs=DEFAULT_DEBUG_DIRS):
+        self.file = file
+        self.use_mmap = use_mmap
+        self.debug_dirs = debug_dirs
+        self.files = ExitStack()
+        self.package = None
+        self.index = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.files.close()
+        self.package = None
+        self.index = None
+
+    def package_unit(self, id, skeleton):
+        if self.index is None:
+            self.index = {}
+            path = self.file + '.dwp'
+            if os.path.isfile(path):
+                logging.info("Using package {}".format(path))
+                self.package = self.files.enter_context(mappedelf.open_elf(path, self.use_mmap))
+                self.index = package_index(self.package)
+
+        if id not in self.index:
+            return None
+
+        return find_split_CU(split_dwarf_info(self.package, skeleton, self.index[id]), id)
+
+    def dwo_candidates(self, top_DIE):
+        attribute = top_DIE.attributes.get('DW_AT_dwo_name') or top_DIE.attributes.get('DW_AT_GNU_dwo_name')
+        if attribute is None or not isinstance(attribute.value, bytes):
+            return
+
+        name = os.fsdecode(attribute.value)
+        comp_dir = top_DIE.attributes.get('DW_AT_comp_dir')
+        if comp_dir is not None and isinstance(comp_dir.value, bytes):
+            yield os.path.join(os.fsdecode(comp_dir.value), name)
+        else:
+            yield name
+
+        directory = os.path.dirname(os.path.abspath(self.file))
+        yield os.path.join(directory, name)
+        yield os.path.join(directory, os.path.basename(name))
+        for debug_dir in self.debug_dirs:
+            yield os.path.join(debug_dir, os.path.basename(name))
+
+    @contextmanager
+    def split_unit(self, CU):
+        '''
+        Yields the split CU holding the DIE's of skeleton CU, or None if it
+        can't be found
+        '''
+        id = dwo_id(CU)
+
+        split_CU = self.package_unit(id, CU)
+        if split_CU is not None:
+            yield split_CU
+            return
+
+        for path in self.dwo_candidates(CU.get_top_DIE()):
+            if not os.path.isfile(path):
+                continue
+
+            with mappedelf.open_elf(path, self.use_mmap) as elffile:
+                split_CU = find_split_CU(split_dwarf_info(elffile, CU), id)
+                if split_CU is not None:
+                    yield split_CU
+                    return
+
+        logging.warning("Can't find split unit of CU at {} in {}".format(CU.cu_offset, self.file))
+        yield None
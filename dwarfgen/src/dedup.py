@@ -0,0 +1,232 @@
+'''
+Fingerprints of type DIE subtrees, used to skip building the copies of a type
+that every CU including the same header carries.  Structures, classes, unions
+and enumerations are deduplicated this way.
+'''
+import hashlib
+
+from . import rawdwarf
+from .wrapdie import CU_RELATIVE_REFERENCE_FORMS, reference
+
+
+'''
+Attributes that don't change the extracted types but differ between copies
+'''
+IGNORED_ATTRIBUTES = {
+    'DW_AT_sibling',
+    'DW_AT_decl_file',
+    'DW_AT_decl_line',
+    'DW_AT_decl_column',
+}
+
+REFERENCE_FORMS = {*CU_RELATIVE_REFERENCE_FORMS, 'DW_FORM_ref_addr'}
+
+'''
+Referenced types only contribute their qualified name and attributes to a
+fingerprint, which is all resolution reads from them
+'''
+NAMED_TYPE_TAGS = {
+    'DW_TAG_structure_type',
+    'DW_TAG_class_type',
+    'DW_TAG_union_type',
+    'DW_TAG_enumeration_type',
+}
+
+SCOPE_TAGS = NAMED_TYPE_TAGS | {'DW_TAG_namespace'}
+
+'''
+Attributes of a type's DIE compared before its subtree is fingerprinted
+'''
+KEY_ATTRIBUTES = (
+    'DW_AT_byte_size',
+    'DW_AT_decl_line',
+    'DW_AT_decl_column',
+    'DW_AT_declaration',
+)
+
+def new_digest():
+    return hashlib.blake2b(digest_size=16)
+
+def type_key(die):
+    '''
+    Returns the tag, key attributes and encoded length of the type at die.
+    The length is found from its DW_AT_sibling, or by skipping over the
+    subtree's raw bytes, without reading its DIE's.  Copies of a type have
+    equal keys, and types of different tags never do.
+    '''
+    attributes = die.attributes
+    values = tuple(attributes[name].value if name in attributes else None for name in KEY_ATTRIBUTES)
+
+    length = None
+    if 'DW_AT_sibling' in attributes:
+        length = reference(die, 'DW_AT_sibling') - die.offset
+    elif isinstance(die, rawdwarf.RawDIE):
+        length = die.reader.scan(die.offset)[0] - die.offset
+
+    return (die.tag, values, length)
+
+class Built:
+    '''
+    A type that was built, by its key and offset.  The fingerprint and
+    preorder offsets of its subtree are only filled in once a type with the
+    same name and key has to be compared to it.
+    '''
+    __slots__ = ('key', 'offset', 'fingerprint', 'offsets')
+
+    def __init__(self, key, offset):
+        self.key = key
+        self.offset = offset
+        self.fingerprint = None
+        self.offsets = None
+
+class TypeDeduplicator:
+    '''
+    Remembers the last structure, union or enumeration built under each
+    name.  A type with the same name is first compared to it by type_key,
+    which rules out most types that aren't copies, and only then are both
+    fingerprinted.  Fingerprints cover the tag, qualified name and attributes
+    of every DIE in the subtree, and the fingerprints of the types they
+    reference, so an equal fingerprint means building the copy would produce
+    the same type.  Offsets are only meaningful within a single FLAT, so a
+    deduplicator has to be replaced whenever FLAT is.
+
+    Types are compared as read by the native scanner, with the
+    attributes and leaf_tags of rawdwarf.die_reader, however the walk reads
+    them.  The scanner decodes every attribute the walk reads, and checking a
+    copy this way costs much less than building it from pyelftools' DIE's.
+    '''
+    def __init__(self, attributes, leaf_tags):
+        self.attributes = attributes
+        self.leaf_tags = leaf_tags
+        # (namespace, name) -> Built of the last type built there
+        self.last_built = {}
+        # keeps the namespaces in last_built alive, so their ids aren't reused
+        self.namespaces = {}
+        # DIE offset -> fingerprint of the DIE as a referenced type
+        self.type_fingerprints = {}
+        self.qualified_names = {}
+
+    def find(self, die, namespace, name):
+        '''
+        Returns the Built of the type at die, and the Built of an equal type
+        that was the last one built into namespace as name, or None.  The offsets of both are filled in when it's found.
+        '''
+        die = self.read_walked_DIE(die)
+        built = Built(type_key(die), die.offset)
+
+        original = self.last_built.get((id(namespace), name))
+        if original is None or original.key != built.key:
+            return built, None
+
+        if original.fingerprint is None:
+            CU = die.dwarfinfo.get_CU_containing(original.offset)
+            self.fingerprint(original, self.read_DIE(CU, original.offset))
+        self.fingerprint(built, die)
+
+        if built.fingerprint != original.fingerprint:
+            return built, None
+        return built, original
+
+    def read_DIE(self, CU, offset):
+        '''
+        Returns the DIE at offset in CU read by the native scanner, or by
+        pyelftools if the scanner can't read CU
+        '''
+        try:
+            return rawdwarf.die_reader(CU, self.attributes, self.leaf_tags).die(offset)
+        except rawdwarf.UnsupportedForm:
+            return CU.get_DIE_from_refaddr(offset)
+
+    def read_walked_DIE(self, die):
+        '''
+        Returns the DIE the walk reached at die like read_DIE, with the
+        parents the walk already found for it
+        '''
+        read = self.read_DIE(die.cu, die.offset)
+
+        child = read
+        parent = die.get_parent()
+        while isinstance(child, rawdwarf.RawDIE) and child._parent is None and parent is not None:
+            child.set_parent(self.read_DIE(die.cu, parent.offset))
+            child = child._parent
+            parent = parent.get_parent()
+
+        return read
+
+    def add(self, built, namespace, name):
+        self.last_built[(id(namespace), name)] = built
+        self.namespaces[id(namespace)] = namespace
+
+    def fingerprint(self, built, die):
+        digest = new_digest()
+        offsets = []
+        digest.update(self.qualified_name(die).encode())
+        self.update_subtree(digest, die, offsets)
+
+        built.fingerprint = digest.digest()
+        built.offsets = offsets
+
+    def update_subtree(self, digest, die, offsets):
+        offsets.append(die.offset)
+        self.update_die(digest, die)
+
+        for child in die.iter_children():
+            self.update_subtree(digest, child, offsets)
+        digest.update(b'\0')
+
+    def update_die(self, digest, die):
+        digest.update(str(die.tag).encode())
+
+        for name, attribute in die.attributes.items():
+            if name in IGNORED_ATTRIBUTES:
+                continue
+
+            digest.update(str(name).encode())
+
+            if attribute.form in REFERENCE_FORMS:
+                digest.update(self.type_fingerprint(die.get_DIE_from_attribute(name)))
+            else:
+                digest.update(repr(attribute.value).encode())
+
+    def type_fingerprint(self, die):
+        if die.offset in self.type_fingerprints:
+            return self.type_fingerprints[die.offset]
+
+        # placeholder that ends reference cycles
+        self.type_fingerprints[die.offset] = str(die.tag).encode()
+
+        digest = new_digest()
+        if die.tag in NAMED_TYPE_TAGS:
+            digest.update(self.qualified_name(die).encode())
+            self.update_attributes(digest, die)
+        else:
+            self.update_subtree(digest, die, [])
+
+        self.type_fingerprints[die.offset] = digest.digest()
+        return self.type_fingerprints[die.offset]
+
+    def update_attributes(self, digest, die):
+        digest.update(str(die.tag).encode())
+
+        for name, attribute in die.attributes.items():
+            if name in IGNORED_ATTRIBUTES or attribute.form in REFERENCE_FORMS:
+                continue
+            digest.update(str(name).encode())
+            digest.update(repr(attribute.value).encode())
+
+    def qualified_name(self, die):
+        '''
+        Names of the namespaces and types enclosing die, outermost first
+        '''
+        if die.offset in self.qualified_names:
+            return self.qualified_names[die.offset]
+
+        parent = die.get_parent()
+        if parent is None or parent.tag not in SCOPE_TAGS:
+            scope = ''
+        else:
+            scope = self.qualified_name(parent) + '::'
+
+        name = die.attributes.get('DW_AT_name')
+        self.qualified_names[die.offset] = scope + (repr(name.value) if name is not None else '')
+        return self.qualified_names[die.offset]
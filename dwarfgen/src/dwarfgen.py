@@ -1,23 +1,132 @@
+import fnmatch
+import functools
 import importlib
+import inspect
 import json
 import logging
-from elftools.elf.elffile import ELFFile
+import os
+import struct
+from collections import namedtuple, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, ExitStack
+from elftools.dwarf.dwarfinfo import DWARFInfo
 
 from .jidl.namespace import  Namespace
 from .jidl.structure import Structure
-from .jidl.member import Member
-
-from .wrapdie import wrap_die
+from .jidl.member import Member, BoundsList, intern
+
+from .wrapdie import wrap_die, reference
+from . import wrapdie
+from .dedup import TypeDeduplicator
+from . import accel
+from . import batch
+from . import cache
+from . import columnar
+from . import debugfiles
+from . import mappedelf
 from . import policies
+from . import rawdwarf
+from . import spill
 from .policies import default
 from .lookups import CODE_TO_LANG
+from .options import Options
+
+
+'''
+Number of CU chunks handed to each worker process when extracting in parallel
+'''
+CHUNKS_PER_JOB = 4
 
+'''
+Offsets of split units are moved above 1 << SPLIT_UNIT_SHIFT, by the offset of
+their skeleton, so they stay unique in FLAT next to the offsets of the file's
+own CU's and still fit in an int64, see unit_base
+'''
+SPLIT_UNIT_SHIFT = 32
+
+'''
+Options of the extraction running in this process
+'''
+OPTIONS = Options()
 
 FLAT = None
+
+'''
+Structures already built into FLAT, by the fingerprint of their DIE subtree
+'''
+DEDUP = None
+
+'''
+Companion files of the file being extracted, holding its split units
+'''
+DEBUG_FILES = None
+
+'''
+Tags of the DIE's types are built from
+'''
+TYPE_TAGS = (
+    'DW_TAG_structure_type',
+    'DW_TAG_class_type',
+    'DW_TAG_union_type',
+    'DW_TAG_base_type',
+    'DW_TAG_string_type',
+    'DW_TAG_typedef',
+    'DW_TAG_pointer_type',
+    'DW_TAG_reference_type',
+    'DW_TAG_array_type',
+    'DW_TAG_subrange_type',
+    'DW_TAG_enumeration_type',
+    'DW_TAG_const_type',
+)
+
+'''
+Attributes the native scanner decodes: the ones wrapdie and the policies read
+'''
+NATIVE_ATTRIBUTES = frozenset(
+    ['DW_AT_' + attr for attr in wrapdie.ATTRIBUTES + wrapdie.REFERENCE_ATTRIBUTES + wrapdie.DECODE_ATTRIBUTES] +
+    ['DW_AT_main_subprogram']
+)
+
+'''
+Childless DIE's the native scanner builds.  The walk does nothing with any
+other childless DIE, so those are passed over.
+'''
+NATIVE_LEAF_TAGS = frozenset(TYPE_TAGS + (
+    'DW_TAG_namespace',
+    'DW_TAG_member',
+    'DW_TAG_inheritance',
+    'DW_TAG_template_type_param',
+    'DW_TAG_enumerator',
+))
+
+'''
+Tags of the DIE's find_roots matches against the roots
+'''
+ROOT_TAGS = (
+    'DW_TAG_structure_type',
+    'DW_TAG_class_type',
+    'DW_TAG_union_type',
+    'DW_TAG_enumeration_type',
+    'DW_TAG_typedef',
+)
+
+'''
+Kinds of the types recorded in FLAT
+'''
+STRUCTURE, ENUMERATION, UNION, BASE, STRING, ARRAY, SUBRANGE, TYPEDEF, POINTER, REFERENCE, CONST = range(11)
+
+'''
+A type recorded in FLAT.  Fields the data policies don't give for its kind
+are None.  type is the offset of the type this one refers to, or a string
+for the types that don't have one, such as "void".  extra holds the
+subrange offsets of arrays, and the (lower, upper) bounds of subranges.
+'''
+TypeRecord = namedtuple('TypeRecord', ['kind', 'name', 'size', 'type', 'extra'])
+
 class FlatStructure:
     '''
-    This is a structure that maps type-reference info to a dictionary
-    of data.  By type-reference, I mean the hexadecimal lookup value
+    This is a structure that maps type-reference info to a record of
+    data.  By type-reference, I mean the hexadecimal lookup value
     found for each type in a dwarf structure.  This FlatStructure reduces
     the amount of data and transforms it  for the purposes of this
     script.  There is another set of data that is calculated as the script
@@ -27,28 +136,116 @@ class FlatStructure:
     are calculated at the same time and then the FLAT structure is used
     to supplement the nested structures at the end of the script.
     '''
-    def __init__(self):
-        self.structures = {}
-        self.enumerations = {}
-        self.unions = {}
-        self.base_types = {}
-        self.string_types = {}
-        self.array_types = {}
-        self.subrange_types = {}
-        self.type_defs = {}
-        self.pointer_types = {}
-        self.reference_types = {}
-        self.ignored_types = {}
-        self.const_types = {}
+    def __init__(self, store=None):
+        self.store = store
+        self.types = {} if store is None else store.types()
+        self.forget()
+
+    def forget(self):
+        '''
+        Drops what resolution memoized.  Types are resolved once this
+        structure is complete, and the memos only hold until it changes.
+        When the types are in a spill.Store, so that FLAT isn't held in
+        memory, each memo only keeps as many entries as the store does.
+        '''
+        memo = dict if self.store is None else functools.partial(spill.Memo, self.store.cache_size)
+        self.targets = memo()
+        self.names = memo()
+        self.sizes = memo()
+        self.pointer_depths = memo()
+        self.type_strs = memo()
+        self.bounds = memo()
+
+    def add(self, kind, offset, data):
+        '''
+        Records the type at offset from the dict built by a data policy
+        '''
+        extra = None
+        if kind == ARRAY:
+            extra = tuple(data['subranges'])
+        elif kind == SUBRANGE:
+            extra = (data['lower_bound'], data['upper_bound'])
+
+        self.types[offset] = TypeRecord(kind, data.get('name'), data.get('size'), data.get('type'), extra)
+
+    def merge(self, other):
+        '''
+        DIE offsets are unique across the whole .debug_info section, so
+        partial structures built from different CU's never collide
+        '''
+        self.types.update(other.types)
+        self.forget()
+
+    def alias(self, offsets, original_offsets):
+        '''
+        Makes the DIE's at offsets share the records of the equivalent DIE's
+        at original_offsets
+        '''
+        for offset, original_offset in zip(offsets, original_offsets):
+            if original_offset in self.types:
+                self.types[offset] = self.types[original_offset]
+        self.forget()
+
+    def rebase(self, delta):
+        '''
+        Shifts every DIE offset held by this structure by delta.  Types that
+        aren't offsets, such as "void", are left alone.  Records shared by
+        aliased DIE's stay shared.
+        '''
+        rebased = {}
+        records = {}
+        for offset, record in self.types.items():
+            if id(record) not in records:
+                type_offset = record.type
+                if isinstance(type_offset, int):
+                    type_offset += delta
+                extra = record.extra
+                if record.kind == ARRAY:
+                    extra = tuple(subrange + delta for subrange in extra)
+                records[id(record)] = record._replace(type=type_offset, extra=extra)
+            rebased[offset + delta] = records[id(record)]
+        self.types = rebased
+        self.forget()
 
 '''
 This is the policy class that will be created based on the language
 '''
 POLICY = None
 
+'''
+The handlers of the DIE's tags under POLICY, see compile_handlers
+'''
+HANDLERS = None
+
+'''
+Policies and their handlers by (DWARF version, language), which are shared
+by most CU's of a file
+'''
+POLICIES = {}
+
 def apply_policies(version, language):
-    global POLICY
+    global POLICY, HANDLERS
+
+    key = (version, language)
+    if key not in POLICIES:
+        policy = load_policy(version, language)
+        POLICIES[key] = (policy, compile_handlers(policy))
+
+    POLICY, HANDLERS = POLICIES[key]
+
+def apply_cu_policies(CU):
+    '''
+    Applies the policies of CU's language, and returns its code, or None if
+    the language isn't known
+    '''
+    language = wrap_die(CU.get_top_DIE()).language()
+    if language not in CODE_TO_LANG:
+        return None
+
+    apply_policies(CU.header.version, language)
+    return language
 
+def load_policy(version, language):
     policy_language_module = default
     detected_language = CODE_TO_LANG[language].lower()
 
@@ -58,62 +255,763 @@ def apply_policies(version, language):
         pass
 
     policy_module = importlib.import_module(policy_language_module.__name__+'.policy')
-    POLICY = policy_module.Policy(version, language)
+    return policy_module.Policy(version, language)
+
+def compile_handlers(policy):
+    '''
+    Builds the tag -> handler table build_die dispatches on.  A handler takes
+    the DIE and its namespace, and returns True if the DIE's children must
+    not be walked afterwards.  Tags without a handler are only walked.
+    '''
+    handlers = {
+        'DW_TAG_structure_type': build_structure_like,
+        'DW_TAG_class_type': build_structure_like,
+        'DW_TAG_union_type': build_union_type,
+        'DW_TAG_enumeration_type': build_enumeration_type,
+        'DW_TAG_namespace': build_namespace,
+    }
+
+    for tag in policy.function_scope_policy.TAGS:
+        handlers[tag] = build_function_scope
+
+    flat_types = [
+        ('DW_TAG_base_type', BASE, policy.valid_base_type_policy, policy.base_type_data_policy),
+        ('DW_TAG_string_type', STRING, policy.valid_string_type_policy, policy.string_type_data_policy),
+        ('DW_TAG_typedef', TYPEDEF, policy.valid_typedef_policy, policy.typedef_data_policy),
+        ('DW_TAG_pointer_type', POINTER, policy.valid_pointer_type_policy, policy.pointer_type_data_policy),
+        ('DW_TAG_reference_type', REFERENCE, policy.valid_reference_type_policy, policy.reference_type_data_policy),
+        ('DW_TAG_array_type', ARRAY, policy.valid_array_policy, policy.array_data_policy),
+        ('DW_TAG_subrange_type', SUBRANGE, policy.valid_subrange_policy, policy.subrange_data_policy),
+        ('DW_TAG_const_type', CONST, policy.valid_const_type_policy, policy.const_type_data_policy),
+    ]
+    for tag, kind, valid_policy, data_policy in flat_types:
+        handlers[tag] = flat_type_handler(kind, valid_policy.check, data_policy.check)
+
+    return handlers
+
+def flat_type_handler(kind, valid, data):
+    '''
+    Returns the handler of a type of kind that only has a FLAT record
+    '''
+    def handler(die, namespace):
+        if valid(die):
+            FLAT.add(kind, die.offset, data(die))
+
+    return handler
+
+def has_dwarf_info(elffile):
+    if elffile is None or not elffile.has_dwarf_info():
+        print('file has no DWARF info, compile with \'-g\'')
+        return False
+    return True
+
+@contextmanager
+def open_dwarf_info(file, use_mmap=True):
+    '''
+    Yields the DWARFInfo of file, or None if it has no DWARF info.  Section
+    data may be read lazily from a memory mapping of file, so the DWARFInfo
+    must not be used after the context exits.
+    '''
+    with mappedelf.open_elf(file, use_mmap) as elffile:
+        if not has_dwarf_info(elffile):
+            yield None
+            return
 
-def process(files):
-    global FLAT
+        # get_dwarf_info returns a DWARFInfo context object, which is the
+        # starting point for all DWARF-based processing in pyelftools.
+        yield elffile.get_dwarf_info()
 
+def process_cu(CU, namespace):
+    '''
+    Runs the DIE walk for a single CU, adding its types to namespace and FLAT.
+    Returns the detected language code, or None if the CU was skipped.
+    '''
+    if debugfiles.is_skeleton(CU):
+        return process_split_cu(CU, namespace)
+
+    top_DIE = wrap_die(read_top_DIE(CU))
+
+    language = top_DIE.language()
+
+    if language not in CODE_TO_LANG:
+        logging.error('Unkown Language from producer {}'.format(language))
+        return None
+    else:
+        logging.info("Detected Language " + CODE_TO_LANG[language])
+
+    apply_policies(CU.header.version, language)
+    die_info_rec(top_DIE, namespace)
+    rawdwarf.release(CU)
+
+    return language
+
+def read_top_DIE(CU):
+    '''
+    Returns the top DIE of CU, read by the native scanner if it's enabled and
+    can read CU
+    '''
+    if OPTIONS.native_scanner:
+        try:
+            return rawdwarf.die_reader(CU, NATIVE_ATTRIBUTES, NATIVE_LEAF_TAGS).top_DIE()
+        except rawdwarf.UnsupportedForm as e:
+            logging.info("Reading CU at {} with pyelftools, {} isn't supported".format(CU.cu_offset, e))
+
+    return CU.get_top_DIE()
+
+def walk_cu(CU):
+    '''
+    Walks CU on its own, into a new Namespace and FlatStructure.  Returns
+    them with the detected language.
+    '''
+    global FLAT, DEDUP
+
+    flat, dedup = FLAT, DEDUP
+    FLAT, DEDUP = FlatStructure(), TypeDeduplicator(NATIVE_ATTRIBUTES, NATIVE_LEAF_TAGS)
     namespace = Namespace('')
+    try:
+        language = process_cu(CU, namespace)
+        if OPTIONS.skips_types():
+            record_skipped_types(CU.dwarfinfo, namespace)
+        return namespace, FLAT, language
+    finally:
+        FLAT, DEDUP = flat, dedup
+
+def process_split_cu(CU, namespace):
+    '''
+    Walks the split unit of skeleton CU, found in a .dwo or .dwp file, into
+    namespace and FLAT.  Split units have offsets of their own, so the unit
+    is walked on its own and moved to its place above the file's offsets.
+    '''
+    with DEBUG_FILES.split_unit(CU) as split_CU:
+        if split_CU is None:
+            return None
+        unit_namespace, unit_flat, language = walk_cu(split_CU)
+
+    if split_CU.dwarfinfo.debug_info_sec.size > 1 << SPLIT_UNIT_SHIFT:
+        raise ValueError("Split unit of CU at {} has more than {} bytes of DIE's".format(CU.cu_offset, 1 << SPLIT_UNIT_SHIFT))
+    delta = unit_base(CU)
+    unit_namespace.rebase(delta)
+    unit_flat.rebase(delta)
+    namespace.merge(unit_namespace)
+    FLAT.merge(unit_flat)
+
+    return language
+
+def unit_base(CU):
+    '''
+    Returns the offset the DIE offsets of CU's walk are relative to: its own
+    for a CU of the file, a base of its own above the file's offsets for the
+    split unit of a skeleton CU
+    '''
+    if not debugfiles.is_skeleton(CU):
+        return CU.cu_offset
+    if CU.dwarfinfo.debug_info_sec.size >= 1 << (63 - SPLIT_UNIT_SHIFT):
+        raise ValueError("Split units of files with more than {} bytes of DIE's aren't supported".format(1 << (63 - SPLIT_UNIT_SHIFT)))
+    return (CU.cu_offset + 1) << SPLIT_UNIT_SHIFT
+
+def process_cu_cached(CU, namespace, cu_cache):
+    '''
+    Like process_cu, but reuses the partial results of a CU with the same
+    contents from cu_cache.  Cached results are stored relative to the CU's
+    base and rebased onto this one before being merged.  Every CU is walked
+    on its own, so its partial results never depend on the CU's before it.
+    '''
+    key = cu_cache.key(CU)
+    cached = cu_cache.load(key) if key is not None else None
+
+    base = unit_base(CU)
+    if cached is not None:
+        cu_namespace, cu_flat, language = cached
+        cu_namespace.rebase(base)
+        cu_flat.rebase(base)
+    else:
+        cu_namespace, cu_flat, language = walk_cu(CU)
+
+        if key is not None:
+            cu_namespace.rebase(-base)
+            cu_flat.rebase(-base)
+            cu_cache.store(key, (cu_namespace, cu_flat, language), evict=False)
+            cu_namespace.rebase(base)
+            cu_flat.rebase(base)
+
+    namespace.merge(cu_namespace)
+    FLAT.merge(cu_flat)
+
+    return language
+
+def process_cus(CUs, namespace, cu_cache=None):
+    '''
+    Walks CUs into namespace and FLAT, returning the last detected language
+    '''
+    language = None
+    for CU in CUs:
+        if not keeps_cu(CU):
+            logging.info("Skipping CU at {}".format(CU.cu_offset))
+        elif cu_cache is None:
+            language = process_cu(CU, namespace) or language
+        else:
+            language = process_cu_cached(CU, namespace, cu_cache) or language
 
-    for file in files:
-        with open(file, 'rb') as f:
-            elffile = ELFFile(f)
+        if OPTIONS.bounded_memory:
+            rawdwarf.release(CU)
+        if OPTIONS.spill is not None:
+            OPTIONS.spill.trim()
 
-            if not elffile.has_dwarf_info():
-                print('file has no DWARF info, compile with \'-g\'')
-                return
+    return language
+
+'''
+Attributes of a CU's top DIE naming it for the cu_filter, the first one it
+has is used.  Skeleton CU's have no DW_AT_name, only the name of their split
+DWARF file.
+'''
+CU_NAME_ATTRIBUTES = ('DW_AT_name', 'DW_AT_dwo_name', 'DW_AT_GNU_dwo_name')
 
-            # get_dwarf_info returns a DWARFInfo context object, which is the
-            # starting point for all DWARF-based processing in pyelftools.
-            dwarfinfo = elffile.get_dwarf_info()
+def keeps_cu(CU):
+    '''
+    Returns True if a glob of the cu_filter matches CU's name, see
+    CU_NAME_ATTRIBUTES, its DW_AT_comp_dir or the path they make together.
+    CU's with neither leave the cu_filter nothing to match, and are kept.
+    Only CU's header and top DIE are read, the CU's of a file are found by
+    their unit length.
+    '''
+    if OPTIONS.cu_filter is None:
+        return True
 
-        FLAT = FlatStructure()
+    top_DIE = CU.get_top_DIE()
+    name = next((wrapdie.string(top_DIE, attr) for attr in CU_NAME_ATTRIBUTES if attr in top_DIE.attributes), '')
+    comp_dir = wrapdie.string(top_DIE, 'DW_AT_comp_dir') if 'DW_AT_comp_dir' in top_DIE.attributes else ''
+    paths = [path for path in (name, comp_dir, os.path.join(comp_dir, name)) if path != '']
 
-        for CU in dwarfinfo.iter_CUs():
+    if paths == []:
+        logging.warning("Keeping CU at {}, it has no name or directory for the CU filter to match".format(CU.cu_offset))
+        return True
 
-            top_DIE = CU.get_top_DIE()
-            wrap_die(top_DIE)
+    return any(fnmatch.fnmatchcase(path, pattern) for pattern in OPTIONS.cu_filter for path in paths)
 
-            language = top_DIE.language()
+'''
+Caches rawdwarf and wrapdie keep on a DWARFInfo, of what they decoded from its
+sections.  They're shared by the DWARFInfo's bounded_dwarf_info makes.
+'''
+SHARED_CACHES = ('_raw_sections', '_raw_abbrev_tables', '_raw_strings', '_decoded_strings')
 
-            if language not in CODE_TO_LANG:
-                logging.error('Unkown Language from producer {}'.format(language))
+def bounded_dwarf_info(dwarfinfo):
+    '''
+    Returns a DWARFInfo of the same sections as dwarfinfo, with caches of
+    CU's and DIE's of its own, which are dropped with it.  Only FLAT and the
+    namespaces keep what a walk extracted, so nothing it parsed is reachable
+    once it's dropped, and CU's it referred to are parsed again by the next
+    one.
+
+    The DWARFInfo is made from the attributes of dwarfinfo named after the
+    arguments of DWARFInfo, which pyelftools keeps under the same names.
+    When one of them isn't kept, dwarfinfo itself is returned and memory
+    isn't bounded.
+    '''
+    fields = dwarf_info_fields()
+    missing = tuple(name for name in fields if not hasattr(dwarfinfo, name))
+    if missing:
+        warn_unbounded(missing)
+        return dwarfinfo
+
+    bounded = DWARFInfo(**{name: getattr(dwarfinfo, name) for name in fields})
+    bounded.supplementary_dwarfinfo = dwarfinfo.supplementary_dwarfinfo
+    for name in SHARED_CACHES:
+        bounded.__dict__[name] = dwarfinfo.__dict__.setdefault(name, {})
+    return bounded
+
+@functools.lru_cache(maxsize=None)
+def dwarf_info_fields():
+    '''
+    Returns the names of the arguments of DWARFInfo
+    '''
+    parameters = inspect.signature(DWARFInfo.__init__).parameters
+    return tuple(name for name in parameters if name != 'self')
+
+@functools.lru_cache(maxsize=None)
+def warn_unbounded(missing):
+    logging.warning("This pyelftools' DWARFInfo doesn't keep {}, memory isn't bounded".format(', '.join(missing)))
+
+def CU_at(dwarfinfo, offset):
+    '''
+    Returns the CU at offset of dwarfinfo.  With bounded_memory, it's parsed
+    by a bounded_dwarf_info of its own, so it's dropped with the DIE's it
+    cached as soon as the walk moves on.
+    '''
+    if OPTIONS.bounded_memory:
+        dwarfinfo = bounded_dwarf_info(dwarfinfo)
+    return dwarfinfo.get_CU_at(offset)
+
+def iter_CUs(dwarfinfo):
+    '''
+    Yields the CU's of dwarfinfo, see CU_at
+    '''
+    if not OPTIONS.bounded_memory:
+        yield from dwarfinfo.iter_CUs()
+        return
+
+    offset = 0
+    while offset < dwarfinfo.debug_info_sec.size:
+        CU = CU_at(dwarfinfo, offset)
+        yield CU
+        offset += CU.size
+
+def find_roots(dwarfinfo, index=None):
+    '''
+    Returns the offsets of the definitions of the roots, the first one found
+    of each, in the order of the roots.  Roots that are only declared, such
+    as some template instantiations, are found by their first declaration.
+
+    The roots are looked up first in index, the name index of the file from
+    accel.open_index, see find_indexed_roots.  The ones it doesn't define
+    are searched for in every CU.  Only the DIE's directly in a CU or a
+    namespace are read, or in a function too with function_local_types, and
+    the search stops as soon as every root is defined.  Split units and the
+    CU's the cu_filter skips aren't searched.
+    '''
+    found = {}
+    declared = {}
+    if index is not None:
+        find_indexed_roots(dwarfinfo, index, found, declared)
+
+    if len(found) < len(OPTIONS.roots):
+        logging.info("Searching every CU for root types")
+        for CU in iter_CUs(dwarfinfo):
+            if searches_cu(CU):
+                find_scope_roots(wrap_die(CU.get_top_DIE()), Namespace(''), found, declared)
+
+            if len(found) == len(OPTIONS.roots):
+                break
+
+    found = {**declared, **found}
+    for root in OPTIONS.roots:
+        if root not in found:
+            logging.warning("Can't find root type {}".format(root))
+
+    return [found[root] for root in OPTIONS.roots if root in found]
+
+def find_indexed_roots(dwarfinfo, index, found, declared):
+    '''
+    Adds the roots index finds to found and declared, like find_scope_roots.
+    Only the DIE's index points to are read, and checked to be the root
+    they're looked up by.  With indexes that only point to CU's, those CU's
+    are searched like find_roots searches every CU, once every root has been
+    looked up.  DIE's and CU's are read in the order of their offsets, so a
+    root defined in several CU's is found in the one the search of every CU
+    finds it in.
+    '''
+    indexed_cus = set()
+    for root in OPTIONS.roots:
+        try:
+            candidates = sorted(index.lookup(root, ROOT_TAGS), key=lambda candidate: (candidate[0], candidate[1] or 0))
+        except (ValueError, struct.error) as e:
+            logging.warning("Can't look up {} in the index: {}".format(root, e))
+            continue
+
+        for cu_offset, die_offset in candidates:
+            if root in found:
+                break
+
+            if die_offset is None:
+                indexed_cus.add(cu_offset)
                 continue
-            else:
-                logging.info("Detected Language " + CODE_TO_LANG[language])
 
-            apply_policies(CU.header.version, language)
-            die_info_rec(top_DIE, namespace)
+            CU = CU_at(dwarfinfo, cu_offset)
+            if not searches_cu(CU):
+                continue
+
+            die = wrap_die(CU.get_DIE_from_refaddr(die_offset))
+            if die.tag in ROOT_TAGS and root_name(die) == root:
+                add_root(die, root, found, declared)
+
+    for cu_offset in sorted(indexed_cus):
+        if len(found) == len(OPTIONS.roots):
+            break
+
+        CU = CU_at(dwarfinfo, cu_offset)
+        if searches_cu(CU):
+            find_scope_roots(wrap_die(CU.get_top_DIE()), Namespace(''), found, declared)
+
+def searches_cu(CU):
+    '''
+    Returns True if roots are searched for in CU, once the policies of its
+    language are applied
+    '''
+    if debugfiles.is_skeleton(CU) or not keeps_cu(CU):
+        return False
+
+    language = wrap_die(CU.get_top_DIE()).language()
+    if language not in CODE_TO_LANG:
+        return False
+
+    apply_policies(CU.header.version, language)
+    return True
+
+def find_scope_roots(die, namespace, found, declared):
+    '''
+    Adds the offsets of the roots in the scope at die to found if they're
+    defined there, and to declared otherwise, by qualified name
+    '''
+    for child in iter_children(die.die):
+        child = wrap_die(child)
+
+        if child.tag == 'DW_TAG_namespace':
+            find_scope_roots(child, POLICY.namespace_application_policy(child, namespace=namespace), found, declared)
+        elif OPTIONS.function_local_types and child.tag in POLICY.function_scope_policy.TAGS:
+            find_scope_roots(child, namespace, found, declared)
+        elif child.tag in ROOT_TAGS:
+            name = namespace.qualify(POLICY.no_namespace_name_policy(child))
+            if name in OPTIONS.roots and name not in found:
+                add_root(child, name, found, declared)
+
+def add_root(die, name, found, declared):
+    if 'DW_AT_declaration' in die.attributes:
+        declared.setdefault(name, die.offset)
+    else:
+        found[name] = die.offset
+
+def root_name(die):
+    '''
+    Returns the qualified name find_scope_roots finds die by, or None if it
+    doesn't search the scope die is in
+    '''
+    names = []
+    for scope in enclosing_scopes(die):
+        if scope.tag == 'DW_TAG_namespace':
+            names.append(scope.name())
+        elif not (OPTIONS.function_local_types and scope.tag in POLICY.function_scope_policy.TAGS):
+            return None
+
+    return '::'.join(names + [POLICY.no_namespace_name_policy(die)])
+
+def enclosing_scopes(die):
+    '''
+    Returns the ancestors of die below the top DIE of its CU, outermost
+    first
+    '''
+    scopes = []
+    parent = die.get_parent()
+    while parent is not None and parent.get_parent() is not None:
+        scopes.append(parent)
+        parent = parent.get_parent()
+
+    scopes.reverse()
+    return scopes
+
+def process_roots(dwarfinfo, namespace, index=None):
+    '''
+    Builds the types of the roots, and every type they reach through members,
+    bases, typedefs, pointers and arrays, into namespace and FLAT.  Each type
+    is read straight from its offset, whichever CU it's in, and built on its
+    own the way the walk of its CU would, without the types nested in it.
+    The offsets the built type refers to, the same ones resolution follows,
+    are walked next.  Returns the last detected language.
+    '''
+    pending = deque(find_roots(dwarfinfo, index))
+    walked = set()
+    size = dwarfinfo.debug_info_sec.size
+
+    language = None
+    while pending:
+        offset = pending.popleft()
+        # references that aren't offsets in .debug_info, such as type unit
+        # signatures, are left unresolved like the walk of a CU leaves them
+        if not isinstance(offset, int) or not 0 <= offset < size or offset in walked or offset in FLAT.types:
+            continue
+        walked.add(offset)
+
+        die_namespace, die_flat, die_language = walk_reached(dwarfinfo.get_DIE_from_refaddr(offset))
+        pending.extend(columnar.type_offsets(die_namespace))
+        record = die_flat.types.get(offset)
+        if record is not None:
+            pending.append(record.type)
+            if record.kind == ARRAY:
+                pending.extend(record.extra)
+
+        namespace.merge(die_namespace)
+        FLAT.merge(die_flat)
+        language = die_language or language
+        if OPTIONS.spill is not None:
+            OPTIONS.spill.trim()
+
+    return language
+
+def walk_reached(die):
+    '''
+    Builds the type at die into a new Namespace and FlatStructure, with its
+    handler only.  The types nested in it are left to be reached on their
+    own.  Returns them with the language of die's CU.
+    '''
+    global FLAT, DEDUP
+
+    namespace = Namespace('')
+    language = apply_cu_policies(die.cu)
+    if language is None:
+        return namespace, FlatStructure(), None
+
+    flat, dedup = FLAT, DEDUP
+    FLAT, DEDUP = FlatStructure(), TypeDeduplicator(NATIVE_ATTRIBUTES, NATIVE_LEAF_TAGS)
+    try:
+        die = wrap_die(die)
+        handler = HANDLERS.get(die.tag)
+        if handler is not None:
+            handler(die, reached_scope(die, namespace))
+        return namespace, FLAT, language
+    finally:
+        FLAT, DEDUP = flat, dedup
+
+def reached_scope(die, namespace):
+    '''
+    Returns the namespace under namespace the walk of die's CU would build
+    die into.  Types the walk only builds into FLAT, such as the ones local
+    to a function or in a namespace the type filter leaves out, get a
+    namespace of their own that's dropped.
+    '''
+    ancestors = enclosing_scopes(die)
+    scope = Namespace('')
+    kept = True
+    for ancestor in ancestors:
+        if ancestor.tag == 'DW_TAG_namespace':
+            scope = scope.create_namespace(ancestor.name())
+            kept = kept and (OPTIONS.type_filter is None or OPTIONS.type_filter.keeps_namespace(scope.qualified_name))
+            if kept:
+                namespace = namespace.create_namespace(ancestor.name())
+        elif HANDLERS.get(ancestor.tag) is build_function_scope and not OPTIONS.function_local_types and POLICY.function_scope_policy(ancestor):
+            kept = False
+
+    # the namespace application policy names the children of a namespace,
+    # whether they're kept or not
+    if ancestors != [] and ancestors[-1].tag == 'DW_TAG_namespace':
+        die.namespace = scope.qualified_name
+
+    return namespace if kept else Namespace('')
+
+'''
+DWARFInfo of the file a worker process extracts CU's from
+'''
+WORKER_DWARFINFO = None
+WORKER_FILES = ExitStack()
+WORKER_CU_CACHE = None
+
+def init_worker(file, binary, options):
+    global WORKER_DWARFINFO, WORKER_CU_CACHE, DEBUG_FILES, OPTIONS
+    OPTIONS = options
+    WORKER_DWARFINFO = WORKER_FILES.enter_context(open_dwarf_info(file, options.use_mmap))
+    WORKER_CU_CACHE = open_cu_cache(options)
+    DEBUG_FILES = WORKER_FILES.enter_context(debugfiles.DebugFiles(binary, options.use_mmap, options.debug_dirs))
+
+def extract_cus(cu_offsets):
+    '''
+    Worker entry point.  Builds a partial FlatStructure and Namespace from the
+    CU's at cu_offsets, which are merged back together by the parent process.
+    '''
+    global FLAT, DEDUP
+
+    FLAT = FlatStructure()
+    DEDUP = TypeDeduplicator(NATIVE_ATTRIBUTES, NATIVE_LEAF_TAGS)
+    namespace = Namespace('')
+
+    CUs = (CU_at(WORKER_DWARFINFO, cu_offset) for cu_offset in cu_offsets)
+    language = process_cus(CUs, namespace, WORKER_CU_CACHE)
+
+    return namespace, FLAT, language
 
+def split_cus(dwarfinfo, chunk_count):
+    '''
+    Splits the CU's into at most chunk_count runs of consecutive CU's of
+    roughly equal .debug_info size.  Keeping runs consecutive means merging
+    the partial results in order reproduces the serial walk.  CU's the
+    cu_filter skips are left out.
+    '''
+    cus = [(CU.cu_offset, CU['unit_length']) for CU in dwarfinfo.iter_CUs() if keeps_cu(CU)]
+    chunk_size = sum(size for _, size in cus) / chunk_count
+
+    chunks = []
+    chunk = []
+    total = 0
+    for cu_offset, size in cus:
+        chunk.append(cu_offset)
+        total += size
+        if total >= chunk_size * (len(chunks) + 1):
+            chunks.append(chunk)
+            chunk = []
 
-        # Ada does not use DW_TAG_namespace like C++, so namespace inference comes from DW_AT_name of types
-        # This function moves structures around and creates namespaces to make it look identical to what c++
-        # processing would produce prior to calling "resolve_namespace".
-        if CODE_TO_LANG[language] == 'ADA':
-            ada_disperse_structures(namespace)
+    if chunk != []:
+        chunks.append(chunk)
 
+    return chunks
+
+def process_cus_parallel(file, dwarfinfo, namespace, debug_files):
+    '''
+    Extracts the CU's of file with a pool of OPTIONS.jobs worker processes.
+    Each worker loads the file once and handles several chunks so a few large
+    CU's don't leave the other workers idle.
+    '''
+    jobs = OPTIONS.jobs
+    chunks = split_cus(dwarfinfo, jobs * CHUNKS_PER_JOB)
+
+    language = None
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker, initargs=(file, debug_files.file, OPTIONS)) as executor:
+        for partial_namespace, partial_flat, partial_language in executor.map(extract_cus, chunks):
+            namespace.merge(partial_namespace)
+            FLAT.merge(partial_flat)
+            language = partial_language or language
+            if OPTIONS.spill is not None:
+                OPTIONS.spill.trim()
+
+    return language
+
+def extract_file(file, dwarfinfo, debug_files, cu_cache=None, index=None):
+    global FLAT, DEDUP, DEBUG_FILES
+
+    namespace = Namespace('', OPTIONS.spill)
+    FLAT = FlatStructure(OPTIONS.spill)
+    DEDUP = TypeDeduplicator(NATIVE_ATTRIBUTES, NATIVE_LEAF_TAGS)
+    DEBUG_FILES = debug_files
+
+    if OPTIONS.roots is not None:
+        language = process_roots(dwarfinfo, namespace, index)
+    elif OPTIONS.jobs > 1:
+        language = process_cus_parallel(file, dwarfinfo, namespace, debug_files)
+    else:
+        language = process_cus(iter_CUs(dwarfinfo), namespace, cu_cache)
+
+    if cu_cache is not None:
+        cu_cache.evict()
+
+    # Ada does not use DW_TAG_namespace like C++, so namespace inference comes from DW_AT_name of types
+    # This function moves structures around and creates namespaces to make it look identical to what c++
+    # processing would produce prior to calling "resolve_namespace".
+    if language is not None and CODE_TO_LANG[language] == 'ADA':
+        ada_disperse_structures(namespace)
+
+    if OPTIONS.skips_types():
+        record_skipped_types(bounded_dwarf_info(dwarfinfo) if OPTIONS.bounded_memory else dwarfinfo, namespace)
+    if OPTIONS.skips_types() or OPTIONS.roots is not None:
+        prune_namespaces(namespace)
+
+    if OPTIONS.columnar_resolver:
+        columnar.resolve_namespace(namespace, FLAT)
+    else:
         resolve_namespace(namespace)
 
     return namespace
 
-def build_base_type(die):
-    if not POLICY.valid_base_type_policy(die):
-        return
+def open_cu_cache(options):
+    '''
+    Returns the cache of the CU's extracted with options, or None
+    '''
+    if options.cache_dir is None:
+        return None
+    return cache.CUCache(options.cache_dir, options.cache_size, options.cached())
+
+def process_file(file, options=None):
+    '''
+    Extracts and resolves the types of a single file with options, an
+    Options.  Returns None if the file has no DWARF info.  With a cache_dir,
+    a file whose DWARF content was seen before is loaded from the cache
+    without parsing any DWARF, and otherwise only the CU's that weren't seen
+    before are walked.
+
+    Stripped files are read from their separate debug file, searched for in
+    debug_dirs, and the split units of skeleton CU's from .dwo or .dwp files.
+
+    Only the namespaces and types whose qualified name is kept by the
+    type_filter are extracted, see typefilter.  With source_roots, only the
+    structures, enumerations and unions declared in a file under one of
+    these directories are extracted, see declared_outside.  Namespaces left
+    empty by either are dropped.  With a cu_filter, only the CU's whose path
+    matches one of these globs are walked, see keeps_cu.
+
+    With roots, qualified names such as "app::Point", only the types they
+    reach are extracted, and instead of walking every CU only their DIE's
+    are read, see process_roots.  Those are read one at a time, so jobs and
+    native_scanner don't apply.  The roots are looked up in the file's
+    .debug_names, .debug_pubtypes or .gdb_index if it has one, unless
+    name_index is False, see find_roots.
+    '''
+    global OPTIONS
+    OPTIONS = options if options is not None else Options()
+
+    with debugfiles.open_dwarf_elf(file, OPTIONS.use_mmap, OPTIONS.debug_dirs) as (dwarf_file, elffile):
+        if not has_dwarf_info(elffile):
+            return None
+
+        result_cache = None
+        if OPTIONS.cache_dir is not None:
+            result_cache = cache.ResultCache(OPTIONS.cache_dir, OPTIONS.cache_size, OPTIONS.cached())
+            key = result_cache.key(elffile)
+
+            namespace = result_cache.load(key)
+            if namespace is not None:
+                logging.info("Loaded {} from cache".format(file))
+                return namespace
 
-    FLAT.base_types[die.offset] = POLICY.base_type_data_policy(die)
+        dwarfinfo = elffile.get_dwarf_info()
+        index = None
+        if OPTIONS.roots is not None and OPTIONS.name_index:
+            index = accel.open_index(elffile, dwarfinfo)
+
+        with debugfiles.DebugFiles(file, OPTIONS.use_mmap, OPTIONS.debug_dirs) as debug_files:
+            namespace = extract_file(dwarf_file, dwarfinfo, debug_files, open_cu_cache(OPTIONS), index)
+
+        if result_cache is not None:
+            result_cache.store(key, namespace)
+
+    return namespace
+
+def process(files, options=None, **kwargs):
+    '''
+    Extracts and resolves the types of files into a single namespace, see
+    process_file.  options is an Options, or else one is built from kwargs.
+    With a spill_dir, FLAT and the namespaces are kept in a spill.Store
+    there.  The store is shared by the files, so they can only be processed
+    one at a time.
+    '''
+    if options is None:
+        options = Options(**kwargs)
+    elif kwargs != {}:
+        raise TypeError("process takes either options or keyword arguments")
+
+    options.spill = None
+    if options.spill_dir is not None:
+        options.spill = spill.Store(options.spill_dir, options.spill_cache_size)
+
+    namespace = Namespace('', options.spill)
+
+    files, sizes = batch.unique_files(files, options.debug_dirs)
+
+    results = batch.process_files(files, sizes, process_file, options.file_jobs, options)
+
+    try:
+        for file, file_namespace in results:
+            if file_namespace is None:
+                return
+
+            # a single spilled namespace isn't copied into another
+            if options.spill is not None and len(files) == 1:
+                return file_namespace
+
+            namespace.merge(file_namespace)
+            if options.spill is not None:
+                options.spill.trim()
+
+        return namespace
+    finally:
+        if options.spill is not None:
+            release_spill(options)
+
+def release_spill(options):
+    '''
+    Drops the references the run kept to the spill.Store of options, so the
+    store and its file go away with the namespace process returned
+    '''
+    global FLAT, DEDUP
+    FLAT = None
+    DEDUP = None
+    options.spill = None
 
 def build_structure_child(structure, die, namespace):
-    wrap_die(die)
+    die = wrap_die(die)
 
     if die.is_template_type_param():
         #TODO implement some sort of template parameters
@@ -141,6 +1039,32 @@ def build_structure_child(structure, die, namespace):
     elif die.is_union_type():
         build_union_type(die, namespace)
 
+def alias_duplicate_type(die, namespace, name):
+    '''
+    Checks the structure, union or enumeration at die, named name, against
+    the ones already built.  A copy of the last one built under the same
+    name, such as one from a header included by several CU's, only gets its
+    DIE's aliased to the original's FLAT entries instead of being built
+    again.  Returns True if die was handled this way.
+    '''
+    built, original = DEDUP.find(die, namespace, name)
+
+    if original is None:
+        DEDUP.add(built, namespace, name)
+        return False
+
+    FLAT.alias(built.offsets, original.offsets)
+    return True
+
+def build_structure_like(die, namespace):
+    if declared_outside(die):
+        return True
+    if POLICY.valid_structure_policy(die) and filtered_out(die, namespace):
+        return True
+    if POLICY.valid_structure_policy(die) and alias_duplicate_type(die, namespace, POLICY.no_namespace_name_policy(die)):
+        return True
+    build_structure_type(die, namespace)
+
 def build_structure_type(die, namespace):
 
     # invalid structure
@@ -149,13 +1073,13 @@ def build_structure_type(die, namespace):
 
     structure = namespace.create_structure(POLICY.no_namespace_name_policy(die), die.byte_size() if die.has_byte_size() else 0)
 
-    FLAT.structures[die.offset] = POLICY.structure_data_policy(die)
+    FLAT.add(STRUCTURE, die.offset, POLICY.structure_data_policy(die))
 
     for child in die.iter_children():
         build_structure_child(structure, child, namespace)
 
-def build_union_child(union, members, die):
-    wrap_die(die)
+def build_union_child(union, die):
+    die = wrap_die(die)
 
     if die.is_template_type_param():
         #TODO implement some sort of template parameters
@@ -174,57 +1098,33 @@ def build_union_child(union, members, die):
         build_subrange_type(die)
 
 def build_union_type(die, namespace):
+    if declared_outside(die):
+        return True
 
     # invalid structure
     if not POLICY.valid_union_policy(die):
         return
 
+    if filtered_out(die, namespace):
+        return True
+    if alias_duplicate_type(die, namespace, POLICY.no_namespace_name_policy(die)):
+        return True
+
     union = namespace.create_union(POLICY.no_namespace_name_policy(die), die.byte_size())
 
-    FLAT.unions[die.offset] = POLICY.union_data_policy(die)
-    members = FLAT.unions[die.offset]['members']
+    FLAT.add(UNION, die.offset, POLICY.union_data_policy(die))
 
     for child in die.iter_children():
-        build_union_child(union, members, child)
-
-def build_type_def(die):
-    if not POLICY.valid_typedef_policy(die):
-        return
-
-    FLAT.type_defs[die.offset] = POLICY.typedef_data_policy(die)
-
-def build_array_type(die):
-    if not POLICY.valid_array_policy(die):
-        return
-
-    FLAT.array_types[die.offset] = POLICY.array_data_policy(die)
+        build_union_child(union, child)
 
 def build_subrange_type(die):
     if not POLICY.valid_subrange_policy(die):
         return
 
-    FLAT.subrange_types[die.offset] = POLICY.subrange_data_policy(die)
-
-def build_string_type(die):
-    if not POLICY.valid_string_type_policy(die):
-        return
-
-    FLAT.string_types[die.offset] = POLICY.string_type_data_policy(die)
-
-def build_pointer_type(die):
-    if not POLICY.valid_pointer_type_policy(die):
-        return
-
-    FLAT.pointer_types[die.offset] = POLICY.pointer_type_data_policy(die)
-
-def build_reference_type(die):
-    if not POLICY.valid_reference_type_policy(die):
-        return
+    FLAT.add(SUBRANGE, die.offset, POLICY.subrange_data_policy(die))
 
-    FLAT.reference_types[die.offset] = POLICY.reference_type_data_policy(die)
-
-def build_enumeration_child(enumeration, values, die):
-    wrap_die(die)
+def build_enumeration_child(enumeration, die):
+    die = wrap_die(die)
 
     if not POLICY.valid_enumerator_policy(die):
         return
@@ -236,9 +1136,16 @@ def build_enumeration_child(enumeration, values, die):
     return POLICY.enumerator_data_policy(die)
 
 def build_enumeration_type(die, namespace):
+    if declared_outside(die):
+        return True
     if not POLICY.valid_enumeration_policy(die):
         return
 
+    if filtered_out(die, namespace):
+        return True
+    if alias_duplicate_type(die, namespace, die.name()):
+        return True
+
     enumeration = namespace.create_enumeration(
         die.name(),
         die.byte_size(),
@@ -246,195 +1153,498 @@ def build_enumeration_type(die, namespace):
         die.encoding()
     )
 
-    FLAT.enumerations[die.offset] = POLICY.enumeration_data_policy(die)
-    values = FLAT.enumerations[die.offset]['values']
+    FLAT.add(ENUMERATION, die.offset, POLICY.enumeration_data_policy(die))
 
     for child in die.iter_children():
-        build_enumeration_child(enumeration, values, child)
+        build_enumeration_child(enumeration, child)
+
+def iter_children(die):
+    '''
+    Yields the children of die, like DIE.iter_children.  When a child has no
+    DW_AT_sibling and its own children weren't iterated, the next sibling is
+    found by skipping the child's subtree in the raw .debug_info instead of
+    parsing every DIE in it.  The native scanner's DIE's already do this.
+    The end of die's subtree is kept on it as _children_end, rather than in
+    the private DIE._terminator pyelftools keeps for its own iteration.
+    '''
+    if isinstance(die, rawdwarf.RawDIE):
+        yield from die.iter_children()
+        return
+
+    if not die.has_children:
+        return
+
+    CU = die.cu
+    offset = die.offset + die.size
+
+    while True:
+        child = CU.get_DIE_from_refaddr(offset)
+        child.set_parent(die)
+
+        if child.is_null():
+            die._children_end = child.offset + child.size
+            return
+
+        yield child
+
+        if not child.has_children:
+            offset += child.size
+        elif 'DW_AT_sibling' in child.attributes:
+            offset = reference(child, 'DW_AT_sibling')
+        elif getattr(child, '_children_end', None) is not None:
+            offset = child._children_end
+        else:
+            offset = subtree_end(child)
+
+def subtree_end(die):
+    '''
+    Returns the .debug_info offset just past die and its children
+    '''
+    try:
+        return rawdwarf.unit_reader(die.cu).scan(die.offset)[0]
+    except rawdwarf.UnsupportedForm:
+        for _ in iter_children(die):
+            pass
+        return die._children_end
+
+def build_local_types(die):
+    '''
+    Builds the types defined in the function scope at die into FLAT only,
+    so the types outside of it referencing them still resolve.  The scope is
+    scanned in the raw .debug_info, and only the DIE's of its types parsed.
+    '''
+    # local types don't go into the output, and their namespace is dropped
+    namespace = Namespace('')
 
-def build_const_type(die):
-    if not POLICY.valid_const_type_policy(die):
+    try:
+        found = rawdwarf.unit_reader(die.cu).scan(die.offset, TYPE_TAGS)[1]
+    except rawdwarf.UnsupportedForm:
+        die_info_rec(die, namespace)
         return
 
-    FLAT.const_types[die.offset] = POLICY.const_type_data_policy(die)
+    for offset, parent_offset in found:
+        child = get_DIE(die.die, offset)
+        child.set_parent(get_DIE(die.die, parent_offset))
+        build_die(child, namespace)
+
+def get_DIE(die, offset):
+    '''
+    Returns the DIE at offset in the CU of die, read the same way as die
+    '''
+    if isinstance(die, rawdwarf.RawDIE):
+        return die.reader.die(offset)
+    return die.cu.get_DIE_from_refaddr(offset)
+
+def filtered_out(die, namespace):
+    '''
+    Returns True if the type filter leaves out the namespace or type at die.
+    Its subtree isn't walked, the types in it that kept types refer to are
+    recorded afterwards, see record_skipped_types.
+    '''
+    if OPTIONS.type_filter is None:
+        return False
+
+    name = namespace.qualify(POLICY.no_namespace_name_policy(die))
+    if die.tag == 'DW_TAG_namespace':
+        kept = OPTIONS.type_filter.keeps_namespace(name)
+    else:
+        kept = OPTIONS.type_filter.keeps_type(name)
+
+    return not kept
+
+def declared_files(CU):
+    '''
+    Returns whether each file of CU's line program is under the source roots,
+    as a bytearray indexed by DW_AT_decl_file, or None if CU has no line
+    program.  The compiler's pseudo files, such as <built-in>, aren't under
+    any.
+    It's resolved once per CU and kept on it.
+    '''
+    if '_declared_files' in CU.__dict__:
+        return CU._declared_files
+
+    line_program = CU.dwarfinfo.line_program_for_CU(CU)
+    if line_program is None:
+        CU._declared_files = None
+        return None
+
+    header = line_program.header
+    directories = [directory.decode() for directory in header.include_directory]
+    files = list(header.file_entry)
+    comp_dir = ''
+    if header.version < 5:
+        # file and directory indexes start at 1, directory 0 is the CU's
+        top_DIE = CU.get_top_DIE()
+        if 'DW_AT_comp_dir' in top_DIE.attributes:
+            comp_dir = wrapdie.string(top_DIE, 'DW_AT_comp_dir')
+        directories.insert(0, comp_dir)
+        files.insert(0, None)
+    elif directories:
+        # directory 0 is the CU's, the others may be relative to it
+        comp_dir = directories[0]
+
+    declared = bytearray(len(files))
+    for index, entry in enumerate(files):
+        if entry is None:
+            declared[index] = True
+            continue
+
+        name = entry.name.decode()
+        if name.startswith('<') and name.endswith('>'):
+            continue
+
+        directory = directories[entry.dir_index] if entry.dir_index < len(directories) else ''
+        path = os.path.normpath(os.path.join(comp_dir, directory, name))
+        declared[index] = any(path == root or path.startswith(root + os.sep) for root in OPTIONS.source_roots)
+
+    CU._declared_files = declared
+    return declared
+
+def declared_outside(die):
+    '''
+    Returns True if the type at die was declared in a file outside of the
+    source roots, and is skipped like filtered_out's.  This is checked
+    before any policy runs.  Types without a DW_AT_decl_file are declared
+    in the file of the declaration their DW_AT_specification refers to, or
+    else of the namespace they're in, such as template instantiations.
+    Types without any, such as the declarations of incomplete types or the
+    compiler's builtin ones, can't be placed under a source root and are
+    skipped too.  Types in CU's without a line program, such as split units,
+    are kept.
+    '''
+    if OPTIONS.source_roots is None:
+        return False
+
+    declared = declared_files(die.cu)
+    if declared is None:
+        return False
+
+    scope = die
+    while not scope.has_decl_file():
+        if scope.has_specification():
+            scope = wrap_die(scope.get_DIE_from_attribute('DW_AT_specification'))
+            declared = declared_files(scope.cu)
+            if declared is None:
+                return False
+        else:
+            scope = scope.get_parent()
+            if scope is None or scope.tag != 'DW_TAG_namespace':
+                return True
+
+    file = scope.decl_file()
+    return file < len(declared) and not declared[file]
+
+def prune_namespaces(namespace):
+    '''
+    Drops the namespaces nothing was extracted in
+    '''
+    for name, n in list(namespace.namespaces.items()):
+        prune_namespaces(n)
+        if n.namespaces == {} and len(n.structures) == 0 and len(n.enumerations) == 0 and len(n.unions) == 0:
+            del namespace.namespaces[name]
+
+def record_skipped_types(dwarfinfo, namespace):
+    '''
+    Records the types the walk skipped, in subtrees the type filter or the
+    source roots left out, that the types of namespace still reach.  The
+    offsets resolution follows are walked from namespace through FLAT, and
+    the ones without a record are read from dwarfinfo and recorded on their
+    own.  Offsets outside of its .debug_info, such as the ones of split
+    units already rebased, are left alone.
+    '''
+    pending = deque(columnar.type_offsets(namespace))
+    walked = set()
+    size = dwarfinfo.debug_info_sec.size
+
+    while pending:
+        offset = pending.popleft()
+        if not isinstance(offset, int) or offset in walked:
+            continue
+        walked.add(offset)
+
+        record = FLAT.types.get(offset)
+        if record is None and 0 <= offset < size:
+            record_type(dwarfinfo.get_DIE_from_refaddr(offset))
+            record = FLAT.types.get(offset)
+        if record is None:
+            continue
+
+        pending.append(record.type)
+        if record.kind == ARRAY:
+            pending.extend(record.extra)
+
+def record_type(die):
+    '''
+    Records the type at die in FLAT only, with the policies of its CU, the
+    way the walk would have if die wasn't skipped.  Its children aren't
+    walked.
+    '''
+    die = wrap_die(die)
+    if die.tag not in TYPE_TAGS or apply_cu_policies(die.cu) is None:
+        return
+
+    # names die the way the namespace application policy would
+    reached_scope(die, Namespace(''))
+
+    if die.is_structure_like():
+        if POLICY.valid_structure_policy(die):
+            FLAT.add(STRUCTURE, die.offset, POLICY.structure_data_policy(die))
+    elif die.is_union_type():
+        if POLICY.valid_union_policy(die):
+            FLAT.add(UNION, die.offset, POLICY.union_data_policy(die))
+    elif die.is_enumeration_type():
+        if POLICY.valid_enumeration_policy(die):
+            FLAT.add(ENUMERATION, die.offset, POLICY.enumeration_data_policy(die))
+    else:
+        HANDLERS[die.tag](die, None)
+
+def build_namespace(die, namespace):
+    if filtered_out(die, namespace):
+        return True
+    new_namespace = POLICY.namespace_application_policy(die, namespace=namespace)
+    die_info_rec(die, new_namespace)
+    return True
+
+def build_function_scope(die, namespace):
+    if OPTIONS.function_local_types or not POLICY.function_scope_policy(die):
+        return False
+    build_local_types(die)
+    return True
 
 def die_info_rec(die, namespace:Namespace):
-    for child in die.iter_children():
-        wrap_die(child)
-
-        if child.is_structure_like():
-            build_structure_type(child, namespace)
-        elif child.is_union_type():
-            build_union_type(child, namespace)
-        elif child.is_base_type():
-            build_base_type(child)
-        elif child.is_string_type():
-            build_string_type(child)
-        elif child.is_typedef():
-            build_type_def(child)
-        elif child.is_pointer_type():
-            build_pointer_type(child)
-        elif child.is_reference_type():
-            build_reference_type(child)
-        elif child.is_array_type():
-            build_array_type(child)
-        elif child.is_subrange_type():
-            build_subrange_type(child)
-        elif child.is_enumeration_type():
-            build_enumeration_type(child, namespace)
-        elif child.is_const_type():
-            build_const_type(child)
-        elif child.is_namespace():
-            new_namespace = POLICY.namespace_application_policy(child, namespace=namespace)
-            die_info_rec(child, new_namespace)
-
-        if not child.is_namespace():
-            die_info_rec(child, namespace)
+    for child in iter_children(die.die):
+        build_die(child, namespace)
+
+def build_die(die, namespace:Namespace):
+    die = wrap_die(die)
+
+    handler = HANDLERS.get(die.tag)
+    if handler is not None and handler(die, namespace):
+        return
+
+    die_info_rec(die, namespace)
+
+def type_cycle(type_offset):
+    return ValueError("Type offset {} refers back to itself".format(type_offset))
 
 def resolve_type_offset(type_offset, flat):
-    if type_offset in flat.array_types:
-        type_offset = flat.array_types[type_offset]['type']
+    if type_offset in flat.targets:
+        return flat.targets[type_offset]
+
+    start = type_offset
+    record = flat.types.get(type_offset)
 
-    if type_offset in flat.subrange_types:
-        type_offset = flat.subrange_types[type_offset]['type']
+    if record is not None and record.kind == ARRAY:
+        type_offset = record.type
+        record = flat.types.get(type_offset)
 
-    while type_offset in flat.type_defs:
-        type_offset = flat.type_defs[type_offset]['type']
+    if record is not None and record.kind == SUBRANGE:
+        type_offset = record.type
+        record = flat.types.get(type_offset)
 
+    path = []
+    while record is not None and record.kind == TYPEDEF:
+        if type_offset in path:
+            raise type_cycle(type_offset)
+        path.append(type_offset)
+        type_offset = record.type
+        record = flat.types.get(type_offset)
+
+    flat.targets[start] = type_offset
     return type_offset
 
 def resolve_type(type_offset, flat):
-    if type_offset in FLAT.base_types:
-        return FLAT.base_types[type_offset]
-    elif type_offset in FLAT.structures:
-        return FLAT.structures[type_offset]
-    elif type_offset in FLAT.unions:
-        return FLAT.unions[type_offset]
-    elif type_offset in FLAT.string_types:
-        return FLAT.string_types[type_offset]
-    elif type_offset in FLAT.type_defs:
-        return FLAT.type_defs[type_offset]
-    elif type_offset in FLAT.pointer_types:
-        return FLAT.pointer_types[type_offset]
-    elif type_offset in FLAT.reference_types:
-        return FLAT.reference_types[type_offset]
-    elif type_offset in FLAT.enumerations:
-        return FLAT.enumerations[type_offset]
-    elif type_offset in FLAT.const_types:
-        return FLAT.const_types[type_offset]
-    elif type_offset in FLAT.array_types:
-        return FLAT.array_types[type_offset]
-    raise ValueError
-
-def get_pointer_chain_count(type_offset):
+    try:
+        return flat.types[type_offset]
+    except KeyError:
+        raise ValueError
+
+def get_pointer_chain_count(type_offset, flat):
+    '''
+    Returns the number of pointers chained from type_offset.  Every pointer
+    on the chain gets its own count memoized on the way.
+    '''
     count = 0
-    while type_offset in FLAT.pointer_types:
-        type_offset = FLAT.pointer_types[type_offset]['type']
+    path = []
+    while type_offset not in flat.pointer_depths:
+        record = flat.types.get(type_offset)
+        if record is None or record.kind != POINTER:
+            break
+        if type_offset in path:
+            raise type_cycle(type_offset)
+        path.append(type_offset)
+        type_offset = record.type
+    else:
+        count = flat.pointer_depths[type_offset]
+
+    for offset in reversed(path):
         count += 1
+        flat.pointer_depths[offset] = count
 
     return count
 
 def resolve_type_offset_name(type_offset, flat):
-
+    '''
+    Returns the name type_offset resolves to.  Every type walked through
+    resolves to the same name, so it's memoized for all of them.
+    '''
+    path = []
     try:
-        data = {}
-        while 'name' not in data:
-            data = resolve_type(type_offset, flat)
-            if 'type' in data:
-                type_offset = data['type']
-            else:
+        while type_offset not in flat.names:
+            if type_offset in path:
+                raise type_cycle(type_offset)
+            path.append(type_offset)
+
+            record = resolve_type(type_offset, flat)
+            if record.type is None:
+                name = record.name
                 break
+            type_offset = record.type
 
             # TODO this is a hack to fix some DW_TAG_pointer_types not having
             # a type offset.  The assumption is this is 'void*', but it's not
             # validated yet
             if isinstance(type_offset, str):
-                return type_offset
+                name = type_offset
+                break
 
-        return data['name']
+            if record.name is not None:
+                name = record.name
+                break
+        else:
+            name = flat.names[type_offset]
     except ValueError:
         logging.warning("Can't resolve name for type offset {}".format(type_offset))
         raise
 
+    for offset in path:
+        flat.names[offset] = name
+
+    return name
+
 def resolve_type_offset_size(type_offset, flat):
+    '''
+    Like resolve_type_offset_name, for the size of type_offset
+    '''
+    path = []
     try:
-        data = resolve_type(type_offset, flat)
-        while 'size' not in data:
-            data = resolve_type(type_offset, flat)
-            if 'type' in data:
-                type_offset = data['type']
-            else:
+        while type_offset not in flat.sizes:
+            if type_offset in path:
+                raise type_cycle(type_offset)
+            path.append(type_offset)
+
+            record = resolve_type(type_offset, flat)
+            if record.size is not None or record.type is None:
+                size = record.size
                 break
-
-        return data['size']
+            type_offset = record.type
+        else:
+            size = flat.sizes[type_offset]
     except ValueError:
         logging.warning("Can't resolve name for type offset {}".format(type_offset))
         raise
 
+    for offset in path:
+        flat.sizes[offset] = size
+
+    return size
+
 def resolve_enumeration(enumeration):
     type_offset = enumeration.type
     resolved_type = resolve_type_offset(type_offset, FLAT)
     enumeration.type_str = resolve_type_offset_name(resolved_type, FLAT)
 
 def resolve(base_type):
+    if OPTIONS.lazy_resolution:
+        resolver = functools.partial(resolve_member, FLAT)
+        for member in base_type.members.values():
+            member.resolver = resolver
+        return
+
     for member in base_type.members.values():
-        type_offset = member.type_offset
-        resolved_type = resolve_type_offset(type_offset, FLAT)
+        resolve_member(FLAT, member)
 
-        member.type_str = resolve_type_offset_name(resolved_type, FLAT)
-        if member.bit_size is None:
-            member.byte_size = resolve_type_offset_size(resolved_type, FLAT)
+def resolve_member_type_str(type_offset, flat):
+    '''
+    Returns the type string of members of the type at type_offset.  It's
+    memoized in flat.type_strs and interned, so members of the same type
+    share a single string.
+    '''
+    if type_offset in flat.type_strs:
+        return flat.type_strs[type_offset]
 
-        if type_offset in FLAT.array_types:
-            FLAT_array_type = FLAT.array_types[type_offset]
-            array_subranges = FLAT_array_type['subranges']
+    type_str = resolve_type_offset_name(resolve_type_offset(type_offset, flat), flat)
 
-            size = 0
-            for subrange in array_subranges:
-                subrange_type = FLAT.subrange_types[subrange]
-                upper_bound = subrange_type['upper_bound']
-                lower_bound = subrange_type['lower_bound']
+    record = flat.types.get(type_offset)
+    if record is not None and record.kind == REFERENCE:
+        count = get_pointer_chain_count(record.type, flat)
+        if count:
+            type_str += (" " + " ".join(["pointer"]*count))
 
-                subrange_size = (upper_bound - lower_bound + 1) * member.byte_size
-                if size == 0:
-                    size = subrange_size
-                else:
-                    size *= subrange_size
+        type_str += " reference"
 
-                member.add_to_bounds_list(lower_bound, upper_bound)
+    elif record is not None and record.kind == POINTER:
+        count = get_pointer_chain_count(type_offset, flat)
+        type_str += (" " + " ".join(["pointer"]*count))
 
-            member.type_str = member.type_str
-            member.byte_size = size
-            if member.bit_size is not None:
-                member.byte_size = None
+    type_str = flat.type_strs[type_offset] = intern(type_str)
+    return type_str
 
-        if type_offset in FLAT.reference_types:
+def resolve_array_bounds(type_offset, flat):
+    '''
+    Returns the bounds of the array type at type_offset, or None if it has no
+    subranges.  They're memoized in flat.bounds, so members of the same
+    array type share them.
+    '''
+    if type_offset in flat.bounds:
+        return flat.bounds[type_offset]
+
+    subranges = flat.types[type_offset].extra
+    bounds = flat.bounds[type_offset] = tuple(
+        BoundsList(index, *flat.types[subrange].extra) for index, subrange in enumerate(subranges)
+    ) or None
+    return bounds
 
-            type_ref = FLAT.reference_types[type_offset]['type']
+def resolve_member(flat, member):
+    type_offset = member.type_offset
+    resolved_type = resolve_type_offset(type_offset, flat)
 
-            if type_ref in FLAT.pointer_types:
-                count = get_pointer_chain_count(type_ref)
-                member.type_str += (" " + " ".join(["pointer"]*count))
+    member.type_str = resolve_member_type_str(type_offset, flat)
+    if member.bit_size is None:
+        member.byte_size = resolve_type_offset_size(resolved_type, flat)
 
-            member.type_str += " reference"
+    record = flat.types.get(type_offset)
+    if record is None:
+        return
 
-        if type_offset in FLAT.pointer_types:
-            count = get_pointer_chain_count(type_offset)
-            member.type_str += (" " + " ".join(["pointer"]*count))
+    if record.kind == ARRAY:
+        member.bounds_list = resolve_array_bounds(type_offset, flat)
+
+        size = 0
+        for bound in member.bounds_list or ():
+            subrange_size = (bound.upper - bound.lower + 1) * member.byte_size
+            if size == 0:
+                size = subrange_size
+            else:
+                size *= subrange_size
 
-        if type_offset in FLAT.subrange_types:
-            member.max_val = FLAT.subrange_types[type_offset]['upper_bound']
-            member.min_val = FLAT.subrange_types[type_offset]['lower_bound']
+        member.byte_size = size
+        if member.bit_size is not None:
+            member.byte_size = None
+
+    elif record.kind == SUBRANGE:
+        member.min_val, member.max_val = record.extra
 
 def resolve_union(union):
     resolve(union)
 
-def resolve_structure(structure):
-
+def resolve_base_structures(structure):
     for base_structure in structure.base_structures.values():
         resolved_type = resolve_type_offset(base_structure.type_offset, FLAT)
         base_structure.type = resolve_type_offset_name(resolved_type, FLAT)
 
+def resolve_structure(structure):
+    resolve_base_structures(structure)
     resolve(structure)
 
 def ada_disperse_structures(namespace):
@@ -0,0 +1,24 @@
+def build_id(elffile):
+    '''
+    Returns the GNU build-id of elffile as a hex string, or None if the file
+    wasn't linked with one
+    '''
+    section = elffile.get_section_by_name('.note.gnu.build-id')
+    if section is None:
+        return None
+
+    for note in section.iter_notes():
+        if note['n_type'] == 'NT_GNU_BUILD_ID':
+            return note['n_desc']
+
+    return None
+
+def is_debug_section(section):
+    return section.name.startswith('.debug_') or section.name.startswith('.zdebug_')
+
+def debug_sections_size(elffile):
+    '''
+    Size on disk of all DWARF sections, used as an estimate of the work
+    needed to process elffile
+    '''
+    return sum(section['sh_size'] for section in elffile.iter_sections() if is_debug_section(section))
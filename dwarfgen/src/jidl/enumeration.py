@@ -3,6 +3,8 @@ from .member import Member
 
 
 class Enumeration:
+    __slots__ = ('name', 'size', 'type', 'encoding', 'values', 'type_str')
+
     def __init__(self, name, size, type, encoding):
         self.name = name
         self.size = size
@@ -14,6 +16,13 @@ class Enumeration:
     def add_value(self, name, const_value):
         self.values.append((name, const_value))
 
+    def merge(self, other):
+        self.values.extend(other.values)
+
+    def rebase(self, delta):
+        if isinstance(self.type, int):
+            self.type += delta
+
     def to_json(self, json):
         json['byteSize'] = self.size
         json['type'] = self.type_str
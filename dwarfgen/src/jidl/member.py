@@ -1,10 +1,20 @@
 import json
-
-class BoundsList:
-    def __init__(self, index, lower, upper):
-        self.index = index
-        self.lower = lower
-        self.upper = upper
+import sys
+from collections import namedtuple
+
+def intern(string):
+    '''
+    Interns strings such as member names and type strings, which repeat across
+    the many members of a large binary
+    '''
+    return sys.intern(string) if isinstance(string, str) else string
+
+class BoundsList(namedtuple('BoundsList', ['index', 'lower', 'upper'])):
+    '''
+    Bounds are immutable, so the members of an array type all share the same
+    tuple of them
+    '''
+    __slots__ = ()
 
     def get_json(self):
         return {
@@ -13,9 +23,30 @@ class BoundsList:
             'upperBound': self.upper
         }
 
+def resolved(name):
+    '''
+    A property of Member that runs its resolver before it's first read
+    '''
+    attribute = '_' + name
+
+    def get(self):
+        if self.resolver is not None:
+            self.resolve()
+        return getattr(self, attribute)
+
+    def set(self, value):
+        setattr(self, attribute, value)
+
+    return property(get, set)
+
 class Member:
+    __slots__ = (
+        'name', 'type_offset', 'byte_offset', 'bit_offset', 'bit_size', '_byte_size', '_type_str', 'upper_bound',
+        'lower_bound', '_bounds_list', 'accessibility', '_min_val', '_max_val', 'is_static', 'resolver'
+    )
+
     def __init__(self, name, type_offset):
-        self.name           = name
+        self.name           = intern(name)
         self.type_offset    = type_offset
         self.byte_offset    = None
         self.bit_offset     = None
@@ -29,12 +60,38 @@ class Member:
         self.min_val        = None
         self.max_val        = None
         self.is_static      = False
+        self.resolver       = None
+
+    '''
+    Set by resolution from the type of the member.  A lazily resolved member
+    has a resolver, which sets them the first time any of them is read.
+    '''
+    type_str    = resolved('type_str')
+    byte_size   = resolved('byte_size')
+    bounds_list = resolved('bounds_list')
+    min_val     = resolved('min_val')
+    max_val     = resolved('max_val')
+
+    def resolve(self):
+        resolver, self.resolver = self.resolver, None
+        resolver(self)
+
+    def __getstate__(self):
+        # a resolver holds the whole FLAT it resolves from, so a pickled
+        # member, such as a cached or returned one, is resolved first
+        if self.resolver is not None:
+            self.resolve()
+        return None, {slot: getattr(self, slot) for slot in self.__slots__}
 
     def add_to_bounds_list(self, lower, upper):
         if self.bounds_list is None:
-            self.bounds_list = []
+            self.bounds_list = ()
+
+        self.bounds_list += (BoundsList(len(self.bounds_list), lower, upper),)
 
-        self.bounds_list.append(BoundsList(len(self.bounds_list), lower, upper))
+    def rebase(self, delta):
+        if self.type_offset is not None:
+            self.type_offset += delta
 
     def to_json(self, json):
 
@@ -4,16 +4,50 @@ from .enumeration import Enumeration
 from .union import Union
 
 class Namespace:
-    def __init__(self, name):
+    __slots__ = ('name', 'qualified_name', 'store', 'scope', 'namespaces', 'structures', 'enumerations', 'unions')
+
+    def __init__(self, name, store=None, scope=None):
+        '''
+        With a spill.Store, the structures, enumerations and unions are kept
+        in store under scope, the qualified name of this namespace
+        '''
         self.name = name
+        self.qualified_name = name
+        self.store = store
+        self.scope = scope
         self.namespaces = {}
-        self.structures = {}
-        self.enumerations = {}
-        self.unions = {}
+        if store is None:
+            self.structures = {}
+            self.enumerations = {}
+            self.unions = {}
+        else:
+            self.scope = store.new_scope() if scope is None else scope
+            self.structures = store.objects(self.scope, 'structures')
+            self.enumerations = store.objects(self.scope, 'enumerations')
+            self.unions = store.objects(self.scope, 'unions')
+
+    def __getstate__(self):
+        # objects kept in a store are pickled as dicts
+        state = {slot: getattr(self, slot) for slot in self.__slots__}
+        state['store'] = None
+        return None, state
+
+    def qualify(self, name):
+        '''
+        Returns the qualified name of name inside this namespace
+        '''
+        if self.qualified_name == '':
+            return name
+        return self.qualified_name + '::' + name
 
     def create_namespace(self, name):
         if name not in self.namespaces:
-            self.namespaces[name] = Namespace(name)
+            if self.store is None:
+                namespace = Namespace(name)
+            else:
+                namespace = Namespace(name, self.store, self.scope + '::' + name)
+            namespace.qualified_name = self.qualify(name)
+            self.namespaces[name] = namespace
         return self.namespaces[name]
 
     def create_structure(self, name, size):
@@ -31,6 +65,32 @@ class Namespace:
             self.unions[name] = Union(name, size)
         return self.unions[name]
 
+    def merge(self, other):
+        '''
+        Folds a namespace built from a later CU into this one, the same way
+        walking that CU into this namespace would have
+        '''
+        for name, namespace in other.namespaces.items():
+            self.create_namespace(name).merge(namespace)
+
+        self.merge_objs(self.structures, other.structures)
+        self.merge_objs(self.enumerations, other.enumerations)
+        self.merge_objs(self.unions, other.unions)
+
+    def rebase(self, delta):
+        '''
+        Shifts every DIE offset held by this namespace by delta
+        '''
+        for obj in [*self.namespaces.values(), *self.structures.values(), *self.enumerations.values(), *self.unions.values()]:
+            obj.rebase(delta)
+
+    def merge_objs(self, objs, other_objs):
+        for name, obj in other_objs.items():
+            if name in objs:
+                objs[name].merge(obj)
+            else:
+                objs[name] = obj
+
     def to_json(self, json):
         json['namespaces'] = self.obj_to_json(json, self.namespaces)
         json['structures'] = self.obj_to_json(json, self.structures)
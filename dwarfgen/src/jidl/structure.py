@@ -1,7 +1,9 @@
 import json
-from .member import Member
+from .member import Member, intern
 
 class BaseStructure:
+    __slots__ = ('type_offset', 'accessibility', 'byte_offset', 'type')
+
     def __init__(self, type_offset, accessibility, byte_offset):
         self.type_offset = type_offset
         self.accessibility = accessibility
@@ -9,6 +11,8 @@ class BaseStructure:
         self.type = None
 
 class Structure:
+    __slots__ = ('name', 'size', 'template_params', 'base_structures', 'members')
+
     def __init__(self, name, size):
         self.name = name
         self.size = size
@@ -17,12 +21,26 @@ class Structure:
         self.members = {}
 
     def create_member(self, name, type_offset):
+        name = intern(name)
         self.members[name] = Member(name, type_offset)
         return self.members[name]
 
     def add_base_structure(self, type_offset, accessibility, byte_offset):
         self.base_structures[type_offset] = BaseStructure(type_offset, accessibility, byte_offset)
 
+    def merge(self, other):
+        self.template_params.extend(other.template_params)
+        self.base_structures.update(other.base_structures)
+        self.members.update(other.members)
+
+    def rebase(self, delta):
+        for base_structure in self.base_structures.values():
+            base_structure.type_offset += delta
+        self.base_structures = {k + delta: v for k, v in self.base_structures.items()}
+
+        for member in self.members.values():
+            member.rebase(delta)
+
     def to_json(self, json):
         json['byteSize'] = self.size
 
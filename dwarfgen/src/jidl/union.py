@@ -1,16 +1,26 @@
 import json
-from .member import Member
+from .member import Member, intern
 
 class Union:
+    __slots__ = ('name', 'size', 'members')
+
     def __init__(self, name, size):
         self.name = name
         self.size = size
         self.members = {}
 
     def create_member(self, name, type_offset):
+        name = intern(name)
         self.members[name] = Member(name, type_offset)
         return self.members[name]
 
+    def merge(self, other):
+        self.members.update(other.members)
+
+    def rebase(self, delta):
+        for member in self.members.values():
+            member.rebase(delta)
+
     def to_json(self, json):
         json['byteSize'] = self.size
         json['members'] = self.obj_to_json(json, self.members)
@@ -0,0 +1,283 @@
+import io
+import logging
+import mmap
+import re
+import struct
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+import elftools
+from elftools.common.utils import struct_parse
+from elftools.dwarf.dwarfinfo import DebugSectionDescriptor
+from elftools.elf.elffile import ELFFile
+
+
+'''
+Compressed sections are inflated CHUNK_SIZE bytes at a time, and at most
+CACHED_CHUNKS inflated chunks of each section are kept in memory
+'''
+CHUNK_SIZE = 1024 * 1024
+CACHED_CHUNKS = 16
+
+'''
+Amount of compressed data handed to zlib at a time
+'''
+INPUT_SIZE = 64 * 1024
+
+'''
+The pyelftools releases, from the first up to the last excluded, whose
+private section readers MappedELFFile overrides and read_dwarf_section calls.
+Other releases are only used through their public interface: files aren't
+memory mapped, and sections are read whole.
+'''
+PRIVATE_API_VERSIONS = ((0, 33), (0, 34))
+
+def pyelftools_version():
+    return tuple(int(part) for part in re.findall(r'\d+', elftools.__version__)[:2])
+
+PRIVATE_API = PRIVATE_API_VERSIONS[0] <= pyelftools_version() < PRIVATE_API_VERSIONS[1]
+
+
+class MappedSectionStream:
+    '''
+    Read-only file-like view of one section of a memory mapped file.  Reads
+    are served straight from the page cache, so only the bytes pyelftools
+    actually parses are ever copied out of the mapping.
+    '''
+    def __init__(self, mapping, start, size):
+        self.mapping = mapping
+        self.start = start
+        self.size = size
+        self.position = 0
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            end = self.size
+        else:
+            end = min(self.position + size, self.size)
+
+        if end <= self.position:
+            return b''
+
+        data = self.mapping[self.start + self.position:self.start + end]
+        self.position = end
+        return data
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self.position = offset
+        elif whence == io.SEEK_CUR:
+            self.position += offset
+        elif whence == io.SEEK_END:
+            self.position = self.size + offset
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def close(self):
+        pass
+
+class InflatingSectionStream:
+    '''
+    Read-only file-like view of the uncompressed contents of a zlib stream in
+    a memory mapped file.  The stream is inflated a chunk at a time as it is
+    read, and only the most recently used chunks are kept.  The decompressor
+    state at the start of every chunk reached so far is saved, so a chunk
+    that was dropped is inflated again on its own instead of from the start.
+    '''
+    def __init__(self, mapping, start, compressed_size, size, chunk_size=CHUNK_SIZE, cached_chunks=CACHED_CHUNKS):
+        self.mapping = mapping
+        self.end = start + compressed_size
+        self.size = size
+        self.chunk_size = chunk_size
+        self.cached_chunks = cached_chunks
+        self.position = 0
+        self.chunks = OrderedDict()
+        # the chunk read last, which serves most small reads without a lookup
+        self.current = b''
+        self.current_start = 0
+        # decompressor and position of the next compressed byte at the start of each chunk
+        self.checkpoints = [(zlib.decompressobj(), start)]
+
+    def inflate(self, decompressor, position, size):
+        '''
+        Inflates size bytes with decompressor, reading compressed data from
+        position on.  Returns the data and the new position.
+        '''
+        pieces = []
+        while size > 0:
+            if decompressor.unconsumed_tail:
+                data = decompressor.unconsumed_tail
+            elif position < self.end:
+                data = self.mapping[position:min(position + INPUT_SIZE, self.end)]
+                position += len(data)
+            else:
+                raise zlib.error('Compressed section ended early')
+
+            piece = decompressor.decompress(data, size)
+            pieces.append(piece)
+            size -= len(piece)
+
+        return b''.join(pieces), position
+
+    def chunk(self, index):
+        if index in self.chunks:
+            self.chunks.move_to_end(index)
+            return self.chunks[index]
+
+        first = min(index, len(self.checkpoints) - 1)
+        decompressor, position = self.checkpoints[first]
+        decompressor = decompressor.copy()
+
+        for i in range(first, index + 1):
+            size = min(self.chunk_size, self.size - i * self.chunk_size)
+            data, position = self.inflate(decompressor, position, size)
+            if i + 1 == len(self.checkpoints):
+                self.checkpoints.append((decompressor.copy(), position))
+
+        self.chunks[index] = data
+        if len(self.chunks) > self.cached_chunks:
+            self.chunks.popitem(last=False)
+
+        return data
+
+    def read(self, size=-1):
+        position = self.position
+        if size is None or size < 0 or position + size > self.size:
+            end = self.size
+        else:
+            end = position + size
+
+        start = self.current_start
+        if start <= position and end <= start + len(self.current):
+            self.position = end
+            return self.current[position - start:end - start]
+
+        pieces = []
+        while self.position < end:
+            index, offset = divmod(self.position, self.chunk_size)
+            self.current = self.chunk(index)
+            self.current_start = index * self.chunk_size
+            data = self.current[offset:offset + end - self.position]
+            pieces.append(data)
+            self.position += len(data)
+
+        return b''.join(pieces)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self.position = offset
+        elif whence == io.SEEK_CUR:
+            self.position += offset
+        elif whence == io.SEEK_END:
+            self.position = self.size + offset
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def close(self):
+        self.chunks.clear()
+        self.current = b''
+
+class MappedELFFile(ELFFile):
+    '''
+    ELFFile that hands out views of the mapping for DWARF sections instead
+    of reading each section into its own buffer.  zlib compressed sections,
+    both SHF_COMPRESSED and .zdebug_*, are inflated as they are read.  Sections
+    that pyelftools has to transform otherwise (other compression types,
+    relocatable objects, phantom bytes) are still read the normal way.  It's
+    only used with a PRIVATE_API release of pyelftools, see open_elf.
+    '''
+    def __init__(self, mapping):
+        self.mapping = mapping
+        super(MappedELFFile, self).__init__(MappedSectionStream(mapping, 0, len(mapping)))
+
+    def _read_dwarf_section(self, section, relocate_dwarf_sections):
+        if (section['sh_type'] == 'SHT_NOBITS' or
+            self['e_type'] == 'ET_REL' or
+            self.has_phantom_bytes()):
+            return super(MappedELFFile, self)._read_dwarf_section(section, relocate_dwarf_sections)
+
+        if section.compressed:
+            header = struct_parse(self.structs.Elf_Chdr, self.stream, stream_pos=section['sh_offset'])
+            if header['ch_type'] != 'ELFCOMPRESS_ZLIB':
+                return super(MappedELFFile, self)._read_dwarf_section(section, relocate_dwarf_sections)
+
+            header_size = self.structs.Elf_Chdr.sizeof()
+            stream = InflatingSectionStream(
+                self.mapping,
+                section['sh_offset'] + header_size,
+                section['sh_size'] - header_size,
+                header['ch_size'])
+
+            return DebugSectionDescriptor(
+                    stream=stream,
+                    name=section.name,
+                    global_offset=section['sh_offset'],
+                    size=header['ch_size'],
+                    address=section['sh_addr'])
+
+        return DebugSectionDescriptor(
+                stream=MappedSectionStream(self.mapping, section['sh_offset'], section['sh_size']),
+                name=section.name,
+                global_offset=section['sh_offset'],
+                size=section['sh_size'],
+                address=section['sh_addr'])
+
+    def _decompress_dwarf_section(self, section):
+        '''
+        .zdebug_* sections start with "ZLIB" and the big endian uncompressed
+        size, followed by the zlib stream
+        '''
+        if not isinstance(section.stream, MappedSectionStream):
+            return super(MappedELFFile, self)._decompress_dwarf_section(section)
+
+        section.stream.seek(0)
+        header = section.stream.read(12)
+        assert header[:4] == b'ZLIB', 'Invalid compression type: %r' % (header[:4])
+        size = struct.unpack('>Q', header[4:])[0]
+
+        stream = InflatingSectionStream(section.stream.mapping, section.stream.start + 12, section.stream.size - 12, size)
+        return section._replace(stream=stream, size=size)
+
+def read_dwarf_section(elffile, section):
+    '''
+    Returns a DebugSectionDescriptor of section of elffile, read the way
+    get_dwarf_info reads its sections where pyelftools is a PRIVATE_API
+    release, and from a copy of its data otherwise
+    '''
+    if PRIVATE_API:
+        return elffile._read_dwarf_section(section, False)
+
+    data = section.data()
+    return DebugSectionDescriptor(
+            stream=io.BytesIO(data),
+            name=section.name,
+            global_offset=section['sh_offset'],
+            size=len(data),
+            address=section['sh_addr'])
+
+@contextmanager
+def open_elf(file, use_mmap=True):
+    '''
+    Opens file as an ELFFile.  When use_mmap is set the file is memory mapped
+    and the mapping stays valid until the context exits, so everything read
+    from the ELFFile and its DWARFInfo must be used inside the context.
+    Files are only mapped with a PRIVATE_API release of pyelftools.
+    '''
+    if use_mmap and not PRIVATE_API:
+        logging.debug("Not memory mapping {} with pyelftools {}".format(file, elftools.__version__))
+        use_mmap = False
+
+    with open(file, 'rb') as f:
+        if not use_mmap:
+            yield ELFFile(f)
+            return
+
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield MappedELFFile(mapping)
+        finally:
+            mapping.close()
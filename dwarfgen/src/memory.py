@@ -0,0 +1,37 @@
+'''
+Measures the memory an extraction takes
+'''
+import logging
+import sys
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def peak_memory():
+    '''
+    Returns the peak resident memory of this process, or of its largest
+    child process if that's higher, in bytes.  None where it isn't known.
+    '''
+    if resource is None:
+        return None
+
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    )
+
+    # ru_maxrss is in kilobytes, except on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def log_peak_memory():
+    '''
+    Logs peak_memory at the info level
+    '''
+    peak = peak_memory()
+    if peak is None:
+        logging.info("Peak memory: unknown")
+    else:
+        logging.info("Peak memory: {:.1f} MiB".format(peak / (1024 * 1024)))
@@ -0,0 +1,100 @@
+'''
+The options of an extraction.  process builds one Options from its keyword
+arguments, and the walk reads it from dwarfgen.OPTIONS instead of a global
+of its own per option.  Worker processes are handed the same object.
+'''
+import os
+
+from . import cache
+from . import debugfiles
+from . import spill
+from . import typefilter
+
+
+class Options:
+    '''
+    jobs is the number of worker processes extracting the CU's of a file,
+    and file_jobs the number of files processed at once.  Files are memory
+    mapped with use_mmap.  With a cache_dir, results are cached there, up to
+    cache_size bytes.  Separate debug files are searched for in debug_dirs.
+
+    Types defined inside functions are only extracted with
+    function_local_types, otherwise function scopes are skipped over.  With
+    native_scanner, DIE's are read by rawdwarf instead of pyelftools.  With
+    columnar_resolver, type chains are walked by NumPy, see columnar.  With
+    lazy_resolution, the types of members are only resolved once they're
+    read, see Member.resolver.  With bounded_memory, each CU is dropped as
+    soon as it's walked, see dwarfgen.CU_at.  With a spill_dir, FLAT and
+    the namespaces are kept in a file there, with the spill_cache_size most
+    recently used records and objects in memory.
+
+    include_types and exclude_types are the patterns of typefilter, kept as
+    type_filter.  source_roots are the directories types must be declared
+    under to be extracted, cu_filter the globs the path of a CU must match to
+    be walked, and roots the qualified names of the types to extract with
+    the types they reach, see dwarfgen.process_roots.  Each of these is None
+    when it's not given.  The roots are looked up in the name index of the
+    file with name_index.
+    '''
+    def __init__(self, jobs=1, file_jobs=1, use_mmap=True, cache_dir=None, cache_size=cache.DEFAULT_CACHE_SIZE,
+                 debug_dirs=debugfiles.DEFAULT_DEBUG_DIRS, function_local_types=False, native_scanner=False,
+                 columnar_resolver=False, lazy_resolution=False, bounded_memory=False, spill_dir=None,
+                 spill_cache_size=spill.DEFAULT_CACHE_SIZE, include_types=(), exclude_types=(), source_roots=(),
+                 cu_filter=(), roots=(), name_index=True):
+        if spill_dir is not None and lazy_resolution:
+            # lazily resolved members would have to keep FLAT with them
+            raise ValueError("spill_dir can't be used with lazy_resolution")
+        if spill_dir is not None and file_jobs > 1:
+            raise ValueError("spill_dir can't be used with more than one file job")
+
+        self.jobs = jobs
+        self.file_jobs = file_jobs
+        self.use_mmap = use_mmap
+        self.cache_dir = cache_dir
+        self.cache_size = cache_size
+        self.debug_dirs = debug_dirs
+        self.function_local_types = function_local_types
+        self.native_scanner = native_scanner
+        self.columnar_resolver = columnar_resolver
+        self.lazy_resolution = lazy_resolution
+        self.bounded_memory = bounded_memory
+        self.spill_dir = spill_dir
+        self.spill_cache_size = spill_cache_size
+        self.include_types = tuple(include_types)
+        self.exclude_types = tuple(exclude_types)
+        self.type_filter = None
+        if include_types or exclude_types:
+            self.type_filter = typefilter.TypeFilter(include_types, exclude_types)
+        self.source_roots = tuple(os.path.abspath(root) for root in source_roots) or None
+        self.cu_filter = tuple(cu_filter) or None
+        self.roots = tuple(roots) or None
+        self.name_index = name_index
+
+        # the spill.Store of a run with a spill_dir, opened by process and
+        # dropped once it returns
+        self.spill = None
+
+    def __getstate__(self):
+        # the store only lives in the process that opened it
+        state = dict(self.__dict__)
+        state['spill'] = None
+        return state
+
+    def skips_types(self):
+        '''
+        Returns True if the walk leaves out some of the types it reaches
+        '''
+        return self.type_filter is not None or self.source_roots is not None
+
+    def cached(self):
+        '''
+        Returns the options the cached results depend on, by name
+        '''
+        return {
+            'function_local_types': self.function_local_types,
+            'include_types': list(self.include_types),
+            'exclude_types': list(self.exclude_types),
+            'source_roots': list(self.source_roots or ()),
+            'cu_filter': list(self.cu_filter or ()),
+            'roots': list(self.roots or ()),
+        }
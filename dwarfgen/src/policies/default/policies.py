@@ -293,6 +293,23 @@ class NamespaceApplicationPolicy(IPolicy):
                 child.namespace = curr_ns + '::' + die.name()
         return new_namespace
 
+class FunctionScopePolicy(IPolicy):
+    '''
+    DIE's whose subtree can only define types local to a function.  The main
+    program of Fortran is a subprogram, but holds the program's own types.
+    '''
+    TAGS = {
+        'DW_TAG_subprogram',
+        'DW_TAG_lexical_block',
+        'DW_TAG_inlined_subroutine',
+        'DW_TAG_formal_parameter',
+        'DW_TAG_call_site',
+        'DW_TAG_GNU_call_site',
+    }
+
+    def check(self, die, **kwargs):
+        return die.tag in self.TAGS and 'DW_AT_main_subprogram' not in die.attributes
+
 class IsInheritancePolicy(IPolicy):
     def check(self, die, **kwargs):
         return die.is_inheritance()
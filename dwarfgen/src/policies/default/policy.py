@@ -52,3 +52,4 @@ class Policy:
         #self.subrange_data_for_array_parent_policy      = policies.SubrangeDataForArrayParentPolicy()
         self.namespace_application_policy               = policies.NamespaceApplicationPolicy()
         self.is_inheritance_policy                      = policies.IsInheritancePolicy()
+        self.function_scope_policy                      = policies.FunctionScopePolicy()
@@ -0,0 +1,633 @@
+'''
+Minimal reader for the raw encoding of .debug_abbrev and .debug_info.  Used
+where walking pyelftools' construct based DIE objects would be too slow.
+'''
+import struct
+from elftools.dwarf import enums
+from elftools.dwarf.die import AttributeValue
+
+
+def reverse_enum(enum):
+    return {code: name for name, code in enum.items() if not name.startswith('_')}
+
+TAG_NAMES = reverse_enum(enums.ENUM_DW_TAG)
+ATTRIBUTE_NAMES = reverse_enum(enums.ENUM_DW_AT)
+FORM_NAMES = reverse_enum(enums.ENUM_DW_FORM)
+
+class UnsupportedForm(Exception):
+    pass
+
+# forms whose value is an offset from the start of the owning CU
+RELATIVE_REFERENCE_FORMS = {
+    'DW_FORM_ref',
+    'DW_FORM_ref1',
+    'DW_FORM_ref2',
+    'DW_FORM_ref4',
+    'DW_FORM_ref8',
+    'DW_FORM_ref_udata',
+}
+
+'''
+Forms pyelftools resolves through tables DIEReader doesn't read.  Attributes
+that are only skipped may still have them.
+'''
+UNDECODED_FORMS = {
+    'DW_FORM_addrx',
+    'DW_FORM_addrx1',
+    'DW_FORM_addrx2',
+    'DW_FORM_addrx3',
+    'DW_FORM_addrx4',
+    'DW_FORM_strx',
+    'DW_FORM_strx1',
+    'DW_FORM_strx2',
+    'DW_FORM_strx3',
+    'DW_FORM_strx4',
+    'DW_FORM_loclistx',
+    'DW_FORM_rnglistx',
+    'DW_FORM_strp_sup',
+    'DW_FORM_GNU_strp_alt',
+    'DW_FORM_indirect',
+}
+
+def read_uleb128(data, pos):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+def read_sleb128(data, pos):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        shift += 7
+        if byte < 0x80:
+            if byte & 0x40:
+                result -= 1 << shift
+            return result, pos
+
+class Abbrev:
+    __slots__ = ('code', 'tag', 'has_children', 'attributes')
+
+    def __init__(self, code, tag, has_children, attributes):
+        self.code = code
+        self.tag = tag
+        self.has_children = has_children
+        # list of (name, form, implicit_const) tuples
+        self.attributes = attributes
+
+def parse_abbrev_table(data, offset):
+    '''
+    Parses the abbreviation table at offset in the .debug_abbrev data.
+    Returns a dict of abbreviation code to Abbrev and the offset just past
+    the end of the table.  Names are the same strings pyelftools uses.
+    '''
+    abbrevs = {}
+    pos = offset
+
+    while True:
+        code, pos = read_uleb128(data, pos)
+        if code == 0:
+            return abbrevs, pos
+
+        tag, pos = read_uleb128(data, pos)
+        has_children = data[pos] != 0
+        pos += 1
+
+        attributes = []
+        while True:
+            name, pos = read_uleb128(data, pos)
+            form, pos = read_uleb128(data, pos)
+            if name == 0 and form == 0:
+                break
+
+            implicit_const = None
+            if form == enums.ENUM_DW_FORM['DW_FORM_implicit_const']:
+                implicit_const, pos = read_sleb128(data, pos)
+
+            attributes.append((
+                ATTRIBUTE_NAMES.get(name, name),
+                FORM_NAMES.get(form, form),
+                implicit_const
+            ))
+
+        abbrevs[code] = Abbrev(code, TAG_NAMES.get(tag, tag), has_children, attributes)
+
+class UnitFormat:
+    '''
+    Encoding parameters of a unit, which decide the size of most forms
+    '''
+    def __init__(self, version, offset_size, address_size, little_endian):
+        self.version = version
+        self.offset_size = offset_size
+        self.address_size = address_size
+        self.little_endian = little_endian
+
+    @classmethod
+    def from_CU(cls, CU):
+        return cls(
+            CU['version'],
+            8 if CU.structs.dwarf_format == 64 else 4,
+            CU['address_size'],
+            CU.dwarfinfo.config.little_endian
+        )
+
+    def form_sizes(self):
+        '''
+        Returns a dict of form name to the size of its values, for the forms
+        whose values always have the same size
+        '''
+        address = self.address_size
+        offset = self.offset_size
+
+        return {
+            'DW_FORM_addr': address,
+            'DW_FORM_addrx1': 1,
+            'DW_FORM_addrx2': 2,
+            'DW_FORM_addrx3': 3,
+            'DW_FORM_addrx4': 4,
+            'DW_FORM_data1': 1,
+            'DW_FORM_data2': 2,
+            'DW_FORM_data4': 4,
+            'DW_FORM_data8': 8,
+            'DW_FORM_data16': 16,
+            'DW_FORM_strp': offset,
+            'DW_FORM_strp_sup': offset,
+            'DW_FORM_line_strp': offset,
+            'DW_FORM_strx1': 1,
+            'DW_FORM_strx2': 2,
+            'DW_FORM_strx3': 3,
+            'DW_FORM_strx4': 4,
+            'DW_FORM_flag': 1,
+            'DW_FORM_flag_present': 0,
+            'DW_FORM_implicit_const': 0,
+            'DW_FORM_ref': 4,
+            'DW_FORM_ref1': 1,
+            'DW_FORM_ref2': 2,
+            'DW_FORM_ref4': 4,
+            'DW_FORM_ref8': 8,
+            'DW_FORM_ref_addr': address if self.version == 2 else offset,
+            'DW_FORM_ref_sig8': 8,
+            'DW_FORM_ref_sup4': 4,
+            'DW_FORM_ref_sup8': 8,
+            'DW_FORM_sec_offset': offset,
+            'DW_FORM_GNU_strp_alt': offset,
+            'DW_FORM_GNU_ref_alt': offset,
+        }
+
+    def readers(self):
+        '''
+        Returns a dict of form name to a function (data, pos) -> (raw_value, pos)
+        that decodes a value of that form the way pyelftools does
+        '''
+        endian = '<' if self.little_endian else '>'
+
+        def fixed(fmt):
+            unpack_from = struct.Struct(endian + fmt).unpack_from
+            size = struct.calcsize(fmt)
+            return lambda data, pos: (unpack_from(data, pos)[0], pos + size)
+
+        def uint24(data, pos):
+            return int.from_bytes(data[pos:pos + 3], 'little' if self.little_endian else 'big'), pos + 3
+
+        def block(length_reader):
+            def read(data, pos):
+                length, pos = length_reader(data, pos)
+                return list(data[pos:pos + length]), pos + length
+            return read
+
+        def string(data, pos):
+            end = data.index(b'\x00', pos)
+            return data[pos:end], end + 1
+
+        def data16(data, pos):
+            return list(data[pos:pos + 16]), pos + 16
+
+        def flag_present(data, pos):
+            return 0, pos
+
+        def unsupported(data, pos):
+            raise UnsupportedForm()
+
+        u8, u16, u32, u64 = fixed('B'), fixed('H'), fixed('I'), fixed('Q')
+        offset = u64 if self.offset_size == 8 else u32
+        address = {1: u8, 2: u16, 4: u32, 8: u64}[self.address_size]
+
+        return {
+            'DW_FORM_addr': address,
+            'DW_FORM_addrx': read_uleb128,
+            'DW_FORM_addrx1': u8,
+            'DW_FORM_addrx2': u16,
+            'DW_FORM_addrx3': uint24,
+            'DW_FORM_addrx4': u32,
+            'DW_FORM_block1': block(u8),
+            'DW_FORM_block2': block(u16),
+            'DW_FORM_block4': block(u32),
+            'DW_FORM_block': block(read_uleb128),
+            'DW_FORM_exprloc': block(read_uleb128),
+            'DW_FORM_data1': u8,
+            'DW_FORM_data2': u16,
+            'DW_FORM_data4': u32,
+            'DW_FORM_data8': u64,
+            'DW_FORM_data16': data16,
+            'DW_FORM_sdata': read_sleb128,
+            'DW_FORM_udata': read_uleb128,
+            'DW_FORM_string': string,
+            'DW_FORM_strp': offset,
+            'DW_FORM_strp_sup': offset,
+            'DW_FORM_line_strp': offset,
+            'DW_FORM_strx': read_uleb128,
+            'DW_FORM_strx1': u8,
+            'DW_FORM_strx2': u16,
+            'DW_FORM_strx3': uint24,
+            'DW_FORM_strx4': u32,
+            'DW_FORM_flag': u8,
+            'DW_FORM_flag_present': flag_present,
+            'DW_FORM_ref': u32,
+            'DW_FORM_ref1': u8,
+            'DW_FORM_ref2': u16,
+            'DW_FORM_ref4': u32,
+            'DW_FORM_ref8': u64,
+            'DW_FORM_ref_udata': read_uleb128,
+            'DW_FORM_ref_addr': address if self.version == 2 else offset,
+            'DW_FORM_ref_sig8': u64,
+            'DW_FORM_ref_sup4': u32,
+            'DW_FORM_ref_sup8': u64,
+            'DW_FORM_sec_offset': offset,
+            'DW_FORM_loclistx': read_uleb128,
+            'DW_FORM_rnglistx': read_uleb128,
+            'DW_FORM_GNU_addr_index': read_uleb128,
+            'DW_FORM_GNU_str_index': read_uleb128,
+            'DW_FORM_GNU_strp_alt': offset,
+            'DW_FORM_GNU_ref_alt': offset,
+            'DW_FORM_indirect': unsupported,
+        }
+
+def section_data(dwarfinfo, section):
+    '''
+    Returns the bytes of one of dwarfinfo's debug sections, e.g.
+    'debug_abbrev_sec', reading each section at most once per DWARFInfo
+    '''
+    sections = dwarfinfo.__dict__.setdefault('_raw_sections', {})
+
+    if section not in sections:
+        descriptor = getattr(dwarfinfo, section)
+        if descriptor is None:
+            sections[section] = b''
+        else:
+            descriptor.stream.seek(0)
+            sections[section] = descriptor.stream.read(descriptor.size)
+
+    return sections[section]
+
+def abbrev_table(dwarfinfo, offset):
+    '''
+    Returns the parsed abbreviation table at offset and the raw bytes it
+    was parsed from, cached per DWARFInfo
+    '''
+    tables = dwarfinfo.__dict__.setdefault('_raw_abbrev_tables', {})
+
+    if offset not in tables:
+        data = section_data(dwarfinfo, 'debug_abbrev_sec')
+        abbrevs, end = parse_abbrev_table(data, offset)
+        tables[offset] = (abbrevs, data[offset:end])
+
+    return tables[offset]
+
+def table_string(dwarfinfo, getter, offset):
+    '''
+    Returns the string at offset of one of dwarfinfo's string sections, read
+    with its getter, e.g. 'get_string_from_table', at most once per offset
+    '''
+    strings = dwarfinfo.__dict__.setdefault('_raw_strings', {})
+    key = (getter, offset)
+    if key not in strings:
+        strings[key] = getattr(dwarfinfo, getter)(offset)
+    return strings[key]
+
+def unit_data(CU):
+    '''
+    Returns the raw bytes of CU, header included
+    '''
+    stream = CU.dwarfinfo.debug_info_sec.stream
+    stream.seek(CU.cu_offset)
+    return stream.read(CU['unit_length'] + CU.structs.initial_length_field_size())
+
+class UnitReader:
+    '''
+    Walks the DIE's of one CU in its raw bytes, without building DIE objects
+    '''
+    def __init__(self, CU):
+        unit = UnitFormat.from_CU(CU)
+        self.offset = CU.cu_offset
+        self.data = unit_data(CU)
+        self.abbrevs, _ = abbrev_table(CU.dwarfinfo, CU['debug_abbrev_offset'])
+        self.readers = unit.readers()
+        # subtree offset -> result of scan
+        self.scans = {}
+
+        # attributes of abbrevs whose forms all have a fixed size are skipped
+        # in one step
+        sizes = unit.form_sizes()
+        self.fixed_sizes = {}
+        for code, abbrev in self.abbrevs.items():
+            if all(form in sizes for _, form, _ in abbrev.attributes):
+                self.fixed_sizes[code] = sum(sizes[form] for _, form, _ in abbrev.attributes)
+
+    def scan(self, offset, tags=()):
+        '''
+        Skips over the DIE at .debug_info offset and all of its children.
+        Returns the offset just past the subtree, and the (offset, parent
+        offset) of the outermost DIE's in it whose tag is in tags.  Raises
+        UnsupportedForm if a value can't be skipped.
+        '''
+        key = (offset, tags)
+        if key in self.scans:
+            return self.scans[key]
+
+        data = self.data
+        abbrevs = self.abbrevs
+        readers = self.readers
+        fixed_sizes = self.fixed_sizes
+
+        found = []
+        parents = []
+        # depth of the found DIE whose subtree is being skipped, if any
+        inside = None
+        pos = offset - self.offset
+
+        while True:
+            start = pos
+            code, pos = read_uleb128(data, pos)
+
+            if code == 0:
+                parents.pop()
+                if inside == len(parents):
+                    inside = None
+            else:
+                abbrev = abbrevs[code]
+                if inside is None and abbrev.tag in tags:
+                    found.append((start + self.offset, parents[-1] if parents else None))
+                    if abbrev.has_children:
+                        inside = len(parents)
+
+                if code in fixed_sizes:
+                    pos += fixed_sizes[code]
+                else:
+                    for name, form, implicit_const in abbrev.attributes:
+                        if form == 'DW_FORM_implicit_const':
+                            continue
+                        if form not in readers:
+                            raise UnsupportedForm(form)
+                        _, pos = readers[form](data, pos)
+
+                if abbrev.has_children:
+                    parents.append(start + self.offset)
+
+            if parents == []:
+                self.scans[key] = (pos + self.offset, found)
+                return self.scans[key]
+
+    def skip(self, code, pos):
+        '''
+        Returns the position just past the attributes of a DIE with abbrev
+        code, whose attributes start at pos
+        '''
+        if code in self.fixed_sizes:
+            return pos + self.fixed_sizes[code]
+
+        readers = self.readers
+        for name, form, implicit_const in self.abbrevs[code].attributes:
+            if form == 'DW_FORM_implicit_const':
+                continue
+            if form not in readers:
+                raise UnsupportedForm(form)
+            _, pos = readers[form](self.data, pos)
+        return pos
+
+class RawDIE:
+    '''
+    A DIE built by a DIEReader.  Has the parts of pyelftools' DIE interface
+    dwarfgen uses, but only the attributes the reader decodes.
+    '''
+    def __init__(self, reader, offset, tag, has_children):
+        self.reader = reader
+        self.cu = reader.CU
+        self.dwarfinfo = reader.CU.dwarfinfo
+        self.offset = offset
+        self.tag = tag
+        self.has_children = has_children
+        self.attributes = {}
+        self.size = 0
+        # offset just past the subtree, once its children were iterated
+        self.end = None
+        self._parent = None
+
+    def is_null(self):
+        return False
+
+    def iter_children(self):
+        return self.reader.iter_children(self)
+
+    def get_parent(self):
+        if self._parent is None and self.offset != self.reader.top_offset:
+            self.reader.find_parent(self)
+        return self._parent
+
+    def set_parent(self, die):
+        self._parent = die
+
+    def get_DIE_from_attribute(self, name):
+        attribute = self.attributes[name]
+
+        if attribute.form in RELATIVE_REFERENCE_FORMS:
+            return self.reader.die(self.cu.cu_offset + attribute.raw_value)
+        elif attribute.form == 'DW_FORM_ref_addr':
+            CU = self.dwarfinfo.get_CU_containing(attribute.raw_value)
+            try:
+                return die_reader(CU, self.reader.decoded, self.reader.leaf_tags).die(attribute.raw_value)
+            except UnsupportedForm:
+                return self.dwarfinfo.get_DIE_from_refaddr(attribute.raw_value, CU)
+
+        raise UnsupportedForm(attribute.form)
+
+class DIEReader(UnitReader):
+    '''
+    Builds RawDIE's straight from the raw bytes of a CU, in place of
+    pyelftools' DIE parsing.  Only the decoded attributes are read, and
+    childless DIE's whose tag isn't in leaf_tags are passed over by
+    iter_children without being built.  Raises UnsupportedForm if an abbrev
+    of the CU has a form this can't read the way pyelftools does.
+    '''
+    def __init__(self, CU, decoded, leaf_tags):
+        super(DIEReader, self).__init__(CU)
+        self.CU = CU
+        self.decoded = decoded
+        self.leaf_tags = leaf_tags
+        self.top_offset = CU.cu_die_offset
+        self.dies = {}
+
+        sizes = UnitFormat.from_CU(CU).form_sizes()
+        self.plans = {code: self.plan(abbrev, sizes) for code, abbrev in self.abbrevs.items()}
+
+    def plan(self, abbrev, sizes):
+        '''
+        Decides once per abbrev how each attribute is read.  Returns a list of
+        (name, form, reader, implicit_const), where name is None for values
+        that are skipped and reader is a size for skipped fixed size runs.
+        '''
+        steps = []
+        for name, form, implicit_const in abbrev.attributes:
+            if form != 'DW_FORM_implicit_const' and form not in self.readers:
+                raise UnsupportedForm(form)
+
+            if name in self.decoded:
+                if form in UNDECODED_FORMS:
+                    raise UnsupportedForm(form)
+                steps.append((name, form, self.readers.get(form), implicit_const))
+            elif form in sizes:
+                if steps != [] and steps[-1][0] is None and isinstance(steps[-1][2], int):
+                    steps[-1] = (None, None, steps[-1][2] + sizes[form], None)
+                else:
+                    steps.append((None, None, sizes[form], None))
+            else:
+                steps.append((None, None, self.readers[form], None))
+
+        return steps
+
+    def translate(self, form, raw_value):
+        '''
+        Converts a raw value like pyelftools' DIE._translate_attr_value
+        '''
+        if form == 'DW_FORM_strp':
+            return table_string(self.CU.dwarfinfo, 'get_string_from_table', raw_value)
+        elif form == 'DW_FORM_line_strp':
+            return table_string(self.CU.dwarfinfo, 'get_string_from_linetable', raw_value)
+        elif form == 'DW_FORM_flag':
+            return raw_value != 0
+        elif form == 'DW_FORM_flag_present':
+            return True
+        return raw_value
+
+    def top_DIE(self):
+        return self.die(self.top_offset)
+
+    def die(self, offset):
+        '''
+        Returns the RawDIE at .debug_info offset, built once
+        '''
+        die = self.dies.get(offset)
+        if die is not None:
+            return die
+
+        data = self.data
+        code, pos = read_uleb128(data, offset - self.offset)
+        abbrev = self.abbrevs[code]
+
+        die = RawDIE(self, offset, abbrev.tag, abbrev.has_children)
+        attributes = die.attributes
+        for name, form, reader, implicit_const in self.plans[code]:
+            if name is None:
+                if isinstance(reader, int):
+                    pos += reader
+                else:
+                    _, pos = reader(data, pos)
+                continue
+
+            attribute_offset = pos + self.offset
+            if form == 'DW_FORM_implicit_const':
+                raw_value = implicit_const
+            else:
+                raw_value, pos = reader(data, pos)
+            attributes[name] = AttributeValue(
+                name, form, self.translate(form, raw_value), raw_value, attribute_offset, 0
+            )
+
+        die.size = pos + self.offset - offset
+        self.dies[offset] = die
+        return die
+
+    def iter_children(self, die):
+        if not die.has_children:
+            return
+
+        data = self.data
+        offset = die.offset + die.size
+
+        while True:
+            code, pos = read_uleb128(data, offset - self.offset)
+            if code == 0:
+                die.end = pos + self.offset
+                return
+
+            abbrev = self.abbrevs[code]
+            if not abbrev.has_children and abbrev.tag not in self.leaf_tags:
+                offset = self.skip(code, pos) + self.offset
+                continue
+
+            child = self.die(offset)
+            child._parent = die
+            yield child
+
+            sibling = child.attributes.get('DW_AT_sibling')
+            if not child.has_children:
+                offset += child.size
+            elif sibling is not None and sibling.form in RELATIVE_REFERENCE_FORMS:
+                offset = sibling.raw_value + self.CU.cu_offset
+            elif child.end is not None:
+                offset = child.end
+            else:
+                offset = self.scan(offset)[0]
+
+    def find_parent(self, die):
+        '''
+        Sets the parent of die by descending from the top DIE, like
+        pyelftools does for DIE's that weren't reached through their parent
+        '''
+        search = self.top_DIE()
+        while die._parent is None:
+            closest = None
+            for child in search.iter_children():
+                if child.offset > die.offset:
+                    break
+                closest = child
+
+            if die._parent is not None:
+                break
+            if closest is None or not closest.has_children:
+                raise ValueError("offset {} not in CU {} DIE tree".format(die.offset, self.CU.cu_offset))
+            search = closest
+
+def unit_reader(CU):
+    '''
+    Returns the UnitReader of CU, created once per CU
+    '''
+    reader = CU.__dict__.get('_raw_unit_reader')
+    if reader is None:
+        reader = CU.__dict__['_raw_unit_reader'] = UnitReader(CU)
+    return reader
+
+def die_reader(CU, decoded, leaf_tags):
+    '''
+    Returns the DIEReader of CU, created once per CU.  It also serves as the
+    UnitReader of CU.
+    '''
+    reader = CU.__dict__.get('_raw_die_reader')
+    if reader is None:
+        reader = CU.__dict__['_raw_die_reader'] = DIEReader(CU, decoded, leaf_tags)
+        CU.__dict__['_raw_unit_reader'] = reader
+    return reader
+
+def release(CU):
+    '''
+    Drops the readers of CU, and the DIE's and bytes they hold
+    '''
+    CU.__dict__.pop('_raw_unit_reader', None)
+    CU.__dict__.pop('_raw_die_reader', None)
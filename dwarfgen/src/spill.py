@@ -0,0 +1,323 @@
+'''
+Keeps FLAT and the namespaces of an extraction in an SQLite file instead of
+in memory.  Records of FLAT are indexed by DIE offset, and the structures,
+enumerations and unions of namespaces by their qualified name.  A least
+recently used set of each sits in front of the file, and everything else is
+read back from it as resolution and emission walk it.
+
+Objects handed out by a namespace may still be changed by whoever holds
+them, so they're only written back when the store is trimmed.  Callers trim
+where nothing of a namespace is held anymore, such as between CU's, and
+iterating a namespace trims between objects.
+'''
+import json
+import os
+import pickle
+import sqlite3
+import tempfile
+import weakref
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+
+'''
+Number of records of FLAT, and of namespace objects, kept in memory by default
+'''
+DEFAULT_CACHE_SIZE = 100000
+
+'''
+Number of records of FLAT written to the file at once
+'''
+WRITE_BATCH = 4096
+
+'''
+Number of objects read from the file at once when iterating a namespace
+'''
+READ_BATCH = 1024
+
+'''
+SQLite integers are signed 64 bit, and the offsets of split units are larger
+'''
+MAX_INTEGER = (1 << 63) - 1
+
+def encode_offset(offset):
+    return offset if offset <= MAX_INTEGER else str(offset)
+
+def decode_offset(offset):
+    return int(offset) if isinstance(offset, str) else offset
+
+def close(connection, path):
+    connection.close()
+    os.remove(path)
+
+class Store:
+    '''
+    An SQLite file in directory, removed once the store is garbage
+    collected.  cache_size is the number of records of FLAT, and of namespace
+    objects, kept in memory.
+    '''
+    def __init__(self, directory, cache_size=DEFAULT_CACHE_SIZE):
+        os.makedirs(directory, exist_ok=True)
+        fd, path = tempfile.mkstemp(prefix='dwarfgen-', suffix='.sqlite', dir=directory)
+        os.close(fd)
+
+        # the file only lives as long as this process, so it's never synced
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript('''
+            PRAGMA journal_mode = OFF;
+            PRAGMA synchronous = OFF;
+            CREATE TABLE types (flat INTEGER, offset, record BLOB, PRIMARY KEY (flat, offset)) WITHOUT ROWID;
+            CREATE TABLE objects (id INTEGER PRIMARY KEY, scope TEXT, kind TEXT, name TEXT, value BLOB, UNIQUE (scope, kind, name));
+            CREATE INDEX objects_order ON objects (scope, kind);
+        ''')
+        weakref.finalize(self, close, self.connection, path)
+
+        self.cache_size = cache_size
+        self.cached = OrderedDict()
+        self.scopes = 0
+        self.flats = 0
+
+    def types(self):
+        '''
+        Returns the types of a new FlatStructure.  FLAT is only used until
+        the file it was built from is resolved, so the types of the ones
+        before it are dropped.
+        '''
+        self.flats += 1
+        self.connection.execute('DELETE FROM types')
+        return TypeStore(self, self.flats)
+
+    def new_scope(self):
+        '''
+        Returns the scope of a new root namespace, the qualified names of
+        each root namespace are kept apart
+        '''
+        self.scopes += 1
+        return str(self.scopes)
+
+    def objects(self, scope, kind):
+        return ObjectStore(self, scope, kind)
+
+    def trim(self):
+        '''
+        Writes the least recently used objects back to the file until at most
+        cache_size of them are left in memory
+        '''
+        evicted = []
+        while len(self.cached) > self.cache_size:
+            (scope, kind, name), obj = self.cached.popitem(last=False)
+            evicted.append((pickle.dumps(obj, pickle.HIGHEST_PROTOCOL), scope, kind, name))
+
+        self.connection.executemany('UPDATE objects SET value = ? WHERE scope = ? AND kind = ? AND name = ?', evicted)
+
+class TypeStore(MutableMapping):
+    '''
+    The types of a FlatStructure, by DIE offset.  Records never change once
+    added, so they're dropped from memory as soon as they're written.
+    '''
+    def __init__(self, store, flat):
+        self.store = store
+        self.connection = store.connection
+        self.flat = flat
+        self.cached = OrderedDict()
+        self.pending = {}
+
+    def flush(self):
+        self.connection.executemany(
+            'INSERT OR REPLACE INTO types VALUES (?, ?, ?)',
+            ((self.flat, encode_offset(offset), pickle.dumps(record, pickle.HIGHEST_PROTOCOL)) for offset, record in self.pending.items())
+        )
+        self.pending = {}
+
+    def remember(self, offset, record):
+        self.cached[offset] = record
+        if len(self.cached) > self.store.cache_size:
+            self.cached.popitem(last=False)
+
+    def __getitem__(self, offset):
+        # types that aren't offsets, such as "void", are looked up too
+        if not isinstance(offset, int):
+            raise KeyError(offset)
+
+        if offset in self.pending:
+            return self.pending[offset]
+
+        if offset in self.cached:
+            self.cached.move_to_end(offset)
+            return self.cached[offset]
+
+        row = self.connection.execute('SELECT record FROM types WHERE flat = ? AND offset = ?', (self.flat, encode_offset(offset))).fetchone()
+        if row is None:
+            raise KeyError(offset)
+
+        record = pickle.loads(row[0])
+        self.remember(offset, record)
+        return record
+
+    def __contains__(self, offset):
+        if not isinstance(offset, int):
+            return False
+        if offset in self.pending or offset in self.cached:
+            return True
+        return self.connection.execute('SELECT 1 FROM types WHERE flat = ? AND offset = ?', (self.flat, encode_offset(offset))).fetchone() is not None
+
+    def __setitem__(self, offset, record):
+        self.cached.pop(offset, None)
+        self.pending[offset] = record
+        if len(self.pending) >= WRITE_BATCH:
+            self.flush()
+
+    def __delitem__(self, offset):
+        if offset not in self:
+            raise KeyError(offset)
+        self.flush()
+        self.cached.pop(offset, None)
+        self.connection.execute('DELETE FROM types WHERE flat = ? AND offset = ?', (self.flat, encode_offset(offset)))
+
+    def __iter__(self):
+        self.flush()
+        for offset, in self.connection.execute('SELECT offset FROM types WHERE flat = ? ORDER BY offset', (self.flat,)):
+            yield decode_offset(offset)
+
+    def __len__(self):
+        self.flush()
+        return self.connection.execute('SELECT COUNT(*) FROM types WHERE flat = ?', (self.flat,)).fetchone()[0]
+
+    def items(self):
+        '''
+        Reads the records straight from the file, in the order of their
+        offsets, without going through the cache
+        '''
+        self.flush()
+        cursor = self.connection.execute('SELECT offset, record FROM types WHERE flat = ? ORDER BY offset', (self.flat,))
+        for offset, record in cursor:
+            yield decode_offset(offset), pickle.loads(record)
+
+    def values(self):
+        for _, record in self.items():
+            yield record
+
+class Memo(OrderedDict):
+    '''
+    A memo of resolution over a FlatStructure of the store, which keeps the
+    cache_size entries last used in memory and drops the others.  They're
+    only worked out again, so nothing is written to the file.
+    '''
+    def __init__(self, cache_size=DEFAULT_CACHE_SIZE):
+        super().__init__()
+        self.cache_size = cache_size
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        self.move_to_end(key)
+        return value
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        if len(self) > self.cache_size:
+            self.popitem(last=False)
+
+class ObjectStore(MutableMapping):
+    '''
+    The objects of one kind, such as structures, of the namespace at scope,
+    by name.  Objects are iterated in the order they were first added, like
+    a dict.  A copy pickles as a dict of every object.
+    '''
+    def __init__(self, store, scope, kind):
+        self.store = store
+        self.connection = store.connection
+        self.scope = scope
+        self.kind = kind
+
+    def key(self, name):
+        return self.scope, self.kind, name
+
+    def __getitem__(self, name):
+        key = self.key(name)
+        cached = self.store.cached
+        if key in cached:
+            cached.move_to_end(key)
+            return cached[key]
+
+        row = self.connection.execute('SELECT value FROM objects WHERE scope = ? AND kind = ? AND name = ?', key).fetchone()
+        if row is None:
+            raise KeyError(name)
+
+        obj = cached[key] = pickle.loads(row[0])
+        return obj
+
+    def __contains__(self, name):
+        key = self.key(name)
+        if key in self.store.cached:
+            return True
+        return self.connection.execute('SELECT 1 FROM objects WHERE scope = ? AND kind = ? AND name = ?', key).fetchone() is not None
+
+    def __setitem__(self, name, obj):
+        # the row is added right away to keep the order objects were added in,
+        # its value is only written once the object is evicted
+        key = self.key(name)
+        self.connection.execute('INSERT OR IGNORE INTO objects (scope, kind, name) VALUES (?, ?, ?)', key)
+        self.store.cached[key] = obj
+        self.store.cached.move_to_end(key)
+
+    def __delitem__(self, name):
+        key = self.key(name)
+        deleted = self.connection.execute('DELETE FROM objects WHERE scope = ? AND kind = ? AND name = ?', key).rowcount
+        if deleted == 0:
+            raise KeyError(name)
+        self.store.cached.pop(key, None)
+
+    def __iter__(self):
+        last = 0
+        while True:
+            rows = self.connection.execute(
+                'SELECT id, name FROM objects WHERE scope = ? AND kind = ? AND id > ? ORDER BY id LIMIT ?',
+                (self.scope, self.kind, last, READ_BATCH)
+            ).fetchall()
+            if rows == []:
+                return
+
+            for last, name in rows:
+                self.store.trim()
+                yield name
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM objects WHERE scope = ? AND kind = ?', (self.scope, self.kind)).fetchone()[0]
+
+    def __reduce__(self):
+        return dict, (list(self.items()),)
+
+def dump_jidl(namespace, f, level=0):
+    '''
+    Writes the JIDL of namespace to f one object at a time.  The output is the
+    same as json.dump of Namespace.to_json with an indent of 4.
+    '''
+    indent = '\n' + '    ' * level
+    f.write('{')
+    for index, (key, objs) in enumerate((
+        ('namespaces', namespace.namespaces),
+        ('structures', namespace.structures),
+        ('enumerations', namespace.enumerations),
+        ('unions', namespace.unions),
+    )):
+        if index > 0:
+            f.write(',')
+        f.write(indent + '    ' + json.dumps(key) + ': ')
+
+        empty = True
+        for name, obj in objs.items():
+            f.write('{' if empty else ',')
+            f.write(indent + '        ' + json.dumps(name) + ': ')
+            empty = False
+
+            if key == 'namespaces':
+                dump_jidl(obj, f, level + 2)
+            else:
+                out_obj = {}
+                obj.to_json(out_obj)
+                f.write(json.dumps(out_obj, indent=4).replace('\n', indent + '        '))
+
+        f.write('{}' if empty else indent + '    }')
+
+    f.write(indent + '}')
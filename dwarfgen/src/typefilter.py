@@ -0,0 +1,70 @@
+'''
+Include and exclude filters on the qualified names of types, the names they
+have in the JIDL such as "app::Point".  Filters are applied while walking the
+DIE's, so the namespaces and types they leave out are never built, resolved
+or written out.
+'''
+import fnmatch
+import re
+
+
+'''
+Patterns starting with this are regular expressions, others are globs
+'''
+REGEX_PREFIX = 're:'
+
+class Pattern:
+    '''
+    A glob or regular expression matched against whole qualified names
+    '''
+    def __init__(self, pattern):
+        if pattern.startswith(REGEX_PREFIX):
+            self.regex = re.compile(pattern[len(REGEX_PREFIX):])
+            self.prefix = None
+            self.covers_prefix = False
+        else:
+            self.regex = re.compile(fnmatch.translate(pattern))
+            # the part of the glob before its first wildcard
+            self.prefix = re.split(r'[*?[]', pattern, maxsplit=1)[0]
+            self.covers_prefix = pattern == self.prefix + '*'
+
+    def matches(self, name):
+        return self.regex.fullmatch(name) is not None
+
+    def may_match_inside(self, namespace):
+        '''
+        Returns False if no name inside namespace can match.  Regular
+        expressions are never ruled out.
+        '''
+        if self.prefix is None:
+            return True
+        inside = namespace + '::'
+        return inside.startswith(self.prefix) or self.prefix.startswith(inside)
+
+    def matches_inside(self, namespace):
+        '''
+        Returns True if every name inside namespace matches, such as with
+        "std::*"
+        '''
+        return self.covers_prefix and (namespace + '::').startswith(self.prefix)
+
+class TypeFilter:
+    '''
+    Keeps the types that match no exclude pattern and, if there are include
+    patterns, match one of them.  A namespace matching an exclude pattern is
+    left out with everything in it, and so is one nothing inside of could be
+    kept.
+    '''
+    def __init__(self, include=(), exclude=()):
+        self.include = [Pattern(pattern) for pattern in include]
+        self.exclude = [Pattern(pattern) for pattern in exclude]
+
+    def keeps_type(self, name):
+        if any(pattern.matches(name) for pattern in self.exclude):
+            return False
+        return self.include == [] or any(pattern.matches(name) for pattern in self.include)
+
+    def keeps_namespace(self, name):
+        if any(pattern.matches(name) or pattern.matches_inside(name) for pattern in self.exclude):
+            return False
+        return self.include == [] or any(pattern.may_match_inside(name) for pattern in self.include)
@@ -1,80 +1,196 @@
+import sys
+
 from . import lookups
 
+# forms whose value is an offset from the start of the owning CU
+CU_RELATIVE_REFERENCE_FORMS = (
+    'DW_FORM_ref1',
+    'DW_FORM_ref2',
+    'DW_FORM_ref4',
+    'DW_FORM_ref8',
+    'DW_FORM_ref_udata',
+)
+
+# string forms whose raw value is an offset or index into a string section
+TABLE_STRING_FORMS = (
+    'DW_FORM_strp',
+    'DW_FORM_line_strp',
+    'DW_FORM_GNU_str_index',
+)
+
 def data_member_location(val):
     if isinstance(val, list):
         return val[1]
     return val
 
-def wrap_die(die):
+def reference(die, attr):
+    '''
+    Returns the .debug_info offset referenced by attr.  CU relative forms are
+    rebased on the owning CU so references are unique across all CU's, the same
+    way DIE offsets are.
+    '''
+    value = die.attributes[attr]
+    if value.form in CU_RELATIVE_REFERENCE_FORMS:
+        return value.value + die.cu.cu_offset
+    return value.value
+
+def string(die, attr):
+    '''
+    Returns the string value of attr.  pyelftools leaves the GNU string index
+    form of split units as an index into .debug_str_offsets.  Strings stored
+    in a string section are decoded once per offset, and every string is
+    interned, so repeated names share one str.
+    '''
+    value = die.attributes[attr]
+    if value.form not in TABLE_STRING_FORMS:
+        return sys.intern(value.value.decode())
+
+    strings = die.dwarfinfo.__dict__.setdefault('_decoded_strings', {})
+    key = (value.form, value.raw_value)
+    if key not in strings:
+        if value.form == 'DW_FORM_GNU_str_index':
+            offset_size = 8 if die.cu.structs.dwarf_format == 64 else 4
+            stream = die.dwarfinfo.debug_str_offsets_sec.stream
+            stream.seek(value.value * offset_size)
+            offset = int.from_bytes(stream.read(offset_size), 'little' if die.dwarfinfo.config.little_endian else 'big')
+            strings[key] = sys.intern(die.dwarfinfo.get_string_from_table(offset).decode())
+        else:
+            strings[key] = sys.intern(value.value.decode())
+    return strings[key]
+
+# 'DW_AT_*'
+ATTRIBUTES = [
+    "byte_size",
+    "encoding",
+    "data_member_location",
+    "bit_size",
+    "bit_offset",
+    "upper_bound",
+    "lower_bound",
+    "artificial",
+    "accessibility",
+    "external",
+    "const_value",
+    "language",
+    "decl_file",
+    "declaration",
+]
+
+# 'DW_AT_*' that reference other DIE's
+REFERENCE_ATTRIBUTES = [
+    "type",
+    "sibling",
+    "specification",
+]
+
+# 'DW_AT_*' but also decode .value
+DECODE_ATTRIBUTES = [
+    'producer',
+    'name',
+    "MIPS_linkage_name",
+    "linkage_name"
+]
+
+# 'DW_TAG_*'
+TAG_TYPES = [
+    'structure_type',
+    'class_type',
+    "union_type",
+    'member',
+    'base_type',
+    'string_type',
+    'typedef',
+    'sibling',
+    'array_type',
+    'subrange_type',
+    'namespace',
+    'variable',
+    "template_type_param",
+    "inheritance",
+    "pointer_type",
+    'reference_type',
+    "enumeration_type",
+    "enumerator",
+    "const_type"
+]
+
+class DIEView:
+    '''
+    Wraps a DIE with the has_*, is_* and attribute accessors the policies
+    use.  The accessors are defined once on the class below, so wrapping only
+    allocates the view.  Anything else is read from the wrapped DIE.
+    '''
+    __slots__ = ('die', 'tag', 'offset', 'attributes')
+
+    def __init__(self, die):
+        self.die = die
+        self.tag = die.tag
+        self.offset = die.offset
+        self.attributes = die.attributes
+
+    def __getattr__(self, name):
+        return getattr(self.die, name)
 
-    # 'DW_AT_*'
-    attributes = [
-        "byte_size",
-        "encoding",
-        "data_member_location",
-        "type",
-        "bit_size",
-        "bit_offset",
-        "sibling",
-        "upper_bound",
-        "lower_bound",
-        "artificial",
-        "accessibility",
-        "external",
-        "const_value",
-        "language",
-    ]
-
-    for attr in attributes:
-        setattr(die, 'has_'+attr,   lambda x=die, a=attr: 'DW_AT_'+a in x.attributes)
-        setattr(die, attr,          lambda x=die, a=attr: data_member_location(x.attributes['DW_AT_'+a].value))
-
-    # 'DW_AT_*' but also decode .value
-    decode_attributes = [
-        'producer',
-        'name',
-        "MIPS_linkage_name",
-        "linkage_name"
-    ]
-
-    for attr in decode_attributes:
-        setattr(die, 'has_'+attr,   lambda x=die, a=attr: 'DW_AT_'+a in x.attributes)
-        setattr(die, attr,          lambda x=die, a=attr: x.attributes['DW_AT_'+a].value.decode())
-
-    # 'DW_TAG_*'
-    tag_types = [
-        'structure_type',
-        'class_type',
-        "union_type",
-        'member',
-        'base_type',
-        'string_type',
-        'typedef',
-        'sibling',
-        'array_type',
-        'subrange_type',
-        'namespace',
-        'variable',
-        "template_type_param",
-        "inheritance",
-        "pointer_type",
-        'reference_type',
-        "enumeration_type",
-        "enumerator",
-        "const_type"
-    ]
-
-    for tag_type in tag_types:
-        setattr(die, 'is_'+tag_type, lambda x=die, tag=tag_type: x.tag == 'DW_TAG_'+tag)
-
-    # add a special one for artificial
-    setattr(die, "is_artificial",   lambda x=die: x.has_artificial() and x.artificial() == 1)
-
-    # add a special one for namespace
-    setattr(die, "has_namespace",   lambda x=die: hasattr(x, 'namespace'))
-
-    # add a single member function to check all structure like types
-    setattr(die, 'is_structure_like', lambda x=die: x.is_structure_type() or x.is_class_type())
-
-    return die
+    # set by the namespace application policy on the DIE itself, so it's
+    # seen by every view of the DIE
+    @property
+    def namespace(self):
+        return self.die.namespace
 
+    @namespace.setter
+    def namespace(self, value):
+        self.die.namespace = value
+
+    def has_namespace(self):
+        return hasattr(self.die, 'namespace')
+
+    def is_artificial(self):
+        return self.has_artificial() and self.artificial() == 1
+
+    # a single member function to check all structure like types
+    def is_structure_like(self):
+        return self.tag == 'DW_TAG_structure_type' or self.tag == 'DW_TAG_class_type'
+
+    def iter_children(self):
+        for child in self.die.iter_children():
+            yield DIEView(child)
+
+    def get_parent(self):
+        parent = self.die.get_parent()
+        return DIEView(parent) if parent is not None else None
+
+def add_accessors(attr, has, get):
+    setattr(DIEView, 'has_'+attr, has)
+    setattr(DIEView, attr, get)
+
+for attr in ATTRIBUTES:
+    name = 'DW_AT_'+attr
+    add_accessors(
+        attr,
+        lambda self, name=name: name in self.attributes,
+        lambda self, name=name: data_member_location(self.attributes[name].value)
+    )
+
+for attr in REFERENCE_ATTRIBUTES:
+    name = 'DW_AT_'+attr
+    add_accessors(
+        attr,
+        lambda self, name=name: name in self.attributes,
+        lambda self, name=name: reference(self.die, name)
+    )
+
+for attr in DECODE_ATTRIBUTES:
+    name = 'DW_AT_'+attr
+    add_accessors(
+        attr,
+        lambda self, name=name: name in self.attributes,
+        lambda self, name=name: string(self.die, name)
+    )
+
+for tag_type in TAG_TYPES:
+    setattr(DIEView, 'is_'+tag_type, lambda self, tag='DW_TAG_'+tag_type: self.tag == tag)
+
+def wrap_die(die):
+    if isinstance(die, DIEView):
+        return die
+    return DIEView(die)
@@ -3,14 +3,23 @@ import setuptools
 with open("README.md", "r") as fh:
     long_description = fh.read()
 
+version = {}
+with open("dwarfgen/src/version.py", "r") as fh:
+    exec(fh.read(), version)
+
 install_requires = [
-    'pyelftools',
+    # MappedELFFile overrides private readers of these releases, see mappedelf
+    'pyelftools>=0.33,<0.34',
     'pymanifest',
 ]
 
+extras_require = {
+    'columnar': ['numpy>=1.23'],
+}
+
 setuptools.setup(
     name='dwarfgen',
-    version='0.3',
+    version=version['VERSION'],
     packages=[
         'dwarfgen',
         'dwarfgen.src',
@@ -27,5 +36,6 @@ setuptools.setup(
         "License :: OSI Approved :: The Unlicense (Unlicense)",
         "Operating System :: OS Independent",
     ],
-    install_requires=install_requires
+    install_requires=install_requires,
+    extras_require=extras_require
 )
\ No newline at end of file
@@ -0,0 +1,144 @@
+'''
+Small libraries for the feature tests, built from source by the compilers on
+the PATH.  A test skips when a tool it builds with isn't installed.
+'''
+import os
+import shutil
+import subprocess
+import sys
+import unittest
+
+
+TEST_DIR = os.path.dirname(os.path.realpath(__file__))
+DWARF_GEN_DIR = os.path.realpath(os.path.join(TEST_DIR, '..'))
+if DWARF_GEN_DIR not in sys.path:
+    sys.path.append(DWARF_GEN_DIR)
+
+
+'''
+Options every fixture is compiled with.  gnu99 and c++98 give the CU a
+language code lookups knows.
+'''
+C_OPTIONS = ['-g', '-std=gnu99', '-fPIC', '-shared']
+CXX_OPTIONS = ['-g', '-std=c++98', '-fPIC', '-shared']
+
+'''
+A C library with a few types of its own, and pointers to ones of the
+standard headers
+'''
+LIBRARY_C = '''
+#include <stdarg.h>
+#include <stdio.h>
+#include <time.h>
+
+#include "inc/point.h"
+
+struct record {
+    FILE *out;
+    struct tm *when;
+    va_list *args;
+    struct point where;
+};
+
+union value {
+    int i;
+    float f;
+};
+
+enum color { RED, GREEN };
+
+struct record global_record;
+union value global_value;
+enum color global_color;
+
+int log_record(struct record *r, const char *format, ...)
+{
+    va_list args;
+    va_start(args, format);
+    int n = vfprintf(r->out, format, args);
+    va_end(args);
+    return n;
+}
+'''
+
+POINT_H = '''
+struct point {
+    int x;
+    int y;
+};
+'''
+
+LIBRARY_SOURCES = {'lib.c': LIBRARY_C, 'inc/point.h': POINT_H}
+
+def moved_header_sources(directory):
+    '''
+    Returns LIBRARY_SOURCES with point.h in directory instead of inc.  Only
+    the line program's file table of the library changes.
+    '''
+    library_c = LIBRARY_C.replace('"inc/point.h"', '"{}/point.h"'.format(directory))
+    return {'lib.c': library_c, directory + '/point.h': POINT_H}
+
+'''
+A C++ library of types in nested namespaces, and its types by qualified name
+'''
+LIBRARY_CPP = '''
+namespace app {
+struct Point { int x, y; };
+enum Color { RED, GREEN };
+template <typename T> struct Box { T value; };
+namespace inner { struct Deep { Point corners[3]; Color color; }; }
+}
+struct Wrapper { app::inner::Deep deep; app::Box<int> box; };
+Wrapper global_wrapper;
+'''
+
+LIBRARY_CPP_TYPES = {'Wrapper', 'app::Point', 'app::Color', 'app::Box<int>', 'app::inner::Deep'}
+
+def require(*tools):
+    '''
+    Skips the test unless every one of tools is on the PATH
+    '''
+    for tool in tools:
+        if shutil.which(tool) is None:
+            raise unittest.SkipTest('{} is not installed'.format(tool))
+
+def write_sources(directory, sources):
+    for name, text in sources.items():
+        path = os.path.join(directory, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(text)
+
+def build(directory, output, sources=LIBRARY_SOURCES, options=(), compiler='gcc'):
+    '''
+    Writes sources, a dict of file name to text, to directory and compiles
+    the .c and .cpp ones into the library output there.  Returns the
+    library's path.
+    '''
+    require(compiler)
+    write_sources(directory, sources)
+    language_options = CXX_OPTIONS if compiler == 'g++' else C_OPTIONS
+    compiled = [name for name in sources if name.endswith(('.c', '.cpp'))]
+    command = [compiler] + language_options + list(options) + ['-o', output] + compiled
+    subprocess.check_call(command, cwd=directory)
+    return os.path.join(directory, output)
+
+def extract(files, **kwargs):
+    '''
+    Returns the jidl dwarfgen.process extracts from files
+    '''
+    import dwarfgen
+    jidl = {}
+    dwarfgen.process(files, **kwargs).to_json(jidl)
+    return jidl
+
+def type_names(jidl):
+    '''
+    Returns the qualified names of the types in jidl
+    '''
+    names = set()
+    for kind in ('structures', 'unions', 'enumerations'):
+        names.update(jidl.get(kind, {}))
+    for name, namespace in jidl.get('namespaces', {}).items():
+        names.update(name + '::' + inner for inner in type_names(namespace))
+    return names
@@ -11,6 +11,7 @@ from languages.fortran  import build as build_fortran
 
 import subprocess
 import test
+import unittest
 import time
 import json
 import copy
@@ -78,4 +79,8 @@ if __name__ == '__main__':
     for lang, config in language_matrix.items():
         success = success and test_lang(lang, config)
 
+    # the feature tests build the small libraries they need themselves
+    feature_tests = unittest.defaultTestLoader.discover(TEST_DIR, pattern='test_*.py', top_level_dir=TEST_DIR)
+    success = unittest.TextTestRunner(verbosity=2).run(feature_tests).wasSuccessful() and success
+
 sys.exit(0 if success else 1)
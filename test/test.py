@@ -1,5 +1,6 @@
 import sys
 import os
+import tempfile
 
 
 TEST_DIR = os.path.dirname(os.path.realpath(__file__))
@@ -10,6 +11,7 @@ if DWARF_GEN_DIR not in sys.path:
 
 import unittest
 import dwarfgen
+from dwarfgen.src import columnar
 import logging
 import json
 
@@ -124,9 +126,28 @@ class TestDwarfGen(unittest.TestCase):
         )
 
 
-def add_to_suite(test_class, so_file, jidl_file, loader, suite):
-
-    ns = dwarfgen.process([so_file])
+'''
+Keyword arguments to dwarfgen.process.  Every set of options must produce the
+same jidl as the default serial extraction.
+'''
+PROCESS_OPTIONS = [
+    {},
+    {'jobs': 2},
+    {'native_scanner': True},
+    {'lazy_resolution': True},
+    {'bounded_memory': True},
+    {'spill_dir': tempfile.gettempdir(), 'spill_cache_size': 1},
+    {'exclude_types': ['std', '__gnu_cxx']},
+    {'source_roots': [TEST_DIR]},
+    {'cu_filter': ['*']},
+]
+
+if columnar.available():
+    PROCESS_OPTIONS.append({'columnar_resolver': True})
+
+def add_to_suite(test_class, so_file, jidl_file, loader, suite, process_options):
+
+    ns = dwarfgen.process([so_file], **process_options)
     calculated_jidl = {}
     ns.to_json(calculated_jidl)
 
@@ -142,7 +163,8 @@ def run(so_file, jidl_file):
     loader = unittest.TestLoader()
     suite = unittest.TestSuite()
 
-    add_to_suite(TestDwarfGen, so_file, jidl_file, loader, suite)
+    for process_options in PROCESS_OPTIONS:
+        add_to_suite(TestDwarfGen, so_file, jidl_file, loader, suite, process_options)
 
     result = unittest.TextTestRunner().run(suite)
     return result.wasSuccessful()
@@ -0,0 +1,56 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+TEST_DIR = os.path.dirname(os.path.realpath(__file__))
+if TEST_DIR not in sys.path:
+    sys.path.append(TEST_DIR)
+
+
+import fixtures
+
+from dwarfgen.src import dwarfgen
+
+
+class TestBoundedMemory(unittest.TestCase):
+    '''
+    An extraction with bounded_memory must give the types it gives without
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.library = fixtures.build(cls.directory.name, 'lib.so')
+        cls.cpp_library = fixtures.build(cls.directory.name, 'cpp.so', {'lib.cpp': fixtures.LIBRARY_CPP}, compiler='g++')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def assertBounded(self, files, **kwargs):
+        self.assertEqual(fixtures.extract(files, bounded_memory=True, **kwargs), fixtures.extract(files, **kwargs))
+
+    def test_bounded(self):
+        self.assertBounded([self.library])
+        self.assertBounded([self.cpp_library], roots=['app::inner::Deep'])
+
+    def test_unknown_dwarf_info(self):
+        # a pyelftools whose DWARFInfo takes an argument it doesn't keep
+        class DWARFInfo(dwarfgen.DWARFInfo):
+            def __init__(self, debug_unknown_sec, **kwargs):
+                super().__init__(**kwargs)
+
+        dwarfgen.dwarf_info_fields.cache_clear()
+        try:
+            with mock.patch.object(dwarfgen, 'DWARFInfo', DWARFInfo), self.assertLogs(level='WARNING') as logs:
+                self.assertBounded([self.library])
+        finally:
+            dwarfgen.dwarf_info_fields.cache_clear()
+            dwarfgen.warn_unbounded.cache_clear()
+        self.assertIn('debug_unknown_sec', '\n'.join(logs.output))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+TEST_DIR = os.path.dirname(os.path.realpath(__file__))
+if TEST_DIR not in sys.path:
+    sys.path.append(TEST_DIR)
+
+
+import fixtures
+
+from dwarfgen.src import dwarfgen
+
+
+'''
+A second CU, linked before the fixture's own so that CU moves
+'''
+EXTRA_C = '''
+struct extra { long id; };
+struct extra global_extra;
+'''
+
+
+class TestCache(unittest.TestCase):
+    '''
+    Results and CU's are loaded from the cache_dir when nothing they depend
+    on changed, and extracted again otherwise
+    '''
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.directory.name, 'cache')
+        self.library = fixtures.build(self.directory.name, 'lib.so')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def extract(self, library=None, **kwargs):
+        return fixtures.extract([library or self.library], cache_dir=self.cache_dir, **kwargs)
+
+    def test_hit(self):
+        jidl = self.extract()
+        self.assertEqual(jidl, fixtures.extract([self.library]))
+        self.assertTrue(os.listdir(os.path.join(self.cache_dir, 'results')))
+
+        with mock.patch.object(dwarfgen, 'extract_file', side_effect=AssertionError('cache miss')):
+            self.assertEqual(self.extract(), jidl)
+
+    def test_changed_library(self):
+        self.extract()
+        point_h = fixtures.POINT_H.replace('int y;', 'int y;\n    int z;')
+        fixtures.build(self.directory.name, 'lib.so', dict(fixtures.LIBRARY_SOURCES, **{'inc/point.h': point_h}))
+
+        jidl = self.extract()
+        self.assertIn('z', jidl['structures']['point']['members'])
+        self.assertEqual(jidl, fixtures.extract([self.library]))
+
+    def test_changed_options(self):
+        self.extract(include_types=['point'])
+        with mock.patch.object(dwarfgen, 'extract_file', wraps=dwarfgen.extract_file) as extract_file:
+            jidl = self.extract()
+            self.assertEqual(extract_file.call_count, 1)
+        self.assertIn('record', jidl['structures'])
+
+    def test_eviction(self):
+        self.extract(cache_size=0)
+        with mock.patch.object(dwarfgen, 'extract_file', wraps=dwarfgen.extract_file) as extract_file:
+            self.extract(cache_size=0)
+            self.assertEqual(extract_file.call_count, 1)
+
+    def test_unchanged_cu(self):
+        self.extract()
+        # the .c sources are linked in the order of the dict
+        relinked = fixtures.build(self.directory.name, 'relinked.so', {'extra.c': EXTRA_C, **fixtures.LIBRARY_SOURCES})
+
+        with mock.patch.object(dwarfgen, 'walk_cu', wraps=dwarfgen.walk_cu) as walk_cu:
+            jidl = self.extract(relinked)
+            self.assertEqual(walk_cu.call_count, 1)
+        self.assertEqual(jidl, fixtures.extract([relinked]))
+        self.assertIn('extra', jidl['structures'])
+
+    def test_moved_header(self):
+        self.extract()
+        # the same DIE's, with a different file table
+        library = fixtures.build(self.directory.name, 'moved.so', fixtures.moved_header_sources('other'))
+
+        with mock.patch.object(dwarfgen, 'walk_cu', wraps=dwarfgen.walk_cu) as walk_cu:
+            self.extract(library)
+            self.assertEqual(walk_cu.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+TEST_DIR = os.path.dirname(os.path.realpath(__file__))
+if TEST_DIR not in sys.path:
+    sys.path.append(TEST_DIR)
+
+
+import fixtures
+
+from dwarfgen.src import mappedelf
+
+
+'''
+Enough similar types for compression to shrink .debug_info, which objcopy
+leaves uncompressed otherwise
+'''
+COMPRESSIBLE_C = ''.join('''
+struct node{0} {{ int first; long second; struct node{0} *next; }};
+struct node{0} global_node{0};
+'''.format(i) for i in range(100))
+
+SHF_COMPRESSED = 0x800
+
+
+class TestCompressedSections(unittest.TestCase):
+    '''
+    Types read from compressed debug sections must be the ones read from the
+    same library uncompressed
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.library = fixtures.build(cls.directory.name, 'lib.so', dict(fixtures.LIBRARY_SOURCES, **{'nodes.c': COMPRESSIBLE_C}))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def compress(self, output, *options):
+        fixtures.require('objcopy')
+        compressed = os.path.join(self.directory.name, output)
+        subprocess.check_call(['objcopy'] + list(options) + [self.library, compressed])
+        with mappedelf.open_elf(compressed, use_mmap=False) as elffile:
+            self.assertTrue(elffile.get_section_by_name('.debug_info')['sh_flags'] & SHF_COMPRESSED)
+        return compressed
+
+    def test_zlib(self):
+        compressed = self.compress('zlib.so', '--compress-debug-sections=zlib')
+        expected = fixtures.extract([self.library])
+        self.assertIn('node99', expected['structures'])
+        for kwargs in ({}, {'native_scanner': True}, {'use_mmap': False}):
+            self.assertEqual(fixtures.extract([compressed], **kwargs), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
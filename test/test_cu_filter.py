@@ -0,0 +1,66 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+TEST_DIR = os.path.dirname(os.path.realpath(__file__))
+if TEST_DIR not in sys.path:
+    sys.path.append(TEST_DIR)
+
+
+import fixtures
+
+from dwarfgen.src import dwarfgen
+
+
+SOURCES = {
+    'net.c': 'struct packet { int length; }; struct packet global_packet;\n',
+    'disk.c': 'struct block { long sector; }; struct block global_block;\n',
+}
+
+
+class TestCUFilter(unittest.TestCase):
+    '''
+    The cu_filter keeps the CU's whose name or directory match it
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def build(self, name, *options):
+        directory = os.path.join(self.directory.name, name)
+        os.makedirs(directory)
+        return fixtures.build(directory, 'lib.so', SOURCES, options)
+
+    def names(self, library, cu_filter):
+        return fixtures.type_names(fixtures.extract([library], cu_filter=cu_filter))
+
+    def test_name(self):
+        library = self.build('plain', '-gdwarf-5')
+        self.assertEqual(self.names(library, ['net.c']), {'packet'})
+        self.assertEqual(self.names(library, ['*/plain/*']), {'packet', 'block'})
+
+    def test_skeleton(self):
+        # skeletons have no DW_AT_name, gcc names their .dwo after the output
+        library = self.build('split', '-gdwarf-5', '-gsplit-dwarf')
+        self.assertEqual(self.names(library, ['*-net.dwo']), {'packet'})
+
+        library = self.build('gnu_split', '-gdwarf-4', '-gsplit-dwarf')
+        self.assertEqual(self.names(library, ['*-disk.dwo']), {'block'})
+
+    def test_unnamed(self):
+        # the directory is mapped away, and the names aren't read
+        directory = os.path.join(self.directory.name, 'unnamed')
+        library = self.build('unnamed', '-gdwarf-5', '-fdebug-prefix-map={}='.format(directory))
+        with mock.patch.object(dwarfgen, 'CU_NAME_ATTRIBUTES', ()), self.assertLogs(level='WARNING'):
+            self.assertEqual(self.names(library, ['net.c']), {'packet', 'block'})
+
+
+if __name__ == '__main__':
+    unittest.main()
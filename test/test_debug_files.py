@@ -0,0 +1,97 @@
+import glob
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+TEST_DIR = os.path.dirname(os.path.realpath(__file__))
+if TEST_DIR not in sys.path:
+    sys.path.append(TEST_DIR)
+
+
+import fixtures
+
+from dwarfgen.src import batch
+from dwarfgen.src import elfutils
+from dwarfgen.src import mappedelf
+
+
+class TestDebugFiles(unittest.TestCase):
+    '''
+    Types read from separate debug files and split units must be the ones
+    read from a library built with plain DWARF
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def build(self, name, sources=fixtures.LIBRARY_SOURCES, options=()):
+        directory = os.path.join(self.directory.name, name)
+        os.makedirs(directory)
+        return fixtures.build(directory, 'lib.so', sources, options)
+
+    def assertSameTypes(self, library, expected, **kwargs):
+        jidl = fixtures.extract([library], **kwargs)
+        self.assertEqual(jidl, fixtures.extract([expected], **kwargs))
+        self.assertIn('record', jidl['structures'])
+
+    def split_debug_file(self, library, debug_file, *strip_options):
+        fixtures.require('objcopy')
+        stripped = os.path.join(os.path.dirname(library), 'stripped.so')
+        subprocess.check_call(['objcopy', '--only-keep-debug', library, debug_file])
+        subprocess.check_call(['objcopy', '--strip-debug'] + list(strip_options) + [library, stripped])
+        return stripped
+
+    def test_gnu_debuglink(self):
+        library = self.build('debuglink')
+        debug_file = os.path.join(os.path.dirname(library), 'lib.debug')
+        # the debug link is resolved next to the stripped library
+        stripped = self.split_debug_file(library, debug_file, '--add-gnu-debuglink=' + debug_file)
+        self.assertSameTypes(stripped, library, debug_dirs=[])
+
+    def test_batch_weight(self):
+        library = self.build('weight')
+        debug_file = os.path.join(os.path.dirname(library), 'lib.debug')
+        stripped = self.split_debug_file(library, debug_file, '--add-gnu-debuglink=' + debug_file)
+        # a stripped file weighs as much as the debug info it's extracted from
+        files, sizes = batch.unique_files([stripped], debug_dirs=[])
+        self.assertGreater(sizes[stripped], 0)
+        self.assertEqual(sizes[stripped], batch.describe(library)[0])
+
+    def test_build_id(self):
+        library = self.build('build_id')
+        with mappedelf.open_elf(library, use_mmap=False) as elffile:
+            build_id = elfutils.build_id(elffile)
+        if build_id is None:
+            self.skipTest('the linker adds no build-id')
+
+        debug_dir = os.path.join(os.path.dirname(library), 'debug')
+        debug_file = os.path.join(debug_dir, '.build-id', build_id[:2], build_id[2:] + '.debug')
+        os.makedirs(os.path.dirname(debug_file))
+        stripped = self.split_debug_file(library, debug_file)
+        self.assertSameTypes(stripped, library, debug_dirs=[debug_dir])
+
+    def test_dwo(self):
+        library = self.build('dwo', options=['-gdwarf-5', '-gsplit-dwarf'])
+        self.assertTrue(glob.glob(os.path.join(os.path.dirname(library), '*.dwo')))
+        self.assertSameTypes(library, self.build('dwo_plain', options=['-gdwarf-5']))
+
+    def test_dwp(self):
+        fixtures.require('dwp')
+        # GNU dwp only packages DWARF 4 split units
+        library = self.build('dwp', options=['-gdwarf-4', '-gsplit-dwarf'])
+        dwos = glob.glob(os.path.join(os.path.dirname(library), '*.dwo'))
+        subprocess.check_call(['dwp', '-o', library + '.dwp'] + dwos)
+        for dwo in dwos:
+            os.remove(dwo)
+        self.assertSameTypes(library, self.build('dwp_plain', options=['-gdwarf-4']))
+
+
+if __name__ == '__main__':
+    unittest.main()
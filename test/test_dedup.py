@@ -0,0 +1,72 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+TEST_DIR = os.path.dirname(os.path.realpath(__file__))
+if TEST_DIR not in sys.path:
+    sys.path.append(TEST_DIR)
+
+
+import fixtures
+
+from dwarfgen.src import dwarfgen
+
+
+'''
+A header of each kind of type that is deduplicated, included by two CU's
+'''
+SHARED_H = '''
+struct shape { int sides; double length; };
+union number { int i; float f; struct shape shape; };
+enum color { RED, GREEN, BLUE };
+'''
+
+UNIT_C = '''
+#include "shared.h"
+struct shape global_shape_{0};
+union number global_number_{0};
+enum color global_color_{0};
+'''
+
+SOURCES = {'shared.h': SHARED_H, 'a.c': UNIT_C.format('a'), 'b.c': UNIT_C.format('b')}
+
+
+class TestDedup(unittest.TestCase):
+    '''
+    The second CU's copies of the shared types are aliased instead of built,
+    and the types extracted don't change
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.library = fixtures.build(cls.directory.name, 'lib.so', SOURCES)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def test_aliased(self):
+        for native_scanner in (False, True):
+            aliased = []
+            original = dwarfgen.alias_duplicate_type
+
+            def alias(die, namespace, name):
+                result = original(die, namespace, name)
+                if result:
+                    aliased.append(die.tag)
+                return result
+
+            with mock.patch.object(dwarfgen, 'alias_duplicate_type', alias):
+                jidl = fixtures.extract([self.library], native_scanner=native_scanner)
+            with mock.patch.object(dwarfgen, 'alias_duplicate_type', return_value=False):
+                expected = fixtures.extract([self.library], native_scanner=native_scanner)
+
+            self.assertEqual(jidl, expected)
+            self.assertEqual(sorted(aliased), ['DW_TAG_enumeration_type', 'DW_TAG_structure_type', 'DW_TAG_union_type'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import sys
+import tempfile
+import unittest
+
+TEST_DIR = os.path.dirname(os.path.realpath(__file__))
+if TEST_DIR not in sys.path:
+    sys.path.append(TEST_DIR)
+
+
+import fixtures
+
+
+class TestFilters(unittest.TestCase):
+    '''
+    include_types and exclude_types pick the types that are extracted by
+    qualified name
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.library = fixtures.build(cls.directory.name, 'lib.so', {'lib.cpp': fixtures.LIBRARY_CPP}, compiler='g++')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def names(self, **kwargs):
+        return fixtures.type_names(fixtures.extract([self.library], **kwargs))
+
+    def test_without_filters(self):
+        self.assertEqual(self.names(), fixtures.LIBRARY_CPP_TYPES)
+
+    def test_exclude_namespace(self):
+        self.assertEqual(self.names(exclude_types=['app::*']), {'Wrapper'})
+        self.assertEqual(self.names(exclude_types=['app::inner::*']), fixtures.LIBRARY_CPP_TYPES - {'app::inner::Deep'})
+
+    def test_include(self):
+        self.assertEqual(self.names(include_types=['app::inner::*']), {'app::inner::Deep'})
+        self.assertEqual(self.names(include_types=['app::Box<*>', 'Wrapper']), {'app::Box<int>', 'Wrapper'})
+
+    def test_regular_expression(self):
+        self.assertEqual(self.names(include_types=['re:app::[A-Z].*']), {'app::Point', 'app::Color', 'app::Box<int>'})
+
+    def test_exclude_overrides_include(self):
+        names = self.names(include_types=['app::*'], exclude_types=['app::inner::*', 'app::Color'])
+        self.assertEqual(names, {'app::Point', 'app::Box<int>'})
+
+    def test_filtered_members_still_resolve(self):
+        jidl = fixtures.extract([self.library], include_types=['Wrapper'])
+        members = jidl['structures']['Wrapper']['members']
+        self.assertEqual(members['deep']['type'], 'app::inner::Deep')
+        self.assertEqual(members['deep']['byteSize'], 28)
+
+
+if __name__ == '__main__':
+    unittest.main()
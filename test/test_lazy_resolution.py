@@ -0,0 +1,61 @@
+import os
+import pickle
+import sys
+import tempfile
+import unittest
+
+TEST_DIR = os.path.dirname(os.path.realpath(__file__))
+if TEST_DIR not in sys.path:
+    sys.path.append(TEST_DIR)
+
+
+import fixtures
+
+import dwarfgen
+
+
+class TestLazyResolution(unittest.TestCase):
+    '''
+    Lazily resolved members must read like eagerly resolved ones, and leave
+    FLAT behind when they're pickled
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.library = fixtures.build(cls.directory.name, 'lib.so')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def test_same_types(self):
+        self.assertEqual(fixtures.extract([self.library], lazy_resolution=True), fixtures.extract([self.library]))
+
+    def test_pickled_member_is_resolved(self):
+        namespace = dwarfgen.process([self.library], lazy_resolution=True)
+        member = namespace.structures['record'].members['where']
+        self.assertIsNotNone(member.resolver)
+
+        copy = pickle.loads(pickle.dumps(member))
+        self.assertIsNone(copy.resolver)
+        self.assertEqual(copy.type_str, 'point')
+        self.assertEqual(copy.byte_size, 8)
+
+    def test_pickled_like_eager(self):
+        lazy = dwarfgen.process([self.library], lazy_resolution=True)
+        eager = dwarfgen.process([self.library])
+        self.assertEqual(len(pickle.dumps(lazy)), len(pickle.dumps(eager)))
+
+    def test_cache_and_file_jobs(self):
+        expected = fixtures.extract([self.library])
+        with tempfile.TemporaryDirectory() as cache_dir:
+            for _ in range(2):
+                self.assertEqual(fixtures.extract([self.library], lazy_resolution=True, cache_dir=cache_dir), expected)
+
+        libraries = [self.library, fixtures.build(self.directory.name, 'other.so', {'other.c': 'struct other { int id; } global_other;'})]
+        self.assertEqual(fixtures.extract(libraries, lazy_resolution=True, file_jobs=2), fixtures.extract(libraries))
+
+
+if __name__ == '__main__':
+    unittest.main()
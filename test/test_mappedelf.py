@@ -0,0 +1,50 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+TEST_DIR = os.path.dirname(os.path.realpath(__file__))
+if TEST_DIR not in sys.path:
+    sys.path.append(TEST_DIR)
+
+
+import fixtures
+
+from dwarfgen.src import mappedelf
+
+
+class TestMappedELF(unittest.TestCase):
+    '''
+    Files read through the private section readers of pyelftools must give
+    the types they give through its public interface
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.library = fixtures.build(cls.directory.name, 'lib.so')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def test_mapped(self):
+        with mappedelf.open_elf(self.library) as elffile:
+            self.assertEqual(isinstance(elffile, mappedelf.MappedELFFile), mappedelf.PRIVATE_API)
+
+    def test_public_interface(self):
+        expected = fixtures.extract([self.library])
+        with mock.patch.object(mappedelf, 'PRIVATE_API', False):
+            with mappedelf.open_elf(self.library) as elffile:
+                self.assertNotIsInstance(elffile, mappedelf.MappedELFFile)
+                section = elffile.get_section_by_name('.debug_info')
+                descriptor = mappedelf.read_dwarf_section(elffile, section)
+                self.assertEqual(descriptor.stream.read(), section.data())
+
+            for kwargs in ({}, {'native_scanner': True}):
+                self.assertEqual(fixtures.extract([self.library], **kwargs), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
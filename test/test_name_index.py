@@ -0,0 +1,201 @@
+import os
+import struct
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+TEST_DIR = os.path.dirname(os.path.realpath(__file__))
+if TEST_DIR not in sys.path:
+    sys.path.append(TEST_DIR)
+
+
+import fixtures
+
+from dwarfgen.src import accel
+from dwarfgen.src import dwarfgen
+from dwarfgen.src import mappedelf
+from dwarfgen.src.options import Options
+
+
+'''
+Two CU's of C++ types, some in namespaces.  The names are longer than an
+offset, so gcc keeps them in .debug_str where .debug_names can point to them.
+'''
+SHAPES_CPP = '''
+namespace geometry {
+struct Vertex { int x, y; };
+enum Palette { RED, GREEN };
+template <typename T> struct Container { T value; Container *next; };
+namespace detail { struct Triangle { Vertex corners[3]; Palette palette; }; }
+}
+geometry::Container<int> global_container;
+geometry::detail::Triangle global_triangle;
+'''
+
+SCENE_CPP = '''
+namespace geometry { struct Vertex { int x, y; }; }
+typedef struct { double scale; geometry::Vertex origin; } Transform;
+struct Scene { Transform transform; const char *title; };
+Scene global_scene;
+'''
+
+SOURCES = {'shapes.cpp': SHAPES_CPP, 'scene.cpp': SCENE_CPP}
+
+ROOTS = [
+    'Scene',
+    'Transform',
+    'geometry::Vertex',
+    'geometry::Palette',
+    'geometry::detail::Triangle',
+    'geometry::Container<int>',
+]
+
+'''
+The tags .debug_names entries are written for
+'''
+INDEXED_TAGS = {
+    'DW_TAG_structure_type': 0x13,
+    'DW_TAG_class_type': 0x02,
+    'DW_TAG_union_type': 0x17,
+    'DW_TAG_enumeration_type': 0x04,
+    'DW_TAG_typedef': 0x16,
+    'DW_TAG_namespace': 0x39,
+}
+
+DW_IDX_compile_unit = 1
+DW_IDX_die_offset = 3
+DW_FORM_data1 = 0x0b
+DW_FORM_ref4 = 0x13
+
+def uleb128(value):
+    data = b''
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value == 0:
+            return data + bytes([byte])
+        data += bytes([byte | 0x80])
+
+def case_folding_djb_hash(name):
+    value = 5381
+    for byte in name.lower():
+        value = (value * 33 + byte) & 0xffffffff
+    return value
+
+def debug_names(library):
+    '''
+    Returns a 32-bit DWARF 5 .debug_names for the types of library, laid out
+    the way LLVM writes it: an entry per defined DIE of INDEXED_TAGS naming
+    its CU and its offset in the CU
+    '''
+    with mappedelf.open_elf(library, use_mmap=False) as elffile:
+        dwarfinfo = elffile.get_dwarf_info()
+        cu_offsets = []
+        entries = {}
+        for CU in dwarfinfo.iter_CUs():
+            for die in CU.iter_DIEs():
+                name = die.attributes.get('DW_AT_name')
+                if die.tag not in INDEXED_TAGS or name is None or name.form != 'DW_FORM_strp':
+                    continue
+                if 'DW_AT_declaration' in die.attributes:
+                    continue
+                entries.setdefault(name.value, (name.raw_value, []))[1].append(
+                    (len(cu_offsets), die.offset - CU.cu_offset, INDEXED_TAGS[die.tag]))
+            cu_offsets.append(CU.cu_offset)
+
+    bucket_count = len(entries) // 2 + 1
+    names = sorted(entries.items(), key=lambda item: case_folding_djb_hash(item[0]) % bucket_count)
+
+    codes = {}
+    abbrevs = b''
+    for tag in sorted({tag for _, (_, dies) in names for _, _, tag in dies}):
+        codes[tag] = len(codes) + 1
+        abbrevs += uleb128(codes[tag]) + uleb128(tag)
+        abbrevs += uleb128(DW_IDX_compile_unit) + uleb128(DW_FORM_data1)
+        abbrevs += uleb128(DW_IDX_die_offset) + uleb128(DW_FORM_ref4) + b'\0\0'
+    abbrevs += b'\0'
+
+    pool = b''
+    entry_offsets = []
+    buckets = [0] * bucket_count
+    for i, (name, (_, dies)) in enumerate(names):
+        entry_offsets.append(len(pool))
+        for cu, offset, tag in dies:
+            pool += uleb128(codes[tag]) + bytes([cu]) + struct.pack('<I', offset)
+        pool += b'\0'
+        bucket = case_folding_djb_hash(name) % bucket_count
+        if buckets[bucket] == 0:
+            buckets[bucket] = i + 1
+
+    body = struct.pack('<HH7I', 5, 0, len(cu_offsets), 0, 0, bucket_count, len(names), len(abbrevs), 0)
+    body += struct.pack('<{}I'.format(len(cu_offsets)), *cu_offsets)
+    body += struct.pack('<{}I'.format(bucket_count), *buckets)
+    body += b''.join(struct.pack('<I', case_folding_djb_hash(name)) for name, _ in names)
+    body += b''.join(struct.pack('<I', string) for _, (string, _) in names)
+    body += struct.pack('<{}I'.format(len(names)), *entry_offsets)
+    body += abbrevs + pool
+    return struct.pack('<I', len(body)) + body
+
+
+class TestNameIndex(unittest.TestCase):
+    '''
+    The roots each index finds must be the ones a search of every CU finds
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def build(self, output, *options):
+        return fixtures.build(self.directory.name, output, SOURCES, options, compiler='g++')
+
+    def check_index(self, library, index_type):
+        with mappedelf.open_elf(library, use_mmap=False) as elffile:
+            dwarfinfo = elffile.get_dwarf_info()
+            index = accel.open_index(elffile, dwarfinfo)
+            self.assertIsInstance(index, index_type)
+
+            with mock.patch.object(dwarfgen, 'OPTIONS', Options(roots=ROOTS)):
+                found = {}
+                declared = {}
+                dwarfgen.find_indexed_roots(dwarfinfo, index, found, declared)
+                indexed = dwarfgen.find_roots(dwarfinfo, index)
+                scanned = dwarfgen.find_roots(dwarfinfo)
+
+        self.assertEqual(len(scanned), len(ROOTS))
+        self.assertEqual(indexed, scanned)
+        # every root is defined somewhere, so the index alone must find it
+        self.assertEqual(set(found), set(ROOTS))
+
+    def test_debug_names(self):
+        fixtures.require('objcopy')
+        library = self.build('names.so', '-gdwarf-5')
+        section = os.path.join(self.directory.name, 'names.section')
+        with open(section, 'wb') as f:
+            f.write(debug_names(library))
+        subprocess.check_call(['objcopy', '--add-section', '.debug_names=' + section, library])
+        self.check_index(library, accel.NameIndex)
+
+    def test_debug_pubtypes(self):
+        library = self.build('pubtypes.so', '-gdwarf-4', '-gpubnames')
+        self.check_index(library, accel.PubtypesIndex)
+
+    def test_gdb_index(self):
+        fixtures.require('ld.gold')
+        library = self.build('gdb_index.so', '-gdwarf-4', '-fuse-ld=gold', '-Wl,--gdb-index')
+        self.check_index(library, accel.GdbIndex)
+
+    def test_extraction(self):
+        library = self.build('extraction.so', '-gdwarf-4', '-gpubnames')
+        self.assertEqual(fixtures.extract([library], roots=ROOTS),
+                         fixtures.extract([library], roots=ROOTS, name_index=False))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import sys
+import tempfile
+import unittest
+
+TEST_DIR = os.path.dirname(os.path.realpath(__file__))
+if TEST_DIR not in sys.path:
+    sys.path.append(TEST_DIR)
+
+
+import fixtures
+
+
+class TestRoots(unittest.TestCase):
+    '''
+    With roots, only the root types and the types they reach are extracted
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.library = fixtures.build(cls.directory.name, 'lib.so')
+        cls.cpp_library = fixtures.build(cls.directory.name, 'cpp.so', {'lib.cpp': fixtures.LIBRARY_CPP}, compiler='g++')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def names(self, library, **kwargs):
+        return fixtures.type_names(fixtures.extract([library], **kwargs))
+
+    def test_namespaced_roots(self):
+        self.assertEqual(self.names(self.cpp_library, roots=['app::inner::Deep']),
+                         {'app::inner::Deep', 'app::Point', 'app::Color'})
+        self.assertEqual(self.names(self.cpp_library, roots=['Wrapper']), fixtures.LIBRARY_CPP_TYPES)
+
+    def test_closure(self):
+        for kwargs in ({}, {'native_scanner': True}, {'name_index': False}):
+            self.assertEqual(self.names(self.library, roots=['point'], **kwargs), {'point'})
+
+            # record reaches the standard types through its pointers, but
+            # nothing reaches value or color
+            names = self.names(self.library, roots=['record'], **kwargs)
+            self.assertTrue({'record', 'point', 'tm', '_IO_FILE', '__va_list_tag'} <= names)
+            self.assertFalse({'value', 'color'} & names)
+
+    def test_match_full_extraction(self):
+        full = fixtures.extract([self.cpp_library])
+        self.assertEqual(fixtures.extract([self.cpp_library], roots=['Wrapper']), full)
+
+    def test_roots_and_filters(self):
+        # the types only an excluded type reaches aren't extracted either
+        names = self.names(self.cpp_library, roots=['Wrapper'], exclude_types=['app::inner::*'])
+        self.assertEqual(names, {'Wrapper', 'app::Box<int>'})
+
+
+if __name__ == '__main__':
+    unittest.main()
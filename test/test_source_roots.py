@@ -0,0 +1,75 @@
+import os
+import sys
+import tempfile
+import unittest
+
+TEST_DIR = os.path.dirname(os.path.realpath(__file__))
+if TEST_DIR not in sys.path:
+    sys.path.append(TEST_DIR)
+
+
+import fixtures
+
+
+'''
+Types of the standard headers and the compiler the fixture's types refer to
+'''
+SYSTEM_TYPES = ['tm', '_IO_FILE', '_IO_marker', '_IO_codecvt', '_IO_wide_data', '__va_list_tag']
+
+
+class TestSourceRoots(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.library = fixtures.build(cls.directory.name, 'lib.so')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def extract(self, roots, **kwargs):
+        return fixtures.type_names(fixtures.extract([self.library], source_roots=roots, **kwargs))
+
+    def test_without_roots(self):
+        names = fixtures.type_names(fixtures.extract([self.library]))
+        self.assertTrue({'record', 'tm', '__va_list_tag'} <= names)
+
+    def test_system_types_are_skipped(self):
+        for kwargs in ({}, {'native_scanner': True}):
+            names = self.extract([self.directory.name], **kwargs)
+            self.assertEqual(names, {'record', 'value', 'color', 'point'})
+            for name in SYSTEM_TYPES:
+                self.assertNotIn(name, names)
+
+    def test_relative_include_directory(self):
+        names = self.extract([os.path.join(self.directory.name, 'inc')])
+        self.assertEqual(names, {'point'})
+
+    def test_members_still_resolve(self):
+        jidl = fixtures.extract([self.library], source_roots=[self.directory.name])
+        members = jidl['structures']['record']['members']
+        self.assertEqual(members['out']['type'], 'FILE pointer')
+        self.assertEqual(members['when']['type'], 'tm pointer')
+        self.assertEqual(members['where']['type'], 'point')
+
+    def test_cache_after_moved_header(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache_dir = os.path.join(directory, 'cache')
+            library = fixtures.build(directory, 'lib.so')
+            roots = [os.path.join(directory, 'inc')]
+            names = fixtures.type_names(fixtures.extract([library], source_roots=roots, cache_dir=cache_dir))
+            self.assertEqual(names, {'point'})
+
+            # the CU's DIE's stay the same, only its file table changes
+            fixtures.build(directory, 'lib.so', fixtures.moved_header_sources('other'))
+            names = fixtures.type_names(fixtures.extract([library], source_roots=roots, cache_dir=cache_dir))
+            self.assertEqual(names, set())
+
+            roots = [os.path.join(directory, 'other')]
+            names = fixtures.type_names(fixtures.extract([library], source_roots=roots, cache_dir=cache_dir))
+            self.assertEqual(names, {'point'})
+
+
+if __name__ == '__main__':
+    unittest.main()
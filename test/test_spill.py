@@ -0,0 +1,90 @@
+import gc
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+TEST_DIR = os.path.dirname(os.path.realpath(__file__))
+if TEST_DIR not in sys.path:
+    sys.path.append(TEST_DIR)
+
+
+import fixtures
+
+from dwarfgen.src import columnar
+from dwarfgen.src import spill
+
+
+LIBRARY_CPP = '''
+namespace app {
+struct Point { int x, y; };
+enum Color { RED, GREEN };
+union Value { int i; float f; };
+namespace inner { struct Deep { Point corners[3]; Color color; Value value; }; }
+}
+struct Wrapper { app::inner::Deep deep; const char *name; };
+Wrapper global_wrapper;
+'''
+
+
+class TestSpill(unittest.TestCase):
+    '''
+    An extraction kept in a spill_dir must give the types it gives in memory
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.library = fixtures.build(cls.directory.name, 'lib.so')
+        cls.cpp_library = fixtures.build(cls.directory.name, 'cpp.so', {'lib.cpp': LIBRARY_CPP}, compiler='g++')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def assertRoundTrip(self, files, **kwargs):
+        expected = fixtures.extract(files, **kwargs)
+        for cache_size in (1, 100000):
+            with tempfile.TemporaryDirectory() as spill_dir:
+                jidl = fixtures.extract(files, spill_dir=spill_dir, spill_cache_size=cache_size, **kwargs)
+                self.assertEqual(jidl, expected)
+
+                # the store's file goes away with it
+                gc.collect()
+                self.assertEqual(os.listdir(spill_dir), [])
+
+    def test_single_file(self):
+        self.assertRoundTrip([self.library])
+        self.assertRoundTrip([self.cpp_library])
+
+    def test_several_files(self):
+        self.assertRoundTrip([self.library, self.cpp_library])
+
+    def test_with_options(self):
+        self.assertRoundTrip([self.cpp_library], roots=['app::inner::Deep'])
+        self.assertRoundTrip([self.cpp_library], native_scanner=True, columnar_resolver=True)
+        self.assertRoundTrip([self.library], bounded_memory=True)
+
+    def test_columnar_resolver(self):
+        # the graph would read every record of the store back
+        with mock.patch.object(columnar, 'TypeGraph', side_effect=AssertionError('graph built')):
+            self.assertRoundTrip([self.cpp_library], columnar_resolver=True)
+
+    def test_bounded_memos(self):
+        memos = []
+        class Memo(spill.Memo):
+            def __init__(self, *args):
+                super().__init__(*args)
+                memos.append(self)
+
+        with tempfile.TemporaryDirectory() as spill_dir, mock.patch.object(spill, 'Memo', Memo):
+            jidl = fixtures.extract([self.cpp_library], spill_dir=spill_dir, spill_cache_size=1)
+        self.assertEqual(jidl, fixtures.extract([self.cpp_library]))
+        # resolution memoized some types, but never more than the store keeps
+        self.assertTrue(any(memos))
+        self.assertTrue(all(len(memo) <= 1 for memo in memos))
+
+
+if __name__ == '__main__':
+    unittest.main()